@@ -0,0 +1,493 @@
+# api_client.py
+# จุดเดียวสำหรับเรียก CoinGecko API: ใช้ session ร่วมกัน (keep-alive), จำกัดอัตราการเรียกด้วย token bucket
+# และ retry แบบ exponential backoff โดยเคารพ header Retry-After เมื่อโดน HTTP 429
+# (import requests เมื่อต้องออก network จริงเท่านั้น เพื่อให้คำตอบจาก cache ไม่ต้องจ่ายเวลา import)
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import json_codec
+import metrics
+import response_cache
+from lazy_import import lazy
+from config import get_base_api_url, get_int_env, get_rate_limit_per_minute
+
+DEFAULT_TIMEOUT = (5, 30) # (connect, read) วินาที
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0 # วินาที, เพิ่มเป็น 2 เท่าทุกครั้งที่ retry
+BACKOFF_MAX = 60.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_CONCURRENCY_PER_HOST = 4
+REVALIDATE_WAIT = 10.0 # วินาทีที่รอ refresh เบื้องหลังของ --stale ก่อนจบโปรแกรม (ผลลัพธ์แสดงไปแล้ว)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire() blocks until a token is available, so
+    callers are spread evenly over the minute instead of bursting into a 429.
+    """
+
+    def __init__(self, rate_per_minute, capacity):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        """Stops handing out tokens for `seconds` (used when the API tells us to back off)."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+    def paused_for(self):
+        """Seconds left of the current pause (0 when tokens are being handed out)."""
+        with self._lock:
+            return max(0.0, self.paused_until - time.monotonic())
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self.paused_until:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    self.updated = self.paused_until
+                    wait = self.paused_until - now
+            time.sleep(wait)
+
+
+_session = None
+_bucket = None
+_host_slots = {}
+_setup_lock = threading.Lock()
+_throttle_count = 0 # จำนวนครั้งที่ API ตอบ 429 ในโปรเซสนี้ (ให้โหมด watch ใช้ปรับ interval)
+_response_listeners = [] # ฟังก์ชัน (path, params, data) ที่ถูกเรียกทุกครั้งที่ได้ข้อมูลใหม่จาก API
+_network = {"requests": 0, "seconds": 0.0}
+_remote = None # DaemonClient เมื่อมี daemon (main.py serve) ทำงานอยู่ get_json จะส่งต่อให้ daemon แทน
+_offline = False # --offline: ไม่ออก network เลย ใช้เฉพาะข้อมูลใน cache
+_serve_stale = False # --stale: ตอบด้วยข้อมูลเก่าใน cache ทันที แล้ว refresh เบื้องหลัง
+_stale = {"responses": 0, "oldest": 0.0, "reasons": {}} # ข้อมูลเก่าที่ get_json คืนให้ผู้เรียกในโปรเซสนี้
+_revalidations = {} # cache key -> Thread ที่กำลัง refresh อยู่ (กันไม่ให้ refresh key เดียวกันซ้ำ)
+
+requests = lazy("requests")
+HTTPAdapter = lazy("requests.adapters", "HTTPAdapter")
+daemon = lazy("daemon")
+
+
+def get_session():
+    """Returns the process-wide pooled requests.Session (created on first use)."""
+    global _session
+    with _setup_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONCURRENCY_PER_HOST * 2, max_retries=0)
+            if metrics.enabled():
+                metrics.instrument_adapter(adapter)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Accept": "application/json"})
+            _session = session
+        return _session
+
+
+def get_rate_limiter():
+    """Returns the shared token bucket, sized from COINGECKO_RATE_LIMIT / COINGECKO_RATE_BURST."""
+    global _bucket
+    with _setup_lock:
+        if _bucket is None:
+            rate = get_rate_limit_per_minute()
+            _bucket = TokenBucket(rate, get_int_env("COINGECKO_RATE_BURST", min(rate, 5)))
+        return _bucket
+
+
+def add_response_listener(listener):
+    """Registers listener(path, params, data), called for every fresh (non-cached) get_json result."""
+    if listener not in _response_listeners:
+        _response_listeners.append(listener)
+
+
+def set_remote(client):
+    """Routes get_json() through a daemon client (or back to direct calls with None)."""
+    global _remote
+    _remote = client
+
+
+def get_remote():
+    """Returns the daemon client get_json() currently forwards to, or None."""
+    return _remote
+
+
+def set_stale_mode(serve_stale=False, offline=False):
+    """
+    Applies --stale / --offline. serve_stale answers from an expired cached response
+    immediately and refreshes it in the background; offline never touches the network.
+    """
+    global _serve_stale, _offline
+    _serve_stale = serve_stale
+    _offline = offline
+
+
+def is_offline():
+    return _offline
+
+
+def stale_summary():
+    """Returns {'responses': n, 'oldest': seconds, 'reasons': {reason: count}} for expired responses served so far."""
+    return {"responses": _stale["responses"], "oldest": _stale["oldest"], "reasons": dict(_stale["reasons"])}
+
+
+def _note_stale(age, reason):
+    with _setup_lock:
+        _stale["responses"] += 1
+        _stale["oldest"] = max(_stale["oldest"], age)
+        _stale["reasons"][reason] = _stale["reasons"].get(reason, 0) + 1
+    metrics.add("stale_responses", reason=reason)
+
+
+def wait_for_revalidation(timeout=REVALIDATE_WAIT):
+    """Waits up to timeout seconds in total for background refreshes; returns how many are still running."""
+    deadline = time.monotonic() + timeout
+    with _setup_lock:
+        threads = list(_revalidations.values())
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+    return sum(thread.is_alive() for thread in threads)
+
+
+def network_stats():
+    """Returns {'requests': n, 'seconds': s}: HTTP attempts made and time spent in get() (including waits)."""
+    return dict(_network)
+
+
+def throttle_count():
+    """Number of HTTP 429 responses seen by this process so far."""
+    return _throttle_count
+
+
+def _host_slot(url):
+    host = urlsplit(url).netloc
+    with _setup_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(MAX_CONCURRENCY_PER_HOST)
+        return _host_slots[host]
+
+
+def api_url(path):
+    """Builds a full URL for an API path such as '/simple/price'."""
+    return f"{get_base_api_url()}{path}"
+
+
+def _retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_delay(attempt):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+    return delay + random.uniform(0, delay / 2) # jitter กันไม่ให้หลาย thread retry พร้อมกัน
+
+
+def get(url, params=None, headers=None, timeout=DEFAULT_TIMEOUT, max_retries=MAX_RETRIES):
+    """
+    GET through the shared session, rate limiter and per-host concurrency cap.
+
+    Retries connection errors, timeouts, 429 and 5xx up to max_retries times with
+    exponential backoff (honouring Retry-After). Returns the final requests.Response; callers still
+    call raise_for_status(), and exhausted network errors propagate as the usual
+    requests.exceptions.RequestException.
+    """
+    if _offline:
+        raise requests.exceptions.ConnectionError(f"Offline mode (--offline): not fetching {url}")
+    session = get_session() # ครั้งแรกจะ import requests ที่นี่ (ไม่นับเป็นเวลา network)
+    started = time.perf_counter()
+    endpoint = _endpoint_label(url)
+    try:
+        with metrics.span("http.request", endpoint=endpoint) as request_span:
+            response = _get_with_retries(session, url, params, headers, timeout, endpoint, max_retries)
+            request_span.set(status=response.status_code)
+            return response
+    finally:
+        _network["seconds"] += time.perf_counter() - started
+
+
+def _endpoint_label(url):
+    base = get_base_api_url()
+    path = url[len(base):] if url.startswith(base) else urlsplit(url).path
+    return metrics.endpoint_label(path)
+
+
+def _record_attempt(attempt_span, endpoint, response, queued, total):
+    """Splits one HTTP attempt into queue/dns/connect/tls/server/download phases and counts it."""
+    phases = metrics.request_phases()
+    elapsed = response.elapsed.total_seconds() # ส่ง request จนได้ header (รวมการเปิด connection)
+    setup = phases["dns"] + phases["connect"] + phases["tls"]
+    timings = {
+        "queue": queued,
+        "dns": phases["dns"],
+        "connect": phases["connect"],
+        "tls": phases["tls"],
+        "server": max(0.0, elapsed - setup),
+        "download": max(0.0, total - elapsed),
+    }
+    size = len(response.content)
+    for phase, seconds in timings.items():
+        metrics.add("http_phase_seconds", seconds, phase=phase)
+    metrics.add("http_requests", endpoint=endpoint, status=str(response.status_code))
+    metrics.add("http_response_bytes", size, endpoint=endpoint)
+    metrics.add("http_new_connections", phases["new_connections"])
+    attempt_span.set(status=response.status_code, bytes=size, reused_connection=not phases["new_connections"],
+                     **{f"{phase}_ms": round(seconds * 1000, 3) for phase, seconds in timings.items()})
+
+
+def _get_with_retries(session, url, params, headers, timeout, endpoint=None, max_retries=MAX_RETRIES):
+    global _throttle_count
+    bucket = get_rate_limiter()
+    slot = _host_slot(url)
+    tracing = metrics.enabled()
+
+    for attempt in range(max_retries + 1):
+        with metrics.span("http.attempt", endpoint=endpoint, attempt=attempt + 1) as attempt_span:
+            queued = time.perf_counter()
+            bucket.acquire()
+            _network["requests"] += 1
+            try:
+                with slot:
+                    if tracing:
+                        metrics.reset_request_phases()
+                    sent = time.perf_counter()
+                    response = session.get(url, params=params, headers=headers, timeout=timeout)
+                    if tracing:
+                        _record_attempt(attempt_span, endpoint, response, sent - queued, time.perf_counter() - sent)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.add("http_requests", endpoint=endpoint, status="error")
+                attempt_span.set(error=type(e).__name__)
+                if attempt == max_retries:
+                    raise
+                metrics.add("http_retries", endpoint=endpoint)
+                time.sleep(_backoff_delay(attempt))
+                continue
+
+        if response.status_code not in RETRY_STATUS_CODES:
+            return response
+
+        retry_after = _retry_after_seconds(response)
+        delay = min(BACKOFF_MAX, retry_after) if retry_after is not None else _backoff_delay(attempt)
+        if response.status_code == 429:
+            # นับและหยุด bucket ก่อนตัดสินใจคืนค่า: 429 ครั้งสุดท้ายก็ต้องทำให้ request อื่นรอ Retry-After เช่นกัน
+            _throttle_count += 1
+            metrics.add("http_throttled", endpoint=endpoint)
+            bucket.pause(delay) # ให้ทุก thread หยุดรอพร้อมกัน ไม่ใช่แค่ตัวที่โดน 429
+        if attempt == max_retries:
+            return response
+
+        metrics.add("http_retries", endpoint=endpoint)
+        response.close()
+        time.sleep(delay)
+
+    return response
+
+
+def get_json(path, params=None, use_cache=True, max_age=None, fields=None):
+    """
+    Fetches an API path (e.g. '/simple/price') and returns the decoded JSON,
+    serving it from the response cache while it is within the endpoint's TTL
+    (or max_age seconds). use_cache=False always goes to the network (the fresh
+    result is still stored). When a daemon client is set, the call is forwarded to it.
+
+    fields is a json_codec projection spec: only those keys are kept (and cached),
+    so large payloads are not carried around in full.
+    When the API is unreachable, rate-limited or failing (or in --stale / --offline mode)
+    an expired cached response is returned instead; see stale_summary().
+    Raises requests.exceptions.HTTPError / RequestException or ValueError like a plain call.
+    """
+    with metrics.span("api.get_json", endpoint=metrics.endpoint_label(path)) as call_span:
+        return _get_json(path, params, use_cache, max_age, fields, call_span)
+
+
+def _get_json(path, params, use_cache, max_age, fields, call_span):
+    global _remote
+    if _remote is not None:
+        enabled, configured_max_age = response_cache.settings()
+        try:
+            data, fresh, stale = _remote.get_json(path, params, use_cache=use_cache and enabled, max_age=max_age if max_age is not None else configured_max_age, fields=fields, serve_stale=_serve_stale)
+        except daemon.DaemonUnavailable as e:
+            # daemon หายไประหว่างทาง กลับไปเรียก API เองตลอดที่เหลือของการรัน
+            print(f"WARNING [api_client.py]: Daemon unavailable ({e}), calling the API directly.", file=sys.stderr)
+            _remote = None
+        else:
+            metrics.add("cache_lookups", tier="daemon", result="miss" if fresh else "hit")
+            call_span.set(source="daemon", fresh=fresh)
+            if stale:
+                _note_stale(*stale)
+            if fresh:
+                for listener in _response_listeners:
+                    listener(path, params, data)
+            return data
+
+    data, origin, stale = lookup_json(path, params, use_cache=use_cache, max_age=max_age, fields=fields)
+    call_span.set(source=origin)
+    if stale is not None:
+        call_span.set(stale_age_s=round(stale[0], 1), stale_reason=stale[1])
+        _note_stale(*stale)
+    return data
+
+
+def lookup_json(path, params=None, use_cache=True, max_age=None, fields=None, serve_stale=None):
+    """
+    get_json() without the daemon hop. Returns (data, origin, stale): origin is 'cache',
+    'network' or 'stale', and stale is (age_seconds, reason) when an expired cached
+    response was returned instead of calling the API.
+
+    With use_cache, an expired response is returned in offline mode, immediately (with a
+    background refresh) when serve_stale (default: the --stale setting), and when the API
+    fails with a connection error, timeout, 429 or 5xx; the request is then not retried, so
+    the answer never waits on backoff. While an earlier 429 has the rate limiter paused
+    (Retry-After), it is returned without calling the API at all.
+    use_cache=False callers always get fresh data or the error.
+    """
+    serve_stale = _serve_stale if serve_stale is None else serve_stale
+    cache = response_cache.get_cache()
+    entry = None
+    if cache is not None and use_cache:
+        entry = cache.lookup(path, params, max_age=max_age, fields=fields)
+        if entry is not None and entry[2]:
+            return entry[0], "cache", None
+
+    if entry is not None and (_offline or serve_stale):
+        if not _offline:
+            _revalidate(path, params, fields, cache)
+        return entry[0], "stale", (time.time() - entry[1], "offline" if _offline else "revalidating")
+
+    if entry is not None and get_rate_limiter().paused_for() > 0:
+        # API สั่งให้รอ (Retry-After) และมีข้อมูลเก่าอยู่แล้ว: ไม่ยิงซ้ำระหว่างที่ยังโดนจำกัด
+        return entry[0], "stale", (time.time() - entry[1], "HTTP 429")
+
+    try:
+        # มีข้อมูลเก่าสำรองไว้แล้ว: ล้มเหลวครั้งแรกก็ตอบด้วยข้อมูลเก่าเลย ไม่รอ backoff / Retry-After
+        # (429 ครั้งนั้นยังถูกนับและหยุด rate limiter ตาม Retry-After ใน _get_with_retries)
+        return _fetch(path, params, fields, cache, max_retries=0 if entry is not None else MAX_RETRIES), "network", None
+    except requests.exceptions.RequestException as e:
+        if entry is None or not (_offline or _is_transient(e)):
+            raise
+        return entry[0], "stale", (time.time() - entry[1], _failure_reason(e))
+
+
+def _fetch(path, params, fields, cache, max_retries=MAX_RETRIES):
+    response = get(api_url(path), params=params, max_retries=max_retries)
+    response.raise_for_status()
+    data = decode_json(response, path, fields=fields)
+    if cache is not None:
+        cache.set(path, params, data, fields=fields)
+    for listener in _response_listeners:
+        listener(path, params, data)
+    return data
+
+
+def _is_transient(error):
+    """True for failures worth answering from stale data: no connection, timeout, 429 and 5xx."""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code in RETRY_STATUS_CODES
+
+
+def _failure_reason(error):
+    response = getattr(error, "response", None)
+    if response is not None:
+        return f"HTTP {response.status_code}"
+    return "timeout" if isinstance(error, requests.exceptions.Timeout) else "connection error"
+
+
+def _revalidate(path, params, fields, cache):
+    """Refreshes one cached response on a background thread (at most one refresh per key at a time)."""
+    key = response_cache.make_key(path, params, fields)
+    with _setup_lock:
+        running = _revalidations.get(key)
+        if running is not None and running.is_alive():
+            return
+        parent = metrics.current() if metrics.enabled() else None
+        thread = threading.Thread(target=_run_revalidation, args=(key, path, params, fields, cache, parent), daemon=True)
+        _revalidations[key] = thread
+        thread.start()
+
+
+def _run_revalidation(key, path, params, fields, cache, parent):
+    try:
+        with metrics.attached(parent), metrics.span("api.revalidate", endpoint=metrics.endpoint_label(path)):
+            _fetch(path, params, fields, cache)
+        metrics.add("stale_revalidations", result="ok")
+    except Exception: # ไม่มีผู้เรียกรอผลอยู่ ข้อมูลเก่ายังใช้ได้ ครั้งหน้าจะลองใหม่เอง
+        metrics.add("stale_revalidations", result="error")
+    finally:
+        with _setup_lock:
+            if _revalidations.get(key) is threading.current_thread():
+                del _revalidations[key]
+
+
+def decode_json(response, path=None, fields=None, parse=None):
+    """
+    Decodes a response body with json_codec (orjson when installed) and applies the
+    fields projection; parse(body) replaces the plain decode when given.
+    Recorded as the 'decode' phase when metrics are enabled.
+    """
+    parse = parse or json_codec.loads
+    if not metrics.enabled():
+        return json_codec.project(parse(response.content), fields)
+    with metrics.span("decode", endpoint=metrics.endpoint_label(path) if path else _endpoint_label(response.url), bytes=len(response.content)) as decode_span:
+        data = json_codec.project(parse(response.content), fields)
+        decode_span.set(backend=json_codec.backend())
+    metrics.add("http_phase_seconds", decode_span.seconds, phase="decode")
+    return data
+
+
+def map_concurrent(func, items, max_workers=MAX_CONCURRENCY_PER_HOST):
+    """
+    Runs func(item) for every item on a bounded thread pool and yields
+    (item, result, error) tuples in completion order, so callers can render
+    each result as soon as it arrives. Requests made by func still go through
+    the shared rate limiter and per-host cap. Closing the generator early cancels
+    the items that have not started yet.
+    """
+    items = list(items)
+    if not items:
+        return
+    if metrics.enabled():
+        # ให้ span ที่เกิดใน worker thread ต่อกับ span ของผู้เรียก
+        parent, target = metrics.current(), func
+
+        def func(item):
+            with metrics.attached(parent):
+                return target(item)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))))
+    try:
+        futures = {executor.submit(func, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                yield item, future.result(), None
+            except Exception as e: # ส่ง error กลับไปให้ผู้เรียกตัดสินใจ ไม่ให้งานอื่นล้มตาม
+                yield item, None, e
+    finally:
+        # ผู้เรียกเลิกอ่านกลางทาง (เช่นเจอหน้าสั้นหรือหน้าที่ล้มเหลว): ยกเลิกงานที่ยังไม่เริ่ม ไม่ให้ออก request ที่ไม่มีใครใช้
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,75 @@
+# batch_price.py
+# ดึงราคาหลายเหรียญ x หลายสกุลเงินด้วย /simple/price ครั้งละหลาย ids (แบ่งเป็นก้อนตามความยาว URL)
+import sys
+
+import api_client
+
+MAX_IDS_PARAM_LENGTH = 1800 # ความยาวสูงสุดของ ids=... ต่อ request (กัน URL ยาวเกิน limit ของ server/proxy)
+MAX_IDS_PER_REQUEST = 250
+
+
+def parse_list(value):
+    """Splits a comma/whitespace separated string into lowercase items, dropping blanks and duplicates."""
+    items = value.replace(",", " ").split()
+    return list(dict.fromkeys(item.strip().lower() for item in items if item.strip()))
+
+
+def read_coin_ids(spec):
+    """
+    Resolves the `price` coin argument into a list of ids:
+    'bitcoin,ethereum' -> literal list, '@path' -> ids read from a file, '-' -> ids read from stdin.
+    Lines starting with '#' are ignored in files/stdin.
+    """
+    if spec == "-":
+        text = sys.stdin.read()
+    elif spec.startswith("@"):
+        with open(spec[1:], encoding="utf-8") as f:
+            text = f.read()
+    else:
+        return parse_list(spec)
+    lines = (line.split("#", 1)[0] for line in text.splitlines())
+    return parse_list(" ".join(lines))
+
+
+def chunk_ids(coin_ids, max_length=MAX_IDS_PARAM_LENGTH, max_count=MAX_IDS_PER_REQUEST):
+    """Groups ids so each comma-joined chunk stays within max_length characters and max_count ids."""
+    chunks = []
+    current = []
+    current_length = 0
+    for coin_id in coin_ids:
+        added = len(coin_id) + (1 if current else 0)
+        if current and (current_length + added > max_length or len(current) >= max_count):
+            chunks.append(current)
+            current, current_length, added = [], 0, len(coin_id)
+        current.append(coin_id)
+        current_length += added
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def fetch_prices(coin_ids, vs_currencies, api_key=None, max_workers=4, market_data=False):
+    """
+    Fetches prices for every coin/currency pair with as few /simple/price calls as possible,
+    issuing the chunks concurrently. Returns (prices, errors) where prices is
+    {coin_id: {currency: price}} merged across chunks and errors is a list of (chunk, exception).
+    market_data=True also asks for '<currency>_market_cap', '<currency>_24h_vol' and '<currency>_24h_change'.
+    """
+    vs_param = ",".join(vs_currencies)
+
+    def fetch_chunk(chunk):
+        params = {'ids': ",".join(chunk), 'vs_currencies': vs_param}
+        if market_data:
+            params.update({'include_market_cap': 'true', 'include_24hr_vol': 'true', 'include_24hr_change': 'true'})
+        if api_key:
+            params['x_cg_demo_api_key'] = api_key
+        return api_client.get_json("/simple/price", params=params)
+
+    prices = {}
+    errors = []
+    for chunk, data, error in api_client.map_concurrent(fetch_chunk, chunk_ids(coin_ids), max_workers=max_workers):
+        if error is not None:
+            errors.append((chunk, error))
+        elif isinstance(data, dict):
+            prices.update(data)
+    return prices, errors
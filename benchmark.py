@@ -0,0 +1,466 @@
+# benchmark.py
+# ชุดวัดความเร็วของ CLI โดยไม่แตะ API จริง: เปิด server จำลองของ CoinGecko ในเครื่อง แล้วจับเวลาแต่ละคำสั่ง
+# ผลลัพธ์เป็นรายงาน JSON ที่เอาไปเทียบข้ามเวอร์ชันได้ (--baseline) เพื่อจับ regression
+#
+#   python benchmark.py --output bench.json
+#   python benchmark.py --baseline bench.json --latency-ms 50 --throttle-every 5
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+REPORT_SCHEMA = 1
+HERE = os.path.dirname(os.path.abspath(__file__))
+MAIN = os.path.join(HERE, "main.py")
+WELL_KNOWN = [("bitcoin", "btc", "Bitcoin"), ("ethereum", "eth", "Ethereum"), ("solana", "sol", "Solana"), ("batcoin", "btc", "BatCoin")]
+RENDER_ROWS = [10, 1000, 10000]
+
+
+# --- server จำลอง ---
+
+class MockCoinGecko:
+    """
+    Local stand-in for the CoinGecko endpoints the CLI uses: /simple/price,
+    /coins/markets, /coins/list (with ETag revalidation), /coins/{id} and
+    /coins/{id}/market_chart (+ /range, with CoinGecko's automatic granularity).
+
+    latency is added to every response, coin_count sets the size of /coins/list,
+    detail_kb pads /coins/{id} like the real (mostly unused) multi-language fields,
+    and throttle_every > 0 answers every Nth request with HTTP 429.
+    """
+
+    def __init__(self, coin_count=15000, latency=0.0, detail_kb=64, throttle_every=0, retry_after=0):
+        self.latency = latency
+        self.detail_kb = detail_kb
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.coins = [{"id": i, "symbol": s, "name": n} for i, s, n in WELL_KNOWN]
+        self.coins += [{"id": f"coin-{i}", "symbol": f"c{i}", "name": f"Coin {i}"} for i in range(max(0, coin_count - len(WELL_KNOWN)))]
+        self.coin_list_body = json.dumps(self.coins).encode("utf-8")
+        self.etag = f'"{zlib.crc32(self.coin_list_body):x}"'
+        self._lock = threading.Lock()
+        self.reset_counters()
+        self._server = None
+
+    def reset_counters(self):
+        with self._lock:
+            self.counters = {"requests": 0, "throttled": 0, "bytes": 0}
+
+    def _next_request(self):
+        """Counts a request and returns True when it should be answered with 429."""
+        with self._lock:
+            self.counters["requests"] += 1
+            throttled = bool(self.throttle_every) and self.counters["requests"] % self.throttle_every == 0
+            self.counters["throttled"] += throttled
+            return throttled
+
+    def _sent(self, size):
+        with self._lock:
+            self.counters["bytes"] += size
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/api/v3"
+
+    def start(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                mock._handle(self)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    # --- ตอบแต่ละ endpoint ---
+
+    def _price(self, coin_id, currency):
+        return (zlib.crc32(f"{coin_id}/{currency}".encode()) % 10_000_000) / 100
+
+    def _market_row(self, coin, rank, currency):
+        price = self._price(coin["id"], currency)
+        return {
+            "id": coin["id"], "symbol": coin["symbol"], "name": coin["name"],
+            "current_price": price, "market_cap": int(price * 1_000_000) + 10**12 // rank,
+            "total_volume": int(price * 10_000), "price_change_percentage_24h": (rank % 200 - 100) / 10,
+            "market_cap_rank": rank,
+        }
+
+    def _history(self, coin_id, currency, start, end):
+        """[[ms, price], ...] from start to end (seconds) at the granularity CoinGecko picks for that range, plus 'now'."""
+        step = 300 if end - start <= 86400 else 3600 if end - start <= 90 * 86400 else 86400
+        base = self._price(coin_id, currency)
+        seed = zlib.crc32(coin_id.encode()) % 1000
+        points = []
+        ts = (int(start) // step + 1) * step
+        while ts < end:
+            points.append([ts * 1000, round(base * (1 + 0.1 * math.sin(ts / 259200 + seed) + 0.01 * math.sin(ts / 3600 + seed)), 6)])
+            ts += step
+        points.append([int(end * 1000), base])
+        return points
+
+    def _market_chart(self, coin_id, currency, start, end):
+        prices = self._history(coin_id, currency, start, end)
+        return {
+            "prices": prices,
+            "market_caps": [[ts, price * 1_000_000] for ts, price in prices],
+            "total_volumes": [[ts, price * 10_000] for ts, price in prices],
+        }
+
+    def _detail(self, coin):
+        padding = "x" * 1024
+        return {
+            "id": coin["id"], "symbol": coin["symbol"], "name": coin["name"],
+            "description": {f"l{i}": padding for i in range(self.detail_kb)} | {"en": f"{coin['name']} is a coin. It is used for benchmarks."},
+            "links": {"homepage": [f"https://{coin['id']}.example"]},
+            "market_data": {
+                "current_price": {c: self._price(coin["id"], c) for c in ("usd", "thb", "eur")},
+                "market_cap": {"usd": self._price(coin["id"], "usd") * 1_000_000},
+                "total_volume": {"usd": self._price(coin["id"], "usd") * 10_000},
+                "high_24h": {"usd": self._price(coin["id"], "usd") * 1.05},
+                "low_24h": {"usd": self._price(coin["id"], "usd") * 0.95},
+            },
+        }
+
+    def _route(self, path, query, headers):
+        """Returns (status, body bytes, extra headers)."""
+        if path == "/coins/list":
+            if headers.get("If-None-Match") == self.etag:
+                return 304, b"", {}
+            return 200, self.coin_list_body, {"ETag": self.etag}
+        if path == "/simple/price":
+            ids = [i for i in query.get("ids", "").split(",") if i]
+            currencies = [c for c in query.get("vs_currencies", "").split(",") if c]
+            known = {coin["id"] for coin in self.coins}
+            data = {i: {c: self._price(i, c) for c in currencies} for i in ids if i in known}
+            for coin_id, values in data.items():
+                for c in currencies:
+                    if query.get("include_market_cap") == "true":
+                        values[f"{c}_market_cap"] = values[c] * 1_000_000
+                    if query.get("include_24hr_vol") == "true":
+                        values[f"{c}_24h_vol"] = values[c] * 10_000
+                    if query.get("include_24hr_change") == "true":
+                        values[f"{c}_24h_change"] = (zlib.crc32(coin_id.encode()) % 200 - 100) / 10
+            return 200, json.dumps(data).encode("utf-8"), {}
+        if path == "/coins/markets":
+            currency = query.get("vs_currency", "usd")
+            if query.get("ids"):
+                wanted = set(query["ids"].split(","))
+                rows = [(rank, coin) for rank, coin in enumerate(self.coins, start=1) if coin["id"] in wanted]
+            else:
+                per_page = int(query.get("per_page", 100))
+                page = int(query.get("page", 1))
+                start = (page - 1) * per_page
+                rows = list(enumerate(self.coins[start:start + per_page], start=start + 1))
+            body = [self._market_row(coin, rank, currency) for rank, coin in rows]
+            if query.get("sparkline") == "true":
+                now = time.time()
+                for row in body:
+                    row["sparkline_in_7d"] = {"price": [price for _, price in self._history(row["id"], currency, now - 7 * 86400, now)[:168]]}
+            return 200, json.dumps(body).encode("utf-8"), {}
+        if path.startswith("/coins/") and path.endswith(("/market_chart", "/market_chart/range")):
+            coin_id = path.split("/")[2]
+            currency = query.get("vs_currency", "usd")
+            if path.endswith("/range"):
+                start, end = float(query.get("from", 0)), float(query.get("to", time.time()))
+            else:
+                end = time.time()
+                start = end - float(query.get("days", 1)) * 86400
+            if not any(c["id"] == coin_id for c in self.coins):
+                return 404, b'{"error":"coin not found"}', {}
+            return 200, json.dumps(self._market_chart(coin_id, currency, start, end)).encode("utf-8"), {}
+        if path.startswith("/coins/") and path.count("/") == 2:
+            coin_id = path.split("/")[2]
+            coin = next((c for c in self.coins if c["id"] == coin_id), None)
+            if coin is None:
+                return 404, b'{"error":"coin not found"}', {}
+            return 200, json.dumps(self._detail(coin)).encode("utf-8"), {}
+        return 404, b'{"error":"not found"}', {}
+
+    def _handle(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+        parts = urlsplit(request.path)
+        path = parts.path[len("/api/v3"):] if parts.path.startswith("/api/v3") else parts.path
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+
+        if self._next_request():
+            status, body, extra = 429, b'{"status":{"error_code":429,"error_message":"Throttled"}}', {"Retry-After": str(self.retry_after)}
+        else:
+            status, body, extra = self._route(path, query, request.headers)
+        self._sent(len(body))
+
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        for key, value in extra.items():
+            request.send_header(key, value)
+        request.end_headers()
+        if body:
+            request.wfile.write(body)
+
+
+# --- การจับเวลาคำสั่ง ---
+
+def _holdings_ids(batch_size):
+    return ["bitcoin", "ethereum", "solana"] + [f"coin-{i}" for i in range(batch_size - 3)]
+
+
+def _write_holdings(path, batch_size):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("coin,quantity,cost_basis\n")
+        for i, coin_id in enumerate(_holdings_ids(batch_size)):
+            f.write(f"{coin_id},{i % 7 + 0.5},{(i % 13 + 1) * 100}\n")
+
+
+def _scenarios(batch_size, holdings_path):
+    batch_ids = ",".join(_holdings_ids(batch_size))
+    return [
+        # (ชื่อ, argv, โหมด cache ที่วัด, ใส่ HTTP 429 หรือไม่)
+        ("help", ["help"], ["cold"], False),
+        ("price-single", ["price", "bitcoin", "usd"], ["cold", "warm"], False),
+        ("price-batch", ["price", batch_ids, "usd,eur,thb", "--format", "csv"], ["cold", "warm"], False),
+        ("price-batch-throttled", ["price", batch_ids, "usd,eur,thb", "--format", "csv", "--no-cache"], ["cold"], True),
+        ("top-100", ["top", "--limit", "100"], ["cold", "warm"], False),
+        ("top-1000-ndjson", ["top", "--limit", "1000", "--format", "ndjson"], ["cold", "warm"], False),
+        ("compare", ["compare", "btc", "etherium", "solana", "usd", "--non-interactive"], ["cold", "warm"], False),
+        ("detail", ["detail", "bitcoin", "ethereum", "solana"], ["cold", "warm"], False),
+        ("portfolio", ["portfolio", holdings_path, "--vs_currency", "usd,eur,thb", "--format", "csv"], ["cold", "warm"], False),
+        ("chart-90d", ["chart", "bitcoin", "ethereum", "solana", "--days", "90"], ["cold", "warm"], False),
+    ]
+
+
+def _summary(samples_ms, extra=None):
+    result = {
+        "runs": len(samples_ms),
+        "median_ms": round(statistics.median(samples_ms), 2),
+        "min_ms": round(min(samples_ms), 2),
+        "max_ms": round(max(samples_ms), 2),
+        "mean_ms": round(statistics.fmean(samples_ms), 2),
+    }
+    result.update(extra or {})
+    return result
+
+
+def run_cli(argv, env):
+    """Runs main.py once with output discarded; returns (elapsed ms, exit code)."""
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, MAIN, *argv], env=env, stdin=subprocess.DEVNULL,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - started) * 1000, completed.returncode
+
+
+def bench_commands(mock, settings, only=None, log=print):
+    results = {}
+    base_env = dict(os.environ)
+    base_env.update({
+        "COINGECKO_API_URL": mock.url,
+        "COINGECKO_API_KEY": "benchmark",
+        "COINGECKO_RATE_LIMIT": "1000000", # วัดตัว CLI ไม่ใช่ token bucket
+        "COINGECKO_RATE_BURST": "1000000",
+        "CRYPTO_CLI_DAEMON": "0",
+        "CRYPTO_CLI_RECORD": "0",
+    })
+
+    holdings_dir = tempfile.mkdtemp(prefix="crypto-cli-bench-")
+    holdings_path = os.path.join(holdings_dir, "holdings.csv")
+    _write_holdings(holdings_path, settings["batch_size"])
+
+    for name, argv, modes, throttled in _scenarios(settings["batch_size"], holdings_path):
+        if only and name not in only:
+            continue
+        for mode in modes:
+            key = f"{name}/{mode}"
+            samples = []
+            failures = 0
+            mock.throttle_every = settings["throttle_every"] if throttled else 0
+            mock.reset_counters()
+            warm_dir = None
+            if mode == "warm":
+                warm_dir = tempfile.mkdtemp(prefix="crypto-cli-bench-")
+                run_cli(argv, {**base_env, "CRYPTO_CLI_CACHE_DIR": warm_dir}) # เติม cache ก่อนเริ่มจับเวลา
+                mock.reset_counters()
+            for _ in range(settings["repeat"]):
+                cache_dir = warm_dir or tempfile.mkdtemp(prefix="crypto-cli-bench-")
+                elapsed, code = run_cli(argv, {**base_env, "CRYPTO_CLI_CACHE_DIR": cache_dir})
+                samples.append(elapsed)
+                failures += code != 0
+                if warm_dir is None:
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+            if warm_dir is not None:
+                shutil.rmtree(warm_dir, ignore_errors=True)
+            counters = mock.counters
+            results[key] = _summary(samples, {
+                "api_requests_per_run": round(counters["requests"] / len(samples), 2),
+                "api_kb_per_run": round(counters["bytes"] / len(samples) / 1024, 1),
+                "throttled_per_run": round(counters["throttled"] / len(samples), 2),
+                "failures": failures,
+            })
+            log(f"{key:<32} {results[key]['median_ms']:9.1f} ms")
+    mock.throttle_every = 0
+    shutil.rmtree(holdings_dir, ignore_errors=True)
+    return results
+
+
+def bench_rendering(settings, only=None, log=print):
+    """
+    Times the 'top' table in-process at several row counts: the full Rich table (render-table),
+    the plain writer used when stdout is not a terminal (render-plain) and one pager frame,
+    i.e. formatting every row once plus rendering a 40-row window (render-window).
+    """
+    if only and not {"render-table", "render-plain", "render-window"} & set(only):
+        return {}
+    sys.path.insert(0, HERE)
+    import main as cli
+    import table_view
+    from rich.console import Console
+
+    results = {}
+    for rows in RENDER_ROWS:
+        build_samples = []
+        render_samples = []
+        coins = [{"name": f"Coin {i}", "symbol": f"c{i}", "current_price": 1234.5678 + i, "market_cap": 10**12 - i, "total_volume": 10**9 + i} for i in range(rows)]
+        for _ in range(settings["repeat"]):
+            started = time.perf_counter()
+            table = cli._new_top_table("Benchmark", "usd")
+            for rank, coin in enumerate(coins, start=1):
+                cli._add_top_row(table, rank, coin)
+            built = time.perf_counter()
+            Console(file=io.StringIO(), width=120, force_terminal=True).print(table)
+            build_samples.append((built - started) * 1000)
+            render_samples.append((time.perf_counter() - built) * 1000)
+        key = f"render-table/{rows}"
+        results[key] = _summary(render_samples, {"build_median_ms": round(statistics.median(build_samples), 2)})
+        log(f"{key:<32} {results[key]['median_ms']:9.1f} ms (+{results[key]['build_median_ms']:.1f} ms build)")
+
+        ranked = [{"rank": rank, **coin} for rank, coin in enumerate(coins, start=1)]
+        columns = cli._top_view_columns("usd")
+        plain_samples = []
+        window_samples = []
+        for _ in range(settings["repeat"]):
+            started = time.perf_counter()
+            table_view.PlainWriter(columns, io.StringIO(), "Benchmark").write_rows(ranked)
+            plain_samples.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            view = table_view.TableView("Benchmark", columns, ranked)
+            Console(file=io.StringIO(), width=120, force_terminal=True).print(view.window(0, 40))
+            window_samples.append((time.perf_counter() - started) * 1000)
+        for name, samples in (("render-plain", plain_samples), ("render-window", window_samples)):
+            key = f"{name}/{rows}"
+            results[key] = _summary(samples)
+            log(f"{key:<32} {results[key]['median_ms']:9.1f} ms")
+    return results
+
+
+# --- รายงาน ---
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(baseline, report, threshold, min_delta_ms):
+    """Returns [(key, old_ms, new_ms, ratio, regressed)] for results present in both reports."""
+    rows = []
+    for key, result in report["results"].items():
+        old = baseline.get("results", {}).get(key)
+        if not old:
+            continue
+        old_ms, new_ms = old["median_ms"], result["median_ms"]
+        ratio = new_ms / old_ms if old_ms else float("inf")
+        regressed = ratio > 1 + threshold and new_ms - old_ms > min_delta_ms
+        rows.append((key, old_ms, new_ms, ratio, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark crypto-cli against a local CoinGecko stand-in.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per scenario (default: 5).")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency added to every mock response (default: 0).")
+    parser.add_argument("--coins", type=int, default=15000, help="Number of coins in the mock /coins/list (default: 15000).")
+    parser.add_argument("--detail-kb", type=int, default=64, help="Padding added to each /coins/{id} payload, in KiB (default: 64).")
+    parser.add_argument("--batch-size", type=int, default=500, help="Coins in the price-batch and portfolio scenarios (default: 500).")
+    parser.add_argument("--throttle-every", type=int, default=3, help="In the throttled scenario, answer every Nth request with 429 (default: 3).")
+    parser.add_argument("--retry-after", type=float, default=0, help="Retry-After seconds sent with injected 429s (default: 0).")
+    parser.add_argument("--only", type=str, default=None, help="Comma list of scenario names to run (e.g. price-single,render-table).")
+    parser.add_argument("--output", "-o", type=str, default=None, metavar="PATH", help="Write the JSON report to PATH (default: stdout).")
+    parser.add_argument("--baseline", type=str, default=None, metavar="PATH", help="Compare medians against an earlier report; exit 1 on regressions.")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative slowdown counted as a regression (default: 0.15).")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="Ignore slowdowns smaller than this many ms (default: 5).")
+    args = parser.parse_args()
+
+    settings = {
+        "repeat": max(1, args.repeat),
+        "latency_ms": args.latency_ms,
+        "coins": args.coins,
+        "detail_kb": args.detail_kb,
+        "batch_size": max(3, args.batch_size),
+        "throttle_every": args.throttle_every,
+        "retry_after": args.retry_after,
+    }
+    only = set(args.only.split(",")) if args.only else None
+    log = lambda message: print(message, file=sys.stderr)
+
+    mock = MockCoinGecko(coin_count=args.coins, latency=args.latency_ms / 1000, detail_kb=args.detail_kb,
+                         retry_after=args.retry_after).start()
+    try:
+        results = bench_commands(mock, settings, only=only, log=log)
+    finally:
+        mock.stop()
+    results.update(bench_rendering(settings, only=only, log=log))
+
+    report = {
+        "schema": REPORT_SCHEMA,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": settings,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare_reports(baseline, report, args.threshold, args.min_delta_ms)
+        log(f"\nvs baseline {baseline.get('git_commit') or args.baseline}:")
+        for key, old_ms, new_ms, ratio, regressed in rows:
+            log(f"{key:<32} {old_ms:9.1f} -> {new_ms:9.1f} ms  {ratio - 1:+7.1%}{'  REGRESSION' if regressed else ''}")
+        if any(row[4] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+# chart.py
+# คำสั่ง chart: ราคา/market cap/volume ย้อนหลังจาก /coins/{id}/market_chart เก็บไว้ในเครื่องด้วย price_store
+# (แยกโฟลเดอร์ตามขนาดแท่ง) ครั้งต่อไปดึงเฉพาะช่วงที่ใหม่กว่าที่มีอยู่ แล้วคำนวณ indicator ทั้ง array ด้วย numpy
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from rich.console import Console
+from rich.table import Table
+from rich.text import Text
+
+import api_client
+import indicators
+import json_codec
+import metrics
+import output
+import price_store
+from config import get_cache_dir
+from history import format_age
+from lazy_import import lazy
+
+requests = lazy("requests")
+
+console = metrics.instrument_console(Console())
+
+CHART_DIRNAME = "charts"
+SYNC_FILENAME = "sync.json"
+SYNC_AFTER = 60 # วินาที, ข้อมูลที่ sync ไปไม่นานกว่านี้ถือว่าใหม่พอ ไม่ต้องเรียก API (เปลี่ยนได้ด้วย --max-age)
+CHART_COLUMNS = ["time", "coin", "price", "market_cap", "volume", "sma", "ema"]
+CHART_TYPES = output.column_types(CHART_COLUMNS, strings=("time", "coin"))
+SPARK_BLOCKS = "▁▂▃▄▅▆▇█"
+SPARK_WIDTH = 24
+
+
+def step_for_days(days):
+    """Bar size CoinGecko returns for a market_chart range: 5 minutes up to 1 day, hourly up to 90 days, then daily."""
+    if days <= 1:
+        return 300
+    if days <= 90:
+        return 3600
+    return 86400
+
+
+def chart_store_dir(step):
+    return os.path.join(get_cache_dir(), CHART_DIRNAME, f"{int(step)}s")
+
+
+def _step_label(step):
+    return {300: "5m", 3600: "1h", 86400: "1d"}.get(step, f"{step}s")
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(timespec="seconds")
+
+
+def _align(ts, pairs):
+    """Values of [[ms, value], ...] at the timestamps ts (seconds); NaN where the payload has no point."""
+    import numpy as np
+
+    result = np.full(len(ts), np.nan)
+    pairs = np.asarray(pairs or [], dtype="f8").reshape(-1, 2)
+    if not len(pairs):
+        return result
+    index = np.minimum(np.searchsorted(pairs[:, 0], ts * 1000), len(pairs) - 1)
+    found = pairs[index, 0] == ts * 1000
+    result[found] = pairs[index[found], 1]
+    return result
+
+
+def chart_columns(data, step):
+    """
+    Turns a market_chart payload into price_store columns with one point per step-sized bar
+    (the last one, so a partial bar ends at its latest price).
+    """
+    import numpy as np
+
+    prices = np.asarray(data.get("prices") or [], dtype="f8").reshape(-1, 2)
+    ts = prices[:, 0] / 1000
+    columns = {
+        "ts": ts,
+        "price": prices[:, 1],
+        "market_cap": _align(ts, data.get("market_caps")),
+        "volume": _align(ts, data.get("total_volumes")),
+    }
+    if len(ts) > 1:
+        if not np.all(ts[1:] >= ts[:-1]):
+            order = np.argsort(ts, kind="stable")
+            columns = {name: values[order] for name, values in columns.items()}
+        bars = np.floor(columns["ts"] / step)
+        last = np.flatnonzero(np.r_[bars[1:] != bars[:-1], True])
+        columns = {name: values[last] for name, values in columns.items()}
+    return columns
+
+
+def _read_sync(directory):
+    try:
+        with open(os.path.join(directory, SYNC_FILENAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_sync(directory, state):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, SYNC_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+
+def sync_series(coin_id, currency, days, api_key=None, max_age=SYNC_AFTER):
+    """
+    Brings the stored series for coin/currency up to date and returns (status, age): status is
+    'cached' (recent enough, no request), 'synced', 'offline' or the error that prevented the
+    sync; age is the seconds since the newest stored point (None when nothing is stored).
+
+    The first sync (or one asking for more history than is stored) downloads the whole
+    `days` range; later ones only ask /market_chart/range for the bars from the newest
+    stored one on, which replace it (the last bar is partial until it closes).
+    """
+    import numpy as np
+
+    step = step_for_days(days)
+    store_dir = chart_store_dir(step)
+    directory = price_store.series_dir(coin_id, currency, store_dir)
+    now = time.time()
+    since = now - days * 86400
+
+    series = price_store.load_series(coin_id, currency, store_dir)
+    covered_from = _read_sync(directory).get("covered_from")
+    last = float(series["ts"][-1]) if series is not None else None
+    # ช่องว่างที่ยาวกว่าช่วงที่ขอ API จะตอบเป็นแท่งใหญ่กว่า step จึงดึงใหม่ทั้งช่วงแทน
+    complete = series is not None and covered_from is not None and covered_from <= since + step and last >= since
+    age = None if last is None else now - last
+    if complete and age < max_age:
+        return "cached", age
+    if api_client.is_offline():
+        return "offline", age
+
+    params = {"vs_currency": currency}
+    if api_key:
+        params["x_cg_demo_api_key"] = api_key
+    if complete:
+        start = np.floor(last / step) * step
+        keep = int(np.searchsorted(series["ts"], start, side="left"))
+        path = f"/coins/{coin_id}/market_chart/range"
+        params.update({"from": int(start), "to": int(now)})
+    else:
+        # ยังไม่มีข้อมูล หรือมีไม่ย้อนไปถึงช่วงที่ขอ: ดึงทั้งช่วงแล้วเขียนทับ
+        keep = 0
+        path = f"/coins/{coin_id}/market_chart"
+        params["days"] = days
+    del series # ปล่อย memmap ก่อนตัดไฟล์
+
+    try:
+        response = api_client.get(api_client.api_url(path), params=params)
+        response.raise_for_status()
+        columns = api_client.decode_json(response, path, parse=lambda body: chart_columns(json_codec.loads(body), step))
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return e, age
+
+    if len(columns["ts"]) or keep == 0:
+        price_store.write_columns(coin_id, currency, columns, keep=keep, store_dir=store_dir)
+    if not complete:
+        _write_sync(directory, {"covered_from": since})
+    newest = columns["ts"][-1] if len(columns["ts"]) else last
+    return "synced", None if newest is None else max(0.0, now - float(newest))
+
+
+def load_chart(coin_id, currency, days):
+    """Returns the stored {column: array} for the last `days` days (copies, in time order), or None."""
+    step = step_for_days(days)
+    series = price_store.load_series(coin_id, currency, chart_store_dir(step))
+    if series is None:
+        return None
+    return price_store.query_range(series, since=time.time() - days * 86400)
+
+
+def sparkline(values, width=SPARK_WIDTH):
+    """Draws values as block characters, averaging down to at most width cells; NaN cells are blank."""
+    import numpy as np
+
+    values = np.asarray(values, dtype="f8")
+    if len(values) > width:
+        edges = np.linspace(0, len(values), width + 1).astype("i8")[:-1]
+        valid = ~np.isnan(values)
+        sums = np.add.reduceat(np.where(valid, values, 0.0), edges)
+        counts = np.add.reduceat(valid.astype("f8"), edges)
+        with np.errstate(invalid="ignore"):
+            values = sums / counts
+    finite = values[np.isfinite(values)]
+    if not finite.size:
+        return " " * len(values)
+    low, high = finite.min(), finite.max()
+    span = high - low if high > low else 1.0
+    levels = np.nan_to_num(np.round((values - low) / span * (len(SPARK_BLOCKS) - 1)), nan=len(SPARK_BLOCKS))
+    return "".join(np.array(list(SPARK_BLOCKS + " "))[levels.astype("i8")])
+
+
+def sparkline_text(values, width=SPARK_WIDTH):
+    """sparkline() coloured green when the last value is at or above the first, red otherwise."""
+    import numpy as np
+
+    values = np.asarray(values, dtype="f8")
+    finite = values[np.isfinite(values)]
+    style = "green" if len(finite) < 2 or finite[-1] >= finite[0] else "red"
+    return Text(sparkline(values, width), style=style)
+
+
+def _number(value, pattern=",.2f", suffix=""):
+    return "N/A" if value != value else f"{format(value, pattern)}{suffix}"
+
+
+def _signed(value):
+    if value != value:
+        return Text("N/A", style="dim")
+    return Text(f"{value:+,.2f}%", style="green" if value >= 0 else "red")
+
+
+def print_summary(charts, currency, days, step, sma_window, ema_span, width):
+    table = Table(title=f"📈 {days}-day chart ({currency.upper()}, {_step_label(step)} bars)", show_header=True, header_style="bold magenta")
+    table.add_column("Coin", style="bold cyan", no_wrap=True)
+    table.add_column("Last", justify="right", style="green", no_wrap=True)
+    table.add_column("Change", justify="right", no_wrap=True)
+    table.add_column(f"SMA {sma_window}", justify="right", no_wrap=True)
+    table.add_column(f"EMA {ema_span}", justify="right", no_wrap=True)
+    table.add_column("Vol. (ann.)", justify="right", no_wrap=True)
+    table.add_column("Max DD", justify="right", style="red", no_wrap=True)
+    table.add_column("Trend", no_wrap=True)
+    for coin_id, chart, sma_values, ema_values in charts:
+        price = chart["price"]
+        drawdown, _, _ = indicators.max_drawdown(price)
+        change = (price[-1] / price[0] - 1) * 100 if price[0] else float("nan")
+        table.add_row(
+            coin_id, _number(price[-1]), _signed(change), _number(sma_values[-1]), _number(ema_values[-1]),
+            _number(indicators.volatility(price, step) * 100, ",.1f", "%"),
+            _number(drawdown * 100, ",.1f", "%"),
+            sparkline_text(price, width),
+        )
+    console.print(table)
+
+
+def print_correlation(charts, step):
+    _, matrix = indicators.align([(chart["ts"], chart["price"]) for _, chart, _, _ in charts], step)
+    if len(matrix) < 3:
+        console.print("[#f6e10d]⚠️ Not enough overlapping bars to correlate these coins.[/#f6e10d]")
+        return
+    result = indicators.correlation(matrix)
+    coin_ids = [coin_id for coin_id, _, _, _ in charts]
+    table = Table(title=f"🔗 Correlation of {_step_label(step)} returns ({len(matrix) - 1} bars)", show_header=True, header_style="bold magenta")
+    table.add_column("", style="bold cyan")
+    for coin_id in coin_ids:
+        table.add_column(coin_id, justify="right")
+    for coin_id, row in zip(coin_ids, result.tolist()):
+        cells = []
+        for value in row:
+            if value != value:
+                cells.append(Text("N/A", style="dim"))
+            else:
+                cells.append(Text(f"{value:+.2f}", style="green" if value >= 0.5 else "red" if value <= -0.5 else "white"))
+        table.add_row(coin_id, *cells)
+    console.print(table)
+
+
+def write_rows(writer, charts):
+    """Writes one row per (coin, bar) with the moving averages alongside."""
+    for coin_id, chart, sma_values, ema_values in charts:
+        columns = [chart[name].tolist() for name in ("ts", "price", "market_cap", "volume")] + [sma_values.tolist(), ema_values.tolist()]
+        for ts, price, market_cap, volume, sma_value, ema_value in zip(*columns):
+            writer.write_row({
+                "time": _iso(ts), "coin": coin_id, "price": price,
+                **{name: None if value != value else value for name, value in (("market_cap", market_cap), ("volume", volume), ("sma", sma_value), ("ema", ema_value))},
+            })
+
+
+def handle_chart_command(args, api_key=None):
+    """Syncs the requested coins' market charts (concurrently, newer bars only) and prints indicators."""
+    coin_ids = list(dict.fromkeys(c.strip().lower() for c in args.coins if c.strip()))
+    currency = args.vs_currency.lower()
+    days = args.days
+    if days < 1 or args.sma < 1 or args.ema < 1:
+        console.print("[bold #df0000]❌ --days, --sma and --ema must be at least 1.[/bold #df0000]")
+        return
+    step = step_for_days(days)
+    max_age = 0 if args.no_cache else (args.max_age if args.max_age is not None else SYNC_AFTER)
+
+    sync = lambda coin_id: sync_series(coin_id, currency, days, api_key=api_key, max_age=max_age)
+    statuses = {}
+    for coin_id, result, error in api_client.map_concurrent(sync, coin_ids, max_workers=args.concurrency):
+        statuses[coin_id] = (error, None) if error is not None else result
+
+    charts = []
+    for coin_id in coin_ids:
+        status, age = statuses[coin_id]
+        chart = load_chart(coin_id, currency, days)
+        if chart is None or not len(chart["ts"]):
+            reason = "offline mode" if status == "offline" else status
+            console.print(f"[bold #df0000]❌ No chart data for '{coin_id}' in {currency.upper()}:[/bold #df0000] {reason}")
+            continue
+        if status not in ("cached", "synced"):
+            stored = f"showing stored data {format_age(age)} old" if age is not None else "showing stored data"
+            reason = "offline mode" if status == "offline" else f"could not sync: {status}"
+            console.print(f"[#f6e10d]⚠️ {coin_id}: {stored} ({reason}).[/#f6e10d]")
+        price = chart["price"]
+        charts.append((coin_id, chart, indicators.sma(price, args.sma), indicators.ema(price, args.ema)))
+
+    if not charts:
+        return
+    if args.format != output.TABLE_FORMAT:
+        with output.open_writer(args.format, CHART_COLUMNS, args.output_stream, types=CHART_TYPES) as writer:
+            write_rows(writer, charts)
+        return
+    print_summary(charts, currency, days, step, args.sma, args.ema, args.width)
+    if len(charts) > 1:
+        print_correlation(charts, step)
@@ -0,0 +1,277 @@
+# coin_index.py
+# ดัชนี /coins/list แบบเก็บลงดิสก์ (SQLite) เพื่อไม่ต้องดาวน์โหลดรายชื่อเหรียญทั้งหมดทุกครั้งที่รัน compare
+import os
+import sqlite3
+import time
+
+from rich.console import Console
+
+import api_client
+import json_codec
+from batch_price import chunk_ids
+from coin_search import SearchIndex
+from config import get_cache_dir, get_coin_index_ttl
+from lazy_import import lazy
+from records import MarketCoin
+
+requests = lazy("requests")
+
+INDEX_FILENAME = "coin_index.sqlite3"
+SCHEMA_VERSION = 3 # เพิ่มเลขนี้เมื่อเปลี่ยนโครงสร้างตาราง ไฟล์เก่าจะถูกสร้างใหม่อัตโนมัติ
+
+console = Console()
+
+
+def _coin_rows(body):
+    # แปลง /coins/list ทีละเหรียญเป็น (id, symbol, name) ไม่ต้องเก็บ list ของ dict ทั้งก้อนไว้
+    return [
+        (coin["id"], coin["symbol"].lower(), coin["name"].lower())
+        for coin in json_codec.iter_array(body)
+        if coin.get("id") and coin.get("symbol") is not None and coin.get("name") is not None
+    ]
+
+
+class CoinIndex:
+    """
+    Lazily-opened SQLite index over CoinGecko's /coins/list.
+
+    The file is only opened (and revalidated against the API when older than
+    the TTL) on the first lookup, so commands that never resolve a coin pay nothing.
+    """
+
+    def __init__(self, path=None, api_key=None, ttl=None):
+        self.path = path or os.path.join(get_cache_dir(), INDEX_FILENAME)
+        self.api_key = api_key
+        self.ttl = get_coin_index_ttl() if ttl is None else ttl
+        self._conn = None
+        self._search = None
+
+    # --- การเชื่อมต่อและ schema ---
+
+    def _connect(self):
+        if self._conn is None:
+            self._open()
+            self.ensure_fresh()
+        return self._conn
+
+    def _open(self):
+        # ผู้เรียกที่ใช้หลาย thread (เช่น daemon) ต้องล็อกเอง
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        version = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        if version is None or int(version[0]) != SCHEMA_VERSION:
+            with conn:
+                conn.execute("DROP TABLE IF EXISTS coins")
+                conn.execute("DROP TABLE IF EXISTS ranks")
+                conn.execute("DELETE FROM meta")
+                conn.execute("CREATE TABLE coins (id TEXT NOT NULL, symbol TEXT NOT NULL, name TEXT NOT NULL)")
+                conn.execute("CREATE INDEX coins_id ON coins (id)")
+                conn.execute("CREATE INDEX coins_symbol ON coins (symbol)")
+                conn.execute("CREATE INDEX coins_name ON coins (name)")
+                # อันดับ market cap ที่เคยดึงมา ใช้ตัดสินเมื่อ symbol ซ้ำกันหลายเหรียญ (rank เป็น NULL = ไม่มีใน /coins/markets)
+                conn.execute("CREATE TABLE ranks (id TEXT PRIMARY KEY, market_cap_rank INTEGER, updated_at REAL NOT NULL)")
+                conn.execute("INSERT INTO meta (key, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+
+        self._conn = conn
+        return conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _get_meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        if value is None:
+            self._conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+        else:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    # --- การ refresh ข้อมูลจาก API ---
+
+    def age(self):
+        """Seconds since the index was last fetched or revalidated, or None if it was never populated."""
+        fetched_at = self._get_meta("fetched_at")
+        return None if fetched_at is None else time.time() - float(fetched_at)
+
+    def ensure_fresh(self):
+        """Revalidates the index when it is older than the TTL (long-running processes call this per request)."""
+        age = self.age()
+        # --offline: ใช้ดัชนีเดิมไปก่อนไม่ว่าจะเก่าแค่ไหน (ถ้ายังไม่เคยดึงเลย refresh() จะแจ้ง error เอง)
+        if age is None or (age > self.ttl and not api_client.is_offline()):
+            self.refresh()
+
+    def refresh(self):
+        """
+        Revalidates the index with a conditional GET (ETag / Last-Modified).
+        Returns True when the index is usable afterwards (fresh or stale), False when it is empty.
+        """
+        conn = self._conn if self._conn is not None else self._open()
+        has_data = self._get_meta("fetched_at") is not None
+
+        headers = {}
+        params = {}
+        if has_data:
+            etag = self._get_meta("etag")
+            last_modified = self._get_meta("last_modified")
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        if self.api_key:
+            params["x_cg_demo_api_key"] = self.api_key
+
+        try:
+            response = api_client.get(api_client.api_url("/coins/list"), params=params, headers=headers)
+            if response.status_code == 304 and has_data:
+                with conn:
+                    self._set_meta("fetched_at", time.time())
+                return True
+
+            response.raise_for_status()
+            rows = api_client.decode_json(response, "/coins/list", parse=_coin_rows)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            if has_data:
+                console.print(f"[#f6e10d]⚠️ Could not refresh coin list, using local index:[/#f6e10d] {e}")
+                return True
+            console.print(f"[bold #df0000]❌ Failed to fetch coin list from CoinGecko:[/bold #df0000] {e}")
+            return False
+
+        with conn:
+            conn.execute("DELETE FROM coins")
+            conn.executemany("INSERT INTO coins (id, symbol, name) VALUES (?, ?, ?)", rows)
+            self._set_meta("fetched_at", time.time())
+            self._set_meta("etag", response.headers.get("ETag"))
+            self._set_meta("last_modified", response.headers.get("Last-Modified"))
+            self._set_meta("coin_count", len(rows))
+        self._search = None
+        return True
+
+    # --- การค้นหา ---
+
+    def lookup_name(self, name):
+        """Returns the coin id for an exact (lowercase) name, or None. Later entries win, as in /coins/list order."""
+        row = self._connect().execute(
+            "SELECT id FROM coins WHERE name = ? ORDER BY rowid DESC LIMIT 1", (name.lower(),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def lookup_symbol(self, symbol):
+        """Returns every coin id sharing an exact (lowercase) symbol, in /coins/list order."""
+        rows = self._connect().execute(
+            "SELECT id FROM coins WHERE symbol = ? ORDER BY rowid", (symbol.lower(),)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def lookup_id(self, coin_id):
+        """Returns coin_id if it is a known CoinGecko id, else None."""
+        row = self._connect().execute("SELECT id FROM coins WHERE id = ? LIMIT 1", (coin_id.lower(),)).fetchone()
+        return row[0] if row else None
+
+    def _positions(self, coin_ids):
+        """{coin_id: position in /coins/list} for coin_ids (used to break market cap ties)."""
+        positions = {}
+        for chunk in chunk_ids(coin_ids, max_count=500):
+            placeholders = ",".join("?" * len(chunk))
+            query = f"SELECT id, MIN(rowid) FROM coins WHERE id IN ({placeholders}) GROUP BY id"
+            positions.update(self._connect().execute(query, chunk).fetchall())
+        return positions
+
+    def search_index(self):
+        """
+        Returns the in-memory SearchIndex for typo/prefix matching, loading it from SQLite on first use.
+        Only inputs that match no name, id or symbol exactly need it.
+        """
+        if self._search is None:
+            rows = self._connect().execute("SELECT id, symbol, name FROM coins ORDER BY rowid").fetchall()
+            self._search = SearchIndex(rows)
+        return self._search
+
+    def match_inputs(self, user_inputs):
+        """
+        Looks up names, ids or symbols and returns (matches, ranks).
+
+        matches holds one (raw, kind, candidates) per input, where kind is 'exact',
+        'symbol' or 'fuzzy' and candidates are coin ids ordered best first: highest
+        market cap, then /coins/list order. ranks maps every ranked candidate to its
+        market cap rank. Lookup order is exact name, exact id, exact symbol, then typos.
+        Exact lookups are indexed SQLite queries; the in-memory SearchIndex is only loaded
+        for inputs that need the typo/prefix search.
+        """
+        matches = []
+        need_rank = []
+        for raw in user_inputs:
+            key = raw.strip().lower()
+            coin_id = self.lookup_name(key) or self.lookup_id(key)
+            if coin_id:
+                matches.append((raw, "exact", [coin_id]))
+                continue
+            candidates = self.lookup_symbol(key)
+            if candidates:
+                matches.append((raw, "symbol", candidates))
+            else:
+                fuzzy = self.search_index().fuzzy(key)
+                closest = [cid for distance, cid in fuzzy if distance == fuzzy[0][0]] if fuzzy else []
+                matches.append((raw, "fuzzy", closest))
+            if len(matches[-1][2]) > 1:
+                need_rank.extend(matches[-1][2])
+
+        ranks = self.ranks(need_rank) if need_rank else {}
+        positions = self._positions(need_rank) if need_rank else {}
+        # อันดับ market cap น้อยสุดมาก่อน เหรียญที่ไม่มีอันดับไว้ท้ายสุด เสมอกันใช้ลำดับใน /coins/list
+        by_rank = lambda cid: (ranks.get(cid) is None, ranks.get(cid) or 0, positions.get(cid, 0))
+        matches = [(raw, kind, sorted(candidates, key=by_rank)) for raw, kind, candidates in matches]
+        return matches, {cid: rank for cid, rank in ranks.items() if rank is not None}
+
+    # --- อันดับ market cap ---
+
+    def ranks(self, coin_ids):
+        """
+        Returns {coin_id: market_cap_rank or None} for coin_ids, fetching ranks that are
+        missing or older than the TTL from /coins/markets in as few calls as possible.
+        """
+        conn = self._connect()
+        coin_ids = list(dict.fromkeys(coin_ids))
+        known = {}
+        fresh_after = time.time() - self.ttl
+        for chunk in chunk_ids(coin_ids, max_count=500):
+            placeholders = ",".join("?" * len(chunk))
+            query = f"SELECT id, market_cap_rank, updated_at FROM ranks WHERE id IN ({placeholders})"
+            for coin_id, rank, updated_at in conn.execute(query, chunk):
+                if updated_at >= fresh_after:
+                    known[coin_id] = rank
+
+        missing = [coin_id for coin_id in coin_ids if coin_id not in known]
+        if missing:
+            known.update(self._fetch_ranks(missing))
+        return {coin_id: known.get(coin_id) for coin_id in coin_ids}
+
+    def _fetch_ranks(self, coin_ids):
+        fetched = {}
+        now = time.time()
+        for chunk in chunk_ids(coin_ids):
+            params = {"vs_currency": "usd", "ids": ",".join(chunk), "per_page": len(chunk), "page": 1}
+            if self.api_key:
+                params["x_cg_demo_api_key"] = self.api_key
+            try:
+                data = api_client.get_json("/coins/markets", params=params, fields=MarketCoin.FIELDS)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                console.print(f"[#f6e10d]⚠️ Could not fetch market cap ranks, falling back to coin list order:[/#f6e10d] {e}")
+                return fetched
+            ranked = {coin.get("id"): coin.get("market_cap_rank") for coin in data or () if coin.get("id")}
+            for coin_id in chunk:
+                fetched[coin_id] = ranked.get(coin_id)
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO ranks (id, market_cap_rank, updated_at) VALUES (?, ?, ?)",
+                    ((coin_id, fetched[coin_id], now) for coin_id in chunk),
+                )
+        return fetched
+
+
+def load_coin_index(api_key=None, ttl=None):
+    """Returns a CoinIndex for the default cache location; nothing is read until the first lookup."""
+    return CoinIndex(api_key=api_key, ttl=ttl)
@@ -0,0 +1,125 @@
+# coin_search.py
+# ดัชนีค้นหาเหรียญในหน่วยความจำ (สร้างจาก coin_index ครั้งเดียวต่อการรัน)
+# ใช้เมื่อหาแบบตรงตัวใน SQLite ไม่เจอ: prefix = รายการ key ที่เรียงแล้ว + bisect, fuzzy = trigram + edit distance
+import bisect
+from collections import Counter, defaultdict
+
+FUZZY_CANDIDATES = 8 # จำนวน key ที่มี trigram ร่วมมากที่สุดที่นำไปคำนวณ edit distance
+
+
+def trigrams(text):
+    """Returns the set of 3-character grams of text, padded so short strings and word starts still produce grams."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance between a and b, or limit + 1 as soon as it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if a == b:
+        return 0
+    over = limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        # คำนวณเฉพาะแถบกว้าง limit รอบเส้นทแยง ช่องนอกแถบมีค่าเกิน limit แน่นอน
+        low = max(1, i - limit)
+        high = min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        current[0] = i if i <= limit else over
+        row_best = current[0]
+        for j in range(low, high + 1):
+            cost = previous[j - 1] if char_a == b[j - 1] else previous[j - 1] + 1
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost
+            if cost < row_best:
+                row_best = cost
+        if row_best > limit:
+            return over
+        previous = current
+    return min(previous[-1], over)
+
+
+def max_distance_for(text):
+    """Typo budget for a query: none for very short strings, then roughly one edit per four characters."""
+    return 0 if len(text) < 4 else max(1, len(text) // 4)
+
+
+class SearchIndex:
+    """
+    In-memory fuzzy lookup over (id, symbol, name) rows; exact lookups stay in SQLite (coin_index).
+
+    Prefix candidates come from a sorted key list; the trigram postings used for typo
+    matching are only built on the first lookup that needs them (or by prepare()).
+    """
+
+    def __init__(self, rows):
+        key_ids = {}
+        for coin_id, symbol, name in rows:
+            for key in (coin_id, symbol, name):
+                key_ids.setdefault(key, []).append(coin_id)
+        self._keys = sorted(key_ids)
+        self._key_ids = [key_ids[key] for key in self._keys]
+        self._postings = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def prepare(self):
+        """Builds the trigram postings now (for long-running processes) instead of on the first typo."""
+        if self._postings is None:
+            self._build_postings()
+
+    def _build_postings(self):
+        # แยก posting ตามความยาวของ key ด้วย เพราะ key ที่ยาวต่างจากคำค้นเกินงบ typo ไม่มีทางผ่านอยู่แล้ว
+        postings = defaultdict(list)
+        for index, key in enumerate(self._keys):
+            length = len(key)
+            for gram in trigrams(key):
+                postings[gram, length].append(index)
+        self._postings = dict(postings)
+
+    def _prefix_matches(self, text):
+        # ทุก key ที่ขึ้นต้นด้วย text อยู่ติดกันในรายการที่เรียงแล้ว: ช่วง [text, text + อักขระสูงสุด)
+        start = bisect.bisect_left(self._keys, text)
+        stop = bisect.bisect_left(self._keys, text + "\U0010ffff", start)
+        return range(start, stop)
+
+    def _gram_matches(self, text, max_distance):
+        if self._postings is None:
+            self._build_postings()
+        grams = trigrams(text)
+        # แก้ไข 1 ตัวอักษรทำให้ trigram หายไปได้ไม่เกิน 3 ตัว key ที่อยู่ในระยะจึงต้องมี gram ร่วมอย่างน้อย required ตัว
+        required = max(1, len(grams) - 3 * max_distance)
+        shared = Counter()
+        for length in range(len(text) - max_distance, len(text) + max_distance + 1):
+            for gram in grams:
+                shared.update(self._postings.get((gram, length), ()))
+        return [index for index, count in shared.most_common(FUZZY_CANDIDATES) if count >= required]
+
+    def fuzzy(self, text):
+        """
+        Returns [(distance, coin_id)] for keys within the typo budget of text, closest first.
+        Every key starting with text is a match at distance 0, so a shortened name such as
+        'ethere' finds 'ethereum'; ties are settled by the caller (market cap rank).
+        """
+        max_distance = max_distance_for(text)
+        if max_distance == 0:
+            return []
+        best = {}
+        for index in self._prefix_matches(text):
+            for coin_id in self._key_ids[index]:
+                best[coin_id] = 0
+        if best:
+            return sorted((0, coin_id) for coin_id in best) # ไม่มี typo ใดดีกว่าระยะ 0 ไม่ต้องสร้าง postings
+        for index in self._gram_matches(text, max_distance):
+            distance = edit_distance(text, self._keys[index], max_distance)
+            if distance > max_distance:
+                continue
+            for coin_id in self._key_ids[index]:
+                if distance < best.get(coin_id, max_distance + 1):
+                    best[coin_id] = distance
+        return sorted((distance, coin_id) for coin_id, distance in best.items())
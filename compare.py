@@ -1,68 +1,75 @@
-import requests
+import sys
+
 from rich.console import Console
 from rich.table import Table
-from rich.prompt import Prompt 
-from babel.numbers import get_currency_symbol 
 from rich import box
 
-console = Console()
+import api_client
+import metrics
+import output
+from coin_index import load_coin_index
+from lazy_import import lazy
+from records import MarketCoin
 
-def fetch_coin_id_map():
-    url = "https://api.coingecko.com/api/v3/coins/list"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+requests = lazy("requests")
+Prompt = lazy("rich.prompt", "Prompt") # ใช้เฉพาะตอนที่ symbol ซ้ำกันหลายเหรียญ
+get_currency_symbol = lazy("babel.numbers", "get_currency_symbol") # ใช้เฉพาะตอนแสดงผลแบบตาราง
+sparkline_text = lazy("chart", "sparkline_text") # ใช้เฉพาะเมื่อสั่ง --sparkline
+sparkline = lazy("chart", "sparkline")
+table_view = lazy("table_view")
 
-        symbol_to_ids = {}
-        name_to_id = {}
+console = metrics.instrument_console(Console())
 
-        for coin in data:
-            coin_id = coin["id"]
-            symbol = coin["symbol"].lower()
-            name = coin["name"].lower()
+COMPARE_COLUMNS = ["id", "name", "symbol", "current_price", "market_cap", "total_volume", "price_change_percentage_24h"]
+COMPARE_TYPES = output.column_types(COMPARE_COLUMNS, strings=("id", "name", "symbol"))
+COMPARE_TITLE = "📊 Cryptocurrency Price Comparison"
 
-            name_to_id[name] = coin_id
+def _prompt_choice(key, candidates, ranks):
+    console.print(f"\n[bold #f6e10d]🔎 Found multiple coins with symbol '{key}':[/bold #f6e10d]")
+    for idx, cid in enumerate(candidates, start=1):
+        rank = ranks.get(cid)
+        console.print(f"  [cyan]{idx}[/cyan]: {cid}" + (f" [dim](rank #{rank})[/dim]" if rank else ""))
 
-            if symbol not in symbol_to_ids:
-                symbol_to_ids[symbol] = []
-            symbol_to_ids[symbol].append(coin_id)
+    try:
+        choice = Prompt.ask(
+            f"[bold #f9730a]Select number (1-{len(candidates)}) for '{key}' coin you are looking for[/bold #f9730a]",
+            default="1",
+        )
+        return candidates[int(choice) - 1]
+    except Exception:
+        console.print("[#df0000]⚠️ Skipped due to invalid input[/#df0000]")
+        return None
 
-        return symbol_to_ids, name_to_id
 
-    except requests.exceptions.RequestException as e:
-        console.print(f"[bold #df0000]❌ Failed to fetch coin list from CoinGecko:[/bold #df0000] {e}")
-        return {}, {}
+def resolve_coin_ids(user_inputs, coin_index, interactive=True):
+    """
+    Maps names, ids or symbols to CoinGecko ids (in input order, without duplicates).
+
+    coin_index is a CoinIndex or a daemon client; either one answers match_inputs().
+    Symbols shared by several coins are settled by the highest market cap; with
+    interactive=True and a terminal on stdin the user is asked instead, with that
+    coin as the default.
+    """
+    matches, ranks = coin_index.match_inputs(user_inputs)
+    interactive = interactive and sys.stdin.isatty()
 
-def resolve_coin_ids(user_inputs, symbol_to_ids, name_to_id):
     resolved_ids = []
     not_found = []
-
-    for raw in user_inputs:
-        key = raw.lower()
-
-        if key in name_to_id:
-            resolved_ids.append(name_to_id[key])
-
-        elif key in symbol_to_ids:
-            candidates = symbol_to_ids[key]
-                
-            if len(candidates) == 1:
-                resolved_ids.append(candidates[0])
-            else:
-                console.print(f"\n[bold #f6e10d]🔎 Found multiple coins with symbol '{key}':[/bold #f6e10d]")
-                for idx, cid in enumerate(candidates, start=1):
-                    console.print(f"  [cyan]{idx}[/cyan]: {cid}")
-
-                try:
-                    choice = Prompt.ask(
-                        f"[bold #f9730a]Select number (1-{len(candidates)}) for '{key}' coin you are looking for[/bold #f9730a]" 
-                    )
-                    resolved_ids.append(candidates[int(choice) - 1])
-                except Exception:
-                    console.print("[#df0000]⚠️ Skipped due to invalid input[/#df0000]")
-        else:
+    for raw, kind, candidates in matches:
+        if not candidates:
             not_found.append(raw)
+            continue
+        if kind == "symbol" and len(candidates) > 1 and interactive:
+            coin_id = _prompt_choice(raw.strip().lower(), candidates, ranks)
+            if coin_id is None:
+                continue
+        else:
+            coin_id = candidates[0]
+            if kind == "symbol" and len(candidates) > 1:
+                console.print(f"[#f6e10d]🔎 '{raw}' matches {len(candidates)} coins, using '{coin_id}' (highest market cap)[/#f6e10d]")
+        if kind == "fuzzy":
+            console.print(f"[#f6e10d]🔎 Interpreting '{raw}' as '{coin_id}'[/#f6e10d]")
+        resolved_ids.append(coin_id)
 
     if not_found:
         console.print(f"\n[bold #df0000]❌ Could not identify:[/bold #df0000] {', '.join(not_found)}")
@@ -70,36 +77,81 @@ def resolve_coin_ids(user_inputs, symbol_to_ids, name_to_id):
 
     return list(dict.fromkeys(resolved_ids))  # Remove duplicates coin
 
+def _view_columns(currency_symbol, show_sparkline):
+    """Columns of the comparison table for the plain writer and the pager."""
+    columns = [
+        table_view.Column("name", "Coin", None, "left", "bold cyan"),
+        table_view.Column("current_price", "Price", f"{currency_symbol}{{:,.2f}}", "right", "green"),
+        table_view.Column("market_cap", "Market Cap", f"{currency_symbol}{{:,.0f}}", "right", "#ffb731"),
+        table_view.Column("total_volume", "Volume (24h)", f"{currency_symbol}{{:,.0f}}", "right", "magenta"),
+        table_view.Column("price_change_percentage_24h", "Change (24h)%", "{:,.2f}%", "right", "#ed2121"),
+    ]
+    if show_sparkline:
+        columns.append(table_view.Column("trend", "7d"))
+    return columns
+
+
 def handle_compare_command(args, api_key_global=None):
     user_inputs = args.coins
     vs_currency = args.vs_currency
 
-    symbol_to_ids, name_to_id = fetch_coin_id_map()
-    coin_ids = resolve_coin_ids(user_inputs, symbol_to_ids, name_to_id)
+    # ถ้ามี daemon ทำงานอยู่ ให้ daemon ค้นหาจากดัชนีที่โหลดค้างไว้แล้ว
+    coin_index = api_client.get_remote() or load_coin_index(api_key=api_key_global)
+    try:
+        with metrics.span("compare.resolve", inputs=len(user_inputs)):
+            coin_ids = resolve_coin_ids(user_inputs, coin_index, interactive=not getattr(args, "non_interactive", False))
+    finally:
+        coin_index.close() # ปิด SQLite แม้ค้นหาหรือดึงอันดับล้มเหลว (การดึงราคาด้านล่างไม่ใช้ดัชนีแล้ว)
 
     if not coin_ids:
         console.print("[bold #df0000]❌ No valid coins to compare.[/bold #df0000]")
         return
 
-    url = "https://api.coingecko.com/api/v3/coins/markets"
     params = {
         "ids": ','.join(coin_ids),
         "vs_currency": vs_currency,
     }
+    if api_key_global:
+        params["x_cg_demo_api_key"] = api_key_global
+    fmt = getattr(args, "format", output.TABLE_FORMAT)
+    fields = MarketCoin.FIELDS
+    show_sparkline = getattr(args, "sparkline", False) and fmt == output.TABLE_FORMAT
+    if show_sparkline:
+        # ราคารายชั่วโมง 7 วันมากับ /coins/markets ในคำขอเดียวกัน ไม่ต้องเรียก market_chart ทีละเหรียญ
+        params["sparkline"] = "true"
+        fields = {**dict.fromkeys(MarketCoin.FIELDS), "sparkline_in_7d": ["price"]}
 
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
+        rows = api_client.get_json("/coins/markets", params=params, fields=fields) or []
+        data = MarketCoin.from_list(rows)
+        trends = {row.get("id"): (row.get("sparkline_in_7d") or {}).get("price") or [] for row in rows} if show_sparkline else {}
 
         if not data:
             console.print("[#df0000]⚠️ Coin information not found from CoinGecko[/#df0000]")
             return
 
+        if fmt != output.TABLE_FORMAT:
+            with output.open_writer(fmt, COMPARE_COLUMNS, args.output_stream, types=COMPARE_TYPES) as writer:
+                writer.write_rows(data)
+            return
+
         currency_symbol = get_currency_symbol(vs_currency.upper(), locale="en_US")
-        
+
+        mode = table_view.choose_mode(len(data), console, no_pager=getattr(args, "no_pager", False))
+        if mode != table_view.TABLE_MODE:
+            # pipe/ไฟล์ หรือแถวเกินหน้าจอ: จัดรูปแบบตัวเลขทีละคอลัมน์ แล้วเขียนข้อความล้วนหรือเปิด pager
+            if show_sparkline:
+                data = [{**coin, "trend": sparkline(trends.get(coin.get('id')) or [], width=24)} for coin in data]
+            columns = _view_columns(currency_symbol.replace("{", "{{").replace("}", "}}"), show_sparkline)
+            if mode == table_view.PLAIN_MODE:
+                with metrics.span("render", rows=len(data)):
+                    table_view.PlainWriter(columns, sys.stdout, COMPARE_TITLE).write_rows(data)
+            else:
+                table_view.page(table_view.TableView(COMPARE_TITLE, columns, data), console)
+            return
+
         table = Table(
-            title="📊 Cryptocurrency Price Comparison",
+            title=COMPARE_TITLE,
             box=box.ROUNDED,
             #show_lines=True,               
             border_style="#ea137b",           
@@ -111,6 +163,8 @@ def handle_compare_command(args, api_key_global=None):
         table.add_column("Market Cap", justify="right", style="#ffb731")
         table.add_column("Volume (24h)", justify="right", style="magenta")
         table.add_column("Change (24h)%", justify="right", style="#ed2121")
+        if show_sparkline:
+            table.add_column("7d", no_wrap=True)
 
         for coin in data:
             name = coin.get('name', 'N/A')
@@ -119,7 +173,10 @@ def handle_compare_command(args, api_key_global=None):
             volume = f"{currency_symbol}{coin.get('total_volume', 0):,.0f}"
             change = f"{coin.get('price_change_percentage_24h', 0):,.2f}%"
             
-            table.add_row(name, price, market_cap, volume, change)
+            cells = [name, price, market_cap, volume, change]
+            if show_sparkline:
+                cells.append(sparkline_text(trends.get(coin.get('id')) or [], width=24))
+            table.add_row(*cells)
 
         console.print("\n", table, "\n")
         
@@ -0,0 +1,52 @@
+# config.py
+# ค่าตั้งค่าที่อ่านจาก environment variables (อ่านตอนเรียกใช้ ไม่ใช่ตอน import
+# เพราะ main.py เรียก load_dotenv() หลังจาก import โมดูลอื่นแล้ว)
+import os
+
+
+def get_cache_dir():
+    """
+    Returns the directory used for local caches (coin index, responses, ...).
+    Override with CRYPTO_CLI_CACHE_DIR; defaults to $XDG_CACHE_HOME/crypto-cli.
+    """
+    cache_dir = os.getenv("CRYPTO_CLI_CACHE_DIR")
+    if not cache_dir:
+        xdg_cache = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        cache_dir = os.path.join(xdg_cache, "crypto-cli")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def get_int_env(name, default):
+    """Reads an integer environment variable, falling back to default on missing/invalid values."""
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def get_coin_index_ttl():
+    """How long (seconds) the local /coins/list index is trusted before revalidation."""
+    return get_int_env("COIN_INDEX_TTL", 24 * 60 * 60)
+
+
+def get_base_api_url():
+    """CoinGecko API root. Override with COINGECKO_API_URL (e.g. the pro endpoint or a local mock)."""
+    return os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3").rstrip("/")
+
+
+def get_rate_limit_per_minute():
+    """
+    Calls per minute allowed by the CoinGecko tier. Override with COINGECKO_RATE_LIMIT;
+    defaults to the Demo-key tier (30/min) when a key is configured, otherwise the keyless limit.
+    """
+    default = 30 if os.getenv("COINGECKO_API_KEY") else 10
+    return max(1, get_int_env("COINGECKO_RATE_LIMIT", default))
+
+
+def get_daemon_socket():
+    """Unix socket of the `serve` daemon. Override with CRYPTO_CLI_SOCKET; defaults to <cache dir>/daemon.sock."""
+    return os.getenv("CRYPTO_CLI_SOCKET") or os.path.join(get_cache_dir(), "daemon.sock")
@@ -0,0 +1,308 @@
+# daemon.py
+# โหมด serve: โปรเซสที่รันค้างไว้ ถือ session/connection pool, response cache และ coin index ที่อุ่นแล้ว
+# CLI ที่รันทีหลังจะส่งคำขอมาทาง Unix socket แทนการเริ่มทุกอย่างใหม่เอง
+# โปรโตคอล: ต่อ 1 connection ส่ง JSON 1 บรรทัด และได้ JSON ตอบกลับ 1 บรรทัด
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+import api_client
+import json_codec
+from config import get_daemon_socket
+from lazy_import import lazy
+
+requests = lazy("requests")
+response_cache = lazy("response_cache")
+load_coin_index = lazy("coin_index", "load_coin_index")
+Console = lazy("rich.console", "Console")
+
+CLIENT_TIMEOUT = 300 # วินาที, เผื่อเวลารอ rate limit / Retry-After ฝั่ง daemon
+MAX_REQUEST_BYTES = 1 << 20
+
+
+class DaemonUnavailable(Exception):
+    """Raised when the daemon cannot be reached or answers with a malformed reply (callers fall back to direct calls)."""
+
+
+# --- ฝั่ง client ---
+
+class DaemonClient:
+    """
+    Talks to a running daemon. Each call opens its own short-lived connection,
+    so one client can be shared by the worker threads of map_concurrent.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def call(self, request):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(CLIENT_TIMEOUT)
+                sock.connect(self.path)
+                sock.sendall(json_codec.dumps(request).encode("utf-8") + b"\n")
+                with sock.makefile("rb") as reply:
+                    line = reply.readline()
+        except OSError as e:
+            raise DaemonUnavailable(str(e)) from e
+        if not line:
+            raise DaemonUnavailable("daemon closed the connection without replying")
+        try:
+            return json_codec.loads(line)
+        except ValueError as e:
+            raise DaemonUnavailable(f"invalid reply from daemon: {e}") from e
+
+    def get_json(self, path, params=None, use_cache=True, max_age=None, fields=None, serve_stale=False):
+        """
+        Returns (data, fresh, stale) for an API path, where fresh is True only for the caller
+        whose request actually went to the network and stale is (age_seconds, reason) when the
+        daemon answered from an expired cached response. Errors are raised as the same
+        requests/ValueError exceptions a direct api_client.get_json() call would raise.
+        """
+        reply = self.call({"op": "get_json", "path": path, "params": params, "use_cache": use_cache, "max_age": max_age, "fields": fields, "serve_stale": serve_stale})
+        if reply.get("ok"):
+            stale = reply.get("stale")
+            return reply["data"], reply.get("fresh", False), tuple(stale) if stale else None
+        _raise_reply_error(reply)
+
+    def match_inputs(self, user_inputs):
+        """Same contract as CoinIndex.match_inputs(), answered from the daemon's warm index."""
+        reply = self.call({"op": "match_inputs", "inputs": list(user_inputs)})
+        if reply.get("ok"):
+            return [tuple(match) for match in reply["matches"]], reply["ranks"]
+        _raise_reply_error(reply)
+
+    def stats(self):
+        reply = self.call({"op": "stats"})
+        if reply.get("ok"):
+            return reply["stats"]
+        _raise_reply_error(reply)
+
+    def close(self):
+        pass # ไม่มี connection ค้างไว้ (เปิดใหม่ทุกคำขอ)
+
+
+def _raise_reply_error(reply):
+    kind = reply.get("error")
+    message = reply.get("message", "unknown daemon error")
+    if kind == "http":
+        response = requests.models.Response()
+        response.status_code = reply.get("status")
+        response.url = reply.get("url")
+        response._content = (reply.get("body") or "").encode("utf-8")
+        raise requests.exceptions.HTTPError(message, response=response)
+    if kind == "request":
+        raise requests.exceptions.RequestException(message)
+    if kind == "value":
+        raise ValueError(message)
+    raise DaemonUnavailable(message)
+
+
+def connect(path=None):
+    """Returns a DaemonClient when a daemon is listening on the socket, otherwise None (costs one connect())."""
+    path = path or get_daemon_socket()
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(1)
+            sock.connect(path)
+    except OSError:
+        return None
+    return DaemonClient(path)
+
+
+# --- ฝั่ง daemon ---
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Coalescer:
+    """
+    Collapses identical in-flight calls: the first caller for a key runs the
+    function, concurrent callers with the same key wait for and share its result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.coalesced = 0
+
+    def run(self, key, func):
+        """Returns (result, leader); raises the leader's exception for every waiter."""
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, False
+
+        try:
+            call.result = func()
+            return call.result, True
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+
+
+class Daemon:
+    """Request dispatcher holding the state that survives between CLI invocations."""
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key
+        self.coalescer = Coalescer()
+        self.started_at = time.time()
+        self.served = 0
+        self._index_lock = threading.Lock()
+        self._coin_index = None
+
+    def coin_index(self):
+        if self._coin_index is None:
+            self._coin_index = load_coin_index(api_key=self.api_key)
+        return self._coin_index
+
+    def warm_up(self):
+        """Opens the HTTP pool and loads the coin index (with its typo postings) up front so the first client does not pay for it."""
+        api_client.get_session()
+        with self._index_lock:
+            self.coin_index().search_index().prepare()
+
+    def dispatch(self, request):
+        self.served += 1
+        op = request.get("op")
+        try:
+            if op == "get_json":
+                return self._get_json(request)
+            if op == "match_inputs":
+                with self._index_lock:
+                    index = self.coin_index()
+                    index.ensure_fresh()
+                    matches, ranks = index.match_inputs(request.get("inputs") or [])
+                return {"ok": True, "matches": matches, "ranks": ranks}
+            if op == "stats":
+                return {"ok": True, "stats": self.stats()}
+            return {"ok": False, "error": "daemon", "message": f"unknown op '{op}'"}
+        except requests.exceptions.HTTPError as e:
+            response = e.response
+            return {
+                "ok": False, "error": "http", "message": str(e),
+                "status": response.status_code if response is not None else None,
+                "url": response.url if response is not None else None,
+                "body": response.text if response is not None else None,
+            }
+        except requests.exceptions.RequestException as e:
+            return {"ok": False, "error": "request", "message": str(e)}
+        except ValueError as e:
+            return {"ok": False, "error": "value", "message": str(e)}
+
+    def _get_json(self, request):
+        path = request["path"]
+        params = request.get("params")
+        use_cache = bool(request.get("use_cache", True))
+        max_age = request.get("max_age")
+        fields = request.get("fields")
+        serve_stale = bool(request.get("serve_stale", False))
+        key = (response_cache.make_key(path, params, fields), use_cache, max_age, serve_stale)
+        # lookup_json บอกได้ว่าข้อมูลมาจาก network หรือไม่ (client ส่งต่อให้ listener เช่น --record เฉพาะข้อมูลใหม่)
+        fetch = lambda: api_client.lookup_json(path, params, use_cache=use_cache, max_age=max_age, fields=fields, serve_stale=serve_stale)
+        (data, origin, stale), leader = self.coalescer.run(key, fetch)
+        return {"ok": True, "data": data, "fresh": origin == "network" and leader, "stale": stale}
+
+    def stats(self):
+        network = api_client.network_stats()
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "requests_served": self.served,
+            "coalesced": self.coalescer.coalesced,
+            "api_requests": network["requests"],
+            "api_seconds": round(network["seconds"], 3),
+        }
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline(MAX_REQUEST_BYTES)
+        if not line:
+            return # connect() ที่แค่ตรวจว่ามี daemon อยู่ ต่อแล้วปิดทันทีโดยไม่ส่งอะไร
+        try:
+            request = json_codec.loads(line)
+            reply = self.server.daemon.dispatch(request)
+        except ValueError as e:
+            reply = {"ok": False, "error": "daemon", "message": f"invalid request: {e}"}
+        self.wfile.write(json_codec.dumps(reply).encode("utf-8") + b"\n")
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(path=None, api_key=None):
+    """Runs the daemon in the foreground until Ctrl+C or SIGTERM; the socket file is removed on exit."""
+    console = Console()
+    path = path or get_daemon_socket()
+    if not hasattr(socket, "AF_UNIX"):
+        console.print("[bold #df0000]❌ The daemon needs Unix domain sockets, which this platform does not support.[/bold #df0000]")
+        return 1
+    if connect(path) is not None:
+        console.print(f"[#f6e10d]⚠️ A daemon is already listening on {path}[/#f6e10d]")
+        return 1
+    if os.path.exists(path):
+        os.unlink(path) # socket ค้างจาก daemon ที่ปิดไม่เรียบร้อย
+
+    daemon = Daemon(api_key=api_key)
+    # สร้าง socket ด้วยสิทธิ์ 0600 ตั้งแต่ bind() ไม่มีช่วงที่ผู้ใช้อื่นเชื่อมต่อได้ก่อน chmod
+    previous_umask = os.umask(0o177)
+    try:
+        server = _Server(path, _Handler)
+    finally:
+        os.umask(previous_umask)
+    server.daemon = daemon
+    # SIGTERM (kill, systemd, docker stop) ออกทางเดียวกับ Ctrl+C เพื่อให้ลบไฟล์ socket ใน finally
+    previous_sigterm = signal.signal(signal.SIGTERM, _raise_interrupt)
+    try:
+        daemon.warm_up()
+        console.print(f"[bold green]🛰️ crypto-cli daemon listening on {path}[/bold green] (Ctrl+C to stop)")
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, previous_sigterm)
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+        console.print(f"Daemon stopped after {daemon.served} request(s).", highlight=False)
+    return 0
+
+
+def print_status(path=None):
+    """Prints the stats of the running daemon (or that none is running); returns the exit code."""
+    client = connect(path)
+    if client is None:
+        print("No daemon is running.", file=sys.stderr)
+        return 1
+    for name, value in client.stats().items():
+        print(f"{name}: {value}")
+    return 0
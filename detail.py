@@ -1,15 +1,18 @@
 # detail.py
-import requests
+import api_client
+import output
+from lazy_import import lazy
+from records import CoinDetail
 
-BASE_API_URL_DETAIL = "https://api.coingecko.com/api/v3" # สามารถใช้ BASE_API_URL จาก main.py ได้ถ้า import มา
+requests = lazy("requests") # ใช้แค่ชนิดของ exception จึงไม่ต้อง import จนกว่าจะเกิด error จริง
 
 def get_coin_data(coin_id, api_key=None): # << เพิ่ม api_key เป็น parameter
     """
-    Fetches raw detailed coin data from CoinGecko API.
-    Returns the full JSON data dictionary on success, None on failure.
+    Fetches detailed coin data from CoinGecko API, keeping only the fields 'detail' shows.
+    Returns a CoinDetail record on success, None on failure.
     """
     processed_coin_id = coin_id.lower()
-    endpoint = f"{BASE_API_URL_DETAIL}/coins/{processed_coin_id}"
+    endpoint = f"/coins/{processed_coin_id}"
     
     params = {
         'localization': 'false',
@@ -26,12 +29,9 @@ def get_coin_data(coin_id, api_key=None): # << เพิ่ม api_key เป็
     # print(f"DEBUG [detail.py]: Calling API: {endpoint} with params: {params}") 
 
     try:
-        response = requests.get(endpoint, params=params)
-        # print(f"DEBUG [detail.py]: API Status Code: {response.status_code}")
-        response.raise_for_status() # ตรวจสอบ HTTP errors
-        data = response.json() # คืน JSON data ทั้งหมดที่ได้จาก API
+        data = api_client.get_json(endpoint, params=params, fields=CoinDetail.FIELDS) # เฉพาะ field ที่แสดงผล (จาก API หรือจาก cache)
         # print(f"DEBUG [detail.py]: API Data Received (first 200 chars): {str(data)[:200]}")
-        return data 
+        return CoinDetail.from_json(data)
     except requests.exceptions.HTTPError as http_err:
         print(f"ERROR [detail.py]: HTTP error for '{processed_coin_id}': {http_err}")
         # (สามารถเพิ่มการ print error detail จาก response.json() ที่นี่ได้ถ้าต้องการ)
@@ -50,4 +50,19 @@ def handle_detail(coin_id, api_key=None): # api_key ถูกส่งต่อ
     """
     # print(f"DEBUG [detail.py -> handle_detail]: Received coin_id: {coin_id}, api_key: {'Yes' if api_key else 'No'}")
     data = get_coin_data(coin_id, api_key=api_key) # << ส่ง api_key ต่อไปให้ get_coin_data
-    return data # คืนค่าที่ได้จาก get_coin_data โดยตรง
\ No newline at end of file
+    return data # คืนค่าที่ได้จาก get_coin_data โดยตรง
+
+DETAIL_COLUMNS = list(CoinDetail.__slots__)
+DETAIL_TYPES = output.column_types(DETAIL_COLUMNS, strings=("id", "name", "symbol", "description", "homepage"))
+
+
+def handle_detail_many(coin_ids, api_key=None, max_workers=4):
+    """
+    Fetches many coins concurrently (bounded by max_workers and the shared rate limiter)
+    and yields (coin_id, data) as each response arrives; data is None when the fetch failed.
+    """
+    results = api_client.map_concurrent(lambda coin_id: get_coin_data(coin_id, api_key=api_key), coin_ids, max_workers=max_workers)
+    for coin_id, data, error in results:
+        if error is not None:
+            print(f"ERROR [detail.py]: Unexpected error for '{coin_id}': {error}")
+        yield coin_id, data
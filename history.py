@@ -0,0 +1,143 @@
+# history.py
+# คำสั่ง history: ตอบคำถามย้อนหลังจาก price_store ในเครื่อง (ไม่เรียก API เลย)
+import re
+import time
+from datetime import datetime, timezone
+
+from rich.console import Console
+from rich.table import Table
+
+import output
+import price_store
+
+console = Console()
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+HISTORY_COLUMNS = ["time", "price", "market_cap", "volume"]
+OHLC_COLUMNS = ["time", "open", "high", "low", "close", "volume", "count"]
+
+
+def parse_duration(value):
+    """Parses '90s', '15m', '1h', '7d' or '2w' into seconds."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhdw])\s*", value.lower())
+    if not match:
+        raise ValueError(f"Invalid duration '{value}' (use e.g. 15m, 1h, 7d).")
+    return float(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def format_age(seconds):
+    """Short human age such as '45s', '12m', '3h' or '2d'."""
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size:
+            return f"{seconds / size:.0f}{unit}"
+    return f"{seconds:.0f}s"
+
+
+def parse_time(value):
+    """Parses a relative age ('24h' = 24 hours ago) or an ISO-8601 date/time into epoch seconds."""
+    try:
+        return time.time() - parse_duration(value)
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid time '{value}' (use e.g. 24h or 2025-01-31T12:00).")
+    if moment.tzinfo is None:
+        moment = moment.astimezone() # ไม่ระบุ timezone ถือเป็นเวลาท้องถิ่น
+    return moment.timestamp()
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(timespec="seconds")
+
+
+def _clean(value):
+    # NaN = ไม่มีข้อมูลในคอลัมน์นั้น
+    return None if value != value else float(value)
+
+
+def print_recorded_series():
+    pairs = price_store.list_series()
+    if not pairs:
+        console.print("[#f6e10d]No history recorded yet. Run price/top/compare/watch with --record (or CRYPTO_CLI_RECORD=1).[/#f6e10d]")
+        return
+    table = Table(title="🕒 Recorded Series", show_header=True, header_style="bold magenta")
+    table.add_column("Coin", style="bold cyan")
+    table.add_column("Currency", style="yellow")
+    table.add_column("Snapshots", justify="right")
+    table.add_column("Last Snapshot", justify="right")
+    for currency, coin_id in pairs:
+        series = price_store.load_series(coin_id, currency)
+        if series is None:
+            continue
+        last_ts = datetime.fromtimestamp(float(series["ts"][-1])).strftime("%Y-%m-%d %H:%M:%S")
+        table.add_row(coin_id, currency.upper(), f"{len(series['ts']):,}", last_ts)
+    console.print(table)
+
+
+def handle_history_command(args):
+    if not args.coin_id:
+        print_recorded_series()
+        return
+
+    coin_id = args.coin_id.lower()
+    currency = args.vs_currency.lower()
+
+    try:
+        since = parse_time(args.since) if args.since else None
+        until = parse_time(args.until) if args.until else None
+        step = parse_duration(args.resample) if args.resample else None
+    except ValueError as e:
+        console.print(f"[bold #df0000]❌ {e}[/bold #df0000]")
+        return
+
+    series = price_store.load_series(coin_id, currency)
+    if series is None:
+        console.print(f"[#df0000]⚠️ No recorded history for '{coin_id}' in {currency.upper()}.[/#df0000]")
+        console.print("   [#f6e10d]Run price/top/compare/watch with --record (or CRYPTO_CLI_RECORD=1) to start recording.[/#f6e10d]")
+        return
+
+    selected = price_store.query_range(series, since=since, until=until, last=None if step else args.last)
+    if step:
+        selected = price_store.resample_ohlc(selected, step)
+        if args.last is not None:
+            selected = {key: values[-args.last:] for key, values in selected.items()}
+        columns = OHLC_COLUMNS
+        keys = ["ts", "open", "high", "low", "close", "volume", "count"]
+    else:
+        columns = HISTORY_COLUMNS
+        keys = ["ts", "price", "market_cap", "volume"]
+
+    # แปลงทั้งคอลัมน์เป็น list ครั้งเดียว แทนการดึงทีละช่องจาก numpy
+    column_values = [selected[key].tolist() for key in keys]
+    rows = zip(*column_values)
+
+    if args.format != output.TABLE_FORMAT:
+        with output.open_writer(args.format, columns, args.output_stream, types=output.column_types(columns, strings=("time",))) as writer:
+            for values in rows:
+                record = {name: _clean(value) for name, value in zip(columns, values)}
+                record["time"] = _iso(values[0])
+                if "count" in record:
+                    record["count"] = int(values[-1])
+                writer.write_row(record)
+        return
+
+    count = len(column_values[0])
+    title = f"🕒 {coin_id} ({currency.upper()}) — {count} {'bars of ' + args.resample if step else 'snapshots'}"
+    table = Table(title=title, show_header=True, header_style="bold magenta")
+    for name in columns:
+        table.add_column(name.replace("_", " ").title(), justify="left" if name == "time" else "right")
+    for values in rows:
+        cells = [datetime.fromtimestamp(values[0]).strftime("%Y-%m-%d %H:%M:%S")]
+        for name, value in zip(columns[1:], values[1:]):
+            if value != value:
+                cells.append("N/A")
+            elif name == "count":
+                cells.append(str(int(value)))
+            elif name in ("market_cap", "volume"):
+                cells.append(f"{value:,.0f}")
+            else:
+                cells.append(f"{value:,.2f}")
+        table.add_row(*cells)
+    console.print(table)
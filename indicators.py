@@ -0,0 +1,114 @@
+# indicators.py
+# ตัวชี้วัดจากราคาย้อนหลัง (SMA, EMA, ความผันผวน, max drawdown, correlation) คำนวณทั้ง array ด้วย numpy ไม่วนทีละจุด
+# ทุกฟังก์ชันรับ array ของราคาที่เรียงตามเวลาและห่างกันเท่าๆ กัน (1 จุดต่อแท่ง)
+import math
+import warnings
+
+SECONDS_PER_YEAR = 365 * 86400 # คริปโตซื้อขายทุกวัน ไม่มีวันหยุด
+
+
+def sma(values, window):
+    """Simple moving average; the first window-1 points are NaN."""
+    import numpy as np
+
+    values = np.asarray(values, dtype="f8")
+    result = np.full(len(values), np.nan)
+    if window < 1 or len(values) < window:
+        return result
+    sums = np.cumsum(np.r_[0.0, values])
+    result[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return result
+
+
+def ema(values, span):
+    """
+    Exponential moving average with alpha = 2 / (span + 1), seeded with the first value.
+    Computed block by block in closed form: within a block each point is a scaled cumulative sum,
+    and blocks stay short enough that the scaling factors cannot overflow.
+    """
+    import numpy as np
+
+    values = np.asarray(values, dtype="f8")
+    result = np.empty(len(values))
+    if not len(values):
+        return result
+    alpha = 2.0 / (span + 1)
+    decay = 1.0 - alpha
+    if decay <= 0: # span 1 = ไม่เฉลี่ยเลย
+        result[:] = values
+        return result
+    # ema[j] = decay^(j+1) * (ema[-1] + alpha * sum(x[i] / decay^(i+1) for i <= j)) ภายในหนึ่ง block
+    block = max(1, int(30 / -math.log(decay)))
+    previous = values[0]
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        powers = decay ** np.arange(1, len(chunk) + 1)
+        result[start:start + len(chunk)] = powers * previous + alpha * powers * np.cumsum(chunk / powers)
+        previous = result[start + len(chunk) - 1]
+    return result
+
+
+def log_returns(values):
+    """Log returns between consecutive points (one fewer than the input)."""
+    import numpy as np
+
+    values = np.asarray(values, dtype="f8")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.diff(np.log(values))
+
+
+def volatility(values, step_seconds):
+    """Annualized volatility: standard deviation of log returns scaled to a year of step_seconds bars (NaN if too short)."""
+    import numpy as np
+
+    returns = log_returns(values)
+    returns = returns[np.isfinite(returns)]
+    if len(returns) < 2:
+        return float("nan")
+    return float(np.std(returns, ddof=1) * math.sqrt(SECONDS_PER_YEAR / step_seconds))
+
+
+def max_drawdown(values):
+    """Returns (drawdown, peak_index, trough_index): the largest fall from a running high as a fraction (<= 0)."""
+    import numpy as np
+
+    values = np.asarray(values, dtype="f8")
+    if not len(values) or np.isnan(values).all():
+        return float("nan"), None, None
+    peaks = np.fmax.accumulate(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdowns = values / peaks - 1.0
+    trough = int(np.nanargmin(drawdowns))
+    peak = int(np.nanargmax(values[:trough + 1]))
+    return float(drawdowns[trough]), peak, trough
+
+
+def align(series_list, step_seconds):
+    """
+    Lines several (ts, values) pairs up on the bars they all share.
+    Returns (bar start times, matrix) with one column per series.
+    """
+    import numpy as np
+
+    bars = [np.floor(np.asarray(ts) / step_seconds).astype("i8") for ts, _ in series_list]
+    common = bars[0]
+    for other in bars[1:]:
+        common = np.intersect1d(common, other, assume_unique=True)
+    columns = []
+    for (ts, values), own in zip(series_list, bars):
+        columns.append(np.asarray(values, dtype="f8")[np.searchsorted(own, common)])
+    return common.astype("f8") * step_seconds, np.column_stack(columns) if columns else np.empty((0, 0))
+
+
+def correlation(matrix):
+    """Correlation matrix of the log returns of each column of a price matrix (NaN where undefined)."""
+    import numpy as np
+
+    returns = log_returns(matrix.T).T if matrix.size else matrix
+    returns = returns[np.isfinite(returns).all(axis=1)]
+    size = matrix.shape[1] if matrix.ndim == 2 else 0
+    if len(returns) < 2:
+        return np.full((size, size), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning) # คอลัมน์ที่ราคาไม่ขยับเลยให้ผลเป็น NaN
+        return np.corrcoef(returns, rowvar=False).reshape(size, size)
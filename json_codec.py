@@ -0,0 +1,120 @@
+# json_codec.py
+# แปลง JSON ของ API และ cache: ใช้ orjson (ถ้าติดตั้งไว้) เมื่อข้อมูลมากพอจะคุ้มเวลา import ไม่งั้นใช้ json ปกติ
+# พร้อม projection: ตัด payload ให้เหลือเฉพาะ field ที่คำสั่งใช้จริงก่อนเก็บ cache / ส่งต่อ
+import json
+import re
+
+# orjson แปลงเร็วกว่าราว 2-3 เท่า แต่ import เองใช้ ~10ms ซึ่งคุ้มก็ต่อเมื่อแปลงข้อมูลรวมกันเกินราวครึ่ง MB
+# (เช่น top หลายพันเหรียญ หรือ daemon ที่รันค้างไว้) คำสั่งที่ดึงข้อมูลนิดเดียวจึงใช้ json ของ Python
+ORJSON_AFTER_BYTES = 512 * 1024
+
+_orjson = None # None = ยังไม่ได้ลอง import, False = ไม่ได้ติดตั้ง
+_decoded_bytes = 0
+_scan = json.JSONDecoder().scan_once
+_whitespace = re.compile(r"[ \t\n\r]*").match
+
+
+def _fast_parser(size):
+    """orjson once this process has decoded ORJSON_AFTER_BYTES (imported on first use) if installed, else None."""
+    global _orjson, _decoded_bytes
+    _decoded_bytes += size
+    if _orjson is None:
+        if _decoded_bytes < ORJSON_AFTER_BYTES:
+            return None
+        try:
+            import orjson
+            _orjson = orjson
+        except ImportError: # orjson เป็น dependency เสริม
+            _orjson = False
+    return _orjson or None
+
+
+def backend():
+    """Name of the parser in use: 'orjson' once it has been loaded, else 'json'."""
+    return "orjson" if _orjson else "json"
+
+
+def loads(data):
+    """Parses JSON from str or bytes."""
+    parser = _fast_parser(len(data))
+    if parser is not None:
+        return parser.loads(data)
+    return json.loads(data)
+
+
+def dumps(data):
+    """Serializes data to a compact JSON str (with orjson once loads() has loaded it)."""
+    if _orjson:
+        return _orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, separators=(",", ":"))
+
+
+def iter_array(data):
+    """
+    Yields the elements of a top-level JSON array one at a time, so a caller that
+    keeps only a few fields per element never holds the whole decoded list.
+    """
+    # ไม่ใช้ orjson ที่นี่: เวลาส่วนใหญ่อยู่ที่การสร้าง dict ของแต่ละ element ซึ่งเท่ากัน แต่ orjson ต้องถือทั้ง list ไว้
+    text = data.decode("utf-8") if isinstance(data, (bytes, bytearray)) else data
+    index = _whitespace(text, 0).end()
+    if text[index:index + 1] != "[":
+        raise json.JSONDecodeError("Expecting a JSON array", text, index)
+    index = _whitespace(text, index + 1).end()
+    if text[index:index + 1] == "]":
+        return
+    while True:
+        try:
+            value, index = _scan(text, index)
+        except StopIteration as e:
+            raise json.JSONDecodeError("Expecting value", text, e.value) from None
+        yield value
+        # JSON จาก API มักไม่มีช่องว่าง จึงเช็ก ',' ตรงๆ ก่อนค่อยใช้ regex
+        if text[index:index + 1] != ",":
+            index = _whitespace(text, index).end()
+            separator = text[index:index + 1]
+            if separator == "]":
+                return
+            if separator != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, index)
+        index += 1
+        if text[index:index + 1] in " \t\n\r":
+            index = _whitespace(text, index).end()
+
+
+def normalize_fields(fields):
+    """
+    Turns a projection spec into nested dicts: a list of names keeps those keys
+    whole, a dict maps a key to None (keep whole) or to the spec for its value.
+    """
+    if fields is None:
+        return None
+    if not isinstance(fields, dict):
+        return dict.fromkeys(fields)
+    return {name: normalize_fields(sub) for name, sub in fields.items()}
+
+
+def fields_key(fields):
+    """Stable text form of a projection spec, used in cache keys and coalescing keys."""
+    return json.dumps(normalize_fields(fields), sort_keys=True, separators=(",", ":"))
+
+
+def project(data, fields):
+    """
+    Keeps only the keys named by fields (applied to each element of a list).
+    Projecting an already projected value returns the same shape.
+    """
+    if fields is None:
+        return data
+    return _project(data, normalize_fields(fields))
+
+
+def _project(data, fields):
+    if isinstance(data, list):
+        return [_project(item, fields) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {
+        name: data[name] if sub is None else _project(data[name], sub)
+        for name, sub in fields.items()
+        if name in data
+    }
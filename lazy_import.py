@@ -0,0 +1,47 @@
+# lazy_import.py
+# ตัวแทนโมดูล/อ็อบเจกต์ที่ import จริงเมื่อถูกใช้งานครั้งแรก เพื่อให้แต่ละคำสั่งจ่ายเวลาเฉพาะ library ที่ใช้จริง
+import importlib
+import time
+
+# เวลาที่ใช้ import แบบ lazy ทั้งหมด (วินาที) และชื่อที่ถูกโหลดแล้ว (ใช้กับ --profile-startup)
+stats = {"import_seconds": 0.0, "loaded": []}
+
+
+class LazyImport:
+    """
+    Stands in for `import module` / `from module import attr` (or any factory result)
+    until an attribute is accessed or the object is called.
+    """
+
+    def __init__(self, module=None, attr=None, factory=None):
+        self._module = module
+        self._attr = attr
+        self._factory = factory
+        self._target = None
+
+    def _load(self):
+        if self._target is None:
+            start = time.perf_counter()
+            if self._factory is not None:
+                target = self._factory()
+            else:
+                target = importlib.import_module(self._module)
+                if self._attr:
+                    target = getattr(target, self._attr)
+            # factory มักจะเรียก LazyImport ตัวอื่นอยู่แล้ว นับเฉพาะเวลาของการ import โมดูลตรงๆ
+            if self._factory is None:
+                stats["import_seconds"] += time.perf_counter() - start
+                stats["loaded"].append(self._module if not self._attr else f"{self._module}.{self._attr}")
+            self._target = target
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+
+def lazy(module=None, attr=None, factory=None):
+    """Returns a LazyImport for `module` (optionally its `attr`), or for the result of factory()."""
+    return LazyImport(module=module, attr=attr, factory=factory)
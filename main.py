@@ -1,58 +1,83 @@
+import time
+MAIN_STARTED = time.perf_counter() # จุดเริ่มจับเวลาสำหรับ --profile-startup
+
 import argparse
+import contextlib
 import os
 import sys # เพิ่ม sys สำหรับ sys.argv และ sys.exit
-import requests
-from dotenv import load_dotenv
-
-# Import handlers/modules จากไฟล์อื่นๆ
-from detail import handle_detail # สมมติว่า detail.py มีฟังก์ชันนี้ที่คืนข้อมูล
-from compare import handle_compare_command 
-import top_coins # สมมติว่า top_coins.py มี get_top_coins
-
-# Import Rich library components
-from rich.console import Console
-from rich.panel import Panel
-from rich.text import Text
-from rich.table import Table # เพิ่ม Table สำหรับการแสดงผลที่สวยงามขึ้น
-
-# โหลด environment variables จากไฟล์ .env
-load_dotenv()
-
-# ดึง API Key จาก environment variable
-COINGECKO_API_KEY = os.getenv("COINGECKO_API_KEY")
-
-# URL พื้นฐานของ CoinGecko API
-BASE_API_URL = "https://api.coingecko.com/api/v3"
 
-# สร้าง Rich Console object สำหรับการแสดงผล
-console = Console()
+import output
+from lazy_import import lazy, stats as lazy_import_stats
+
+# Import handlers/modules จากไฟล์อื่นๆ แบบ lazy: โหลดจริงเมื่อคำสั่งที่เลือกใช้งานเท่านั้น
+# (เช่น 'help' ไม่ต้องโหลด requests/babel, 'price' ไม่ต้องโหลด compare/watch/numpy)
+requests = lazy("requests")
+load_dotenv = lazy("dotenv", "load_dotenv")
+detail = lazy("detail") # detail.py มี handle_detail / handle_detail_many ที่คืนข้อมูล
+compare = lazy("compare")
+top_coins = lazy("top_coins") # top_coins.py มี get_top_coins / iter_top_coin_pages
+watch = lazy("watch")
+history = lazy("history")
+portfolio = lazy("portfolio")
+chart = lazy("chart")
+table_view = lazy("table_view")
+daemon = lazy("daemon")
+api_client = lazy("api_client")
+batch_price = lazy("batch_price")
+price_store = lazy("price_store")
+response_cache = lazy("response_cache")
+metrics = lazy("metrics")
+
+# Import Rich library components (lazy เช่นกัน)
+Console = lazy("rich.console", "Console")
+Panel = lazy("rich.panel", "Panel")
+Text = lazy("rich.text", "Text")
+Table = lazy("rich.table", "Table") # เพิ่ม Table สำหรับการแสดงผลที่สวยงามขึ้น
+
+# API Key จาก environment variable (โหลด .env ใน load_environment() เฉพาะคำสั่งที่เรียก API)
+COINGECKO_API_KEY = None
+
+# สร้าง Rich Console object สำหรับการแสดงผล (สร้างจริงเมื่อพิมพ์ครั้งแรก)
+console = lazy(factory=lambda: metrics.instrument_console(Console()))
 panel_width = 80 # ความกว้างของ Panel
 
 # --- ฟังก์ชัน Handler สำหรับแต่ละ Subcommand ---
 
 def handle_price_command(args):
-    """Handles the 'price' subcommand."""
-    endpoint = f"{BASE_API_URL}/simple/price"
-    params = {'ids': args.coin_id.lower(), 'vs_currencies': args.vs_currency.lower()}
+    """Handles the 'price' subcommand (one coin/currency, or a batch when lists are given)."""
+    try:
+        coin_ids = batch_price.read_coin_ids(args.coin_id)
+    except OSError as e:
+        console.print(Panel(Text(f"Error: Could not read coin list: {e}", style="bold red"), title="Input Error", width=panel_width))
+        return
+    currencies = batch_price.parse_list(args.vs_currency)
+
+    if not coin_ids or not currencies:
+        console.print(Panel(Text("Error: Please provide at least one coin ID and one currency.", style="bold red"), title="Input Error", width=panel_width))
+        return
+    if len(coin_ids) > 1 or len(currencies) > 1 or args.format != output.TABLE_FORMAT:
+        handle_batch_price(coin_ids, currencies, args)
+        return
+
+    coin_id, vs_currency = coin_ids[0], currencies[0]
+    params = {'ids': coin_id, 'vs_currencies': vs_currency}
     if COINGECKO_API_KEY:
         params['x_cg_demo_api_key'] = COINGECKO_API_KEY
 
     try:
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()
-        data = response.json()
-        coin_id_key = args.coin_id.lower() # ใช้ key ที่ถูกต้อง
-        currency_key = args.vs_currency.lower()
+        data = api_client.get_json("/simple/price", params=params)
+        coin_id_key = coin_id # ใช้ key ที่ถูกต้อง
+        currency_key = vs_currency
 
         if coin_id_key in data and currency_key in data[coin_id_key]:
             price = data[coin_id_key][currency_key]
             price_text = Text(f"The current price of ", style="green")
-            price_text.append(args.coin_id.capitalize(), style="bold cyan")
+            price_text.append(coin_id.capitalize(), style="bold cyan")
             price_text.append(f" is: ", style="green")
-            price_text.append(f"{price:,.2f} {args.vs_currency.upper()}", style="bold yellow")
+            price_text.append(f"{price:,.2f} {vs_currency.upper()}", style="bold yellow")
             console.print(Panel(price_text, title="💰 Coin Price", width=panel_width, border_style="green"))
         else:
-            console.print(Panel(Text(f"Error: Could not retrieve price for '{args.coin_id}' in '{args.vs_currency}'.\nPlease ensure the coin ID (e.g., 'bitcoin') and currency symbol are correct.", style="bold red"), title="Error", width=panel_width))
+            console.print(Panel(Text(f"Error: Could not retrieve price for '{coin_id}' in '{vs_currency}'.\nPlease ensure the coin ID (e.g., 'bitcoin') and currency symbol are correct.", style="bold red"), title="Error", width=panel_width))
             # console.print(f"Debug data: {data}") # Uncomment for debugging
     except requests.exceptions.HTTPError as http_err:
         console.print(Panel(Text(f"HTTP error occurred: {http_err}", style="bold red"), title="API Error", width=panel_width))
@@ -62,6 +87,37 @@ def handle_price_command(args):
         console.print(Panel(Text("Error: Could not decode JSON response from API.", style="bold red"), title="JSON Error", width=panel_width))
 
 
+def handle_batch_price(coin_ids, currencies, args):
+    """Prices many coins in many currencies with a few chunked /simple/price calls and prints one matrix."""
+    prices, errors = batch_price.fetch_prices(coin_ids, currencies, api_key=COINGECKO_API_KEY)
+
+    for chunk, error in errors:
+        console.print(Panel(Text(f"API request error for {len(chunk)} coin(s) starting at '{chunk[0]}': {error}", style="bold red"), title="Request Error", width=panel_width))
+
+    found = [coin_id for coin_id in coin_ids if coin_id in prices]
+    if args.format != output.TABLE_FORMAT:
+        columns = ["coin"] + currencies
+        with output.open_writer(args.format, columns, args.output_stream, types=output.column_types(columns, strings=("coin",))) as writer:
+            for coin_id in found:
+                writer.write_row({"coin": coin_id, **prices[coin_id]})
+    elif found:
+        table = Table(title=f"💰 Coin Prices ({len(found)} coins × {len(currencies)} currencies)", show_header=True, header_style="bold magenta")
+        table.add_column("Coin", style="bold cyan")
+        for currency in currencies:
+            table.add_column(currency.upper(), style="green", justify="right")
+
+        for coin_id in found:
+            row = prices[coin_id]
+            cells = [f"{row[c]:,.2f}" if isinstance(row.get(c), (int, float)) else "N/A" for c in currencies]
+            table.add_row(coin_id, *cells)
+        console.print(table)
+
+    failed_ids = {coin_id for chunk, _ in errors for coin_id in chunk}
+    missing = [coin_id for coin_id in coin_ids if coin_id not in prices and coin_id not in failed_ids]
+    if missing:
+        console.print(Panel(Text(f"No price returned for: {', '.join(missing)}\nPlease ensure the coin IDs (e.g., 'bitcoin') are correct.", style="yellow"), title="Not Found", width=panel_width))
+
+
 def handle_list_command(args):
     """Displays the types of data/features available from the application."""
     list_text_content = Text()
@@ -82,6 +138,10 @@ def handle_list_command(args):
     
     console.print(Panel(list_text_content, title="[bold #20B2AA]Application Capabilities[/]", width=panel_width, border_style="#20B2AA", expand=False))
 
+TOP_COLUMNS = ["rank", "id", "name", "symbol", "current_price", "market_cap", "total_volume"]
+TOP_TYPES = output.column_types(TOP_COLUMNS, strings=("id", "name", "symbol"))
+
+
 def handle_top_command(args):
     """Handles the 'top' subcommand (flexible sorting)."""
     currency = args.vs_currency.lower()
@@ -92,75 +152,171 @@ def handle_top_command(args):
     
     sort = args.sort_by
     
-    # เรียกฟังก์ชันจากไฟล์ top_coins.py
-    data = top_coins.get_top_coins(currency=currency, top_n=limit, sort_by=sort, api_key=COINGECKO_API_KEY)
-
-    if data:
-        table = Table(title=f"📊 Top {limit} Coins (Sorted by {sort.replace('_', ' ').title()}) ({currency.upper()})", show_header=True, header_style="bold magenta", width=panel_width + 16) # เพิ่มความกว้างสำหรับ volume
-        table.add_column("Rank", style="dim", width=6, justify="right")
-        table.add_column("Name", style="cyan", width=25)
-        table.add_column("Symbol", style="bold yellow", width=10)
-        table.add_column(f"Price ({currency.upper()})", style="green", justify="right", width=18)
-        table.add_column(f"Market Cap ({currency.upper()})", style="blue", justify="right", width=22)
-        table.add_column(f"Volume (24h, {currency.upper()})", style="purple", justify="right", width=22)
-
-        for i, coin in enumerate(data):
-            rank = str(i + 1)
-            name = coin.get('name', 'N/A')[:23]
-            symbol = coin.get('symbol', 'N/A').upper()
-            price_val = coin.get('current_price')
-            market_cap_val = coin.get('market_cap')
-            volume_val = coin.get('total_volume')
-
-            price_str = f"{price_val:,.2f}" if isinstance(price_val, (int, float)) else "N/A"
-            market_cap_str = f"{market_cap_val:,}" if isinstance(market_cap_val, (int, float)) else "N/A"
-            volume_str = f"{volume_val:,}" if isinstance(volume_val, (int, float)) else "N/A"
-
-            table.add_row(rank, name, symbol, price_str, market_cap_str, volume_str)
-        console.print(Panel(table, title="Top Coins Sorted", width=panel_width+20, border_style="yellow"))
-    else:
+    title = f"📊 Top {limit} Coins (Sorted by {sort.replace('_', ' ').title()}) ({currency.upper()})"
+
+    if args.format != output.TABLE_FORMAT:
+        with output.open_writer(args.format, TOP_COLUMNS, args.output_stream, types=TOP_TYPES) as writer:
+            for rows in top_coins.iter_top_coin_pages(currency=currency, top_n=limit, sort_by=sort, api_key=COINGECKO_API_KEY):
+                for coin in rows:
+                    writer.write_row({"rank": writer.count + 1, **coin})
+        return
+
+    mode = table_view.choose_mode(limit, console, no_pager=args.no_pager)
+    if mode == table_view.PLAIN_MODE:
+        # stdout เป็น pipe/ไฟล์: เขียนข้อความจัดคอลัมน์ทีละหน้าโดยไม่ผ่าน Rich
+        writer = table_view.PlainWriter(_top_view_columns(currency), sys.stdout, title)
+        for rows in top_coins.iter_top_coin_pages(currency=currency, top_n=limit, sort_by=sort, api_key=COINGECKO_API_KEY):
+            with metrics.span("render", rows=len(rows)):
+                writer.write_rows([{"rank": writer.count + i, **coin} for i, coin in enumerate(rows, start=1)])
+        _print_top_shortfall(writer.count, limit, sort)
+        return
+
+    if mode == table_view.PAGER_MODE:
+        # เกินหน้าจอ: เก็บทุกแถวไว้ในหน่วยความจำครั้งเดียว แล้วเลื่อน/ค้นหา/เรียงใน pager โดยไม่ดึงข้อมูลใหม่
+        rows = []
+        with console.status(f"Fetching top {limit} coins..."):
+            for page in top_coins.iter_top_coin_pages(currency=currency, top_n=limit, sort_by=sort, api_key=COINGECKO_API_KEY):
+                rows.extend({"rank": len(rows) + i, **coin} for i, coin in enumerate(page, start=1))
+        if rows:
+            table_view.page(table_view.TableView(title, _top_view_columns(currency), rows), console)
+        _print_top_shortfall(len(rows), limit, sort)
+        return
+
+    if limit <= top_coins.MAX_PER_PAGE:
+        # เรียกฟังก์ชันจากไฟล์ top_coins.py
+        data = top_coins.get_top_coins(currency=currency, top_n=limit, sort_by=sort, api_key=COINGECKO_API_KEY)
+        if data:
+            table = _new_top_table(title, currency)
+            for i, coin in enumerate(data):
+                _add_top_row(table, i + 1, coin)
+            console.print(Panel(table, title="Top Coins Sorted", width=panel_width+20, border_style="yellow"))
+        else:
+            console.print(Panel(Text(f"No data received from top_coins.get_top_coins for sorting by {sort}.", style="yellow"), title="Info", width=panel_width))
+        return
+
+    # มากกว่า 1 หน้า: พิมพ์ทีละหน้าทันทีที่ได้ข้อมูล (คอลัมน์กว้างคงที่ จึงเรียงตรงกันทุกหน้า)
+    rank = 0
+    for rows in top_coins.iter_top_coin_pages(currency=currency, top_n=limit, sort_by=sort, api_key=COINGECKO_API_KEY):
+        table = _new_top_table(title if rank == 0 else None, currency, show_header=(rank == 0))
+        for coin in rows:
+            rank += 1
+            _add_top_row(table, rank, coin)
+        console.print(table)
+    _print_top_shortfall(rank, limit, sort)
+
+
+def _print_top_shortfall(count, limit, sort):
+    if count == 0:
         console.print(Panel(Text(f"No data received from top_coins.get_top_coins for sorting by {sort}.", style="yellow"), title="Info", width=panel_width))
+    elif count < limit:
+        console.print(Panel(Text(f"Only {count} of {limit} coins could be retrieved.", style="yellow"), title="Info", width=panel_width))
+
+
+def _new_top_table(title, currency, show_header=True):
+    """Builds the empty fixed-width table used by the 'top' subcommand."""
+    table = Table(title=title, show_header=show_header, header_style="bold magenta", width=panel_width + 16) # เพิ่มความกว้างสำหรับ volume
+    table.add_column("Rank", style="dim", width=6, justify="right")
+    table.add_column("Name", style="cyan", width=25)
+    table.add_column("Symbol", style="bold yellow", width=10)
+    table.add_column(f"Price ({currency.upper()})", style="green", justify="right", width=18)
+    table.add_column(f"Market Cap ({currency.upper()})", style="blue", justify="right", width=22)
+    table.add_column(f"Volume (24h, {currency.upper()})", style="purple", justify="right", width=22)
+    return table
+
+
+def _top_view_columns(currency):
+    """Columns of the 'top' table for the plain writer and the pager (same widths as _new_top_table)."""
+    cur = currency.upper()
+    return [
+        table_view.Column("rank", "Rank", "{:d}", "right", "dim", 6),
+        table_view.Column("name", "Name", None, "left", "cyan", 25, truncate=True),
+        table_view.Column("symbol", "Symbol", None, "left", "bold yellow", 10, convert=str.upper),
+        table_view.Column("current_price", f"Price ({cur})", "{:,.2f}", "right", "green", 18),
+        table_view.Column("market_cap", f"Market Cap ({cur})", "{:,}", "right", "blue", 22),
+        table_view.Column("total_volume", f"Volume (24h, {cur})", "{:,}", "right", "purple", 22),
+    ]
 
 
-def handle_detail_command(args):
-    """Handles the 'detail' subcommand."""
-    # เรียกฟังก์ชัน handle_detail จาก detail.py ซึ่งควรจะคืน dictionary ของข้อมูลเหรียญ
-    coin_data = handle_detail(args.coin_id, api_key=COINGECKO_API_KEY) # ส่ง API Key ไปด้วย
+def _add_top_row(table, rank, coin):
+    name = coin.get('name', 'N/A')[:23]
+    symbol = coin.get('symbol', 'N/A').upper()
+    price_val = coin.get('current_price')
+    market_cap_val = coin.get('market_cap')
+    volume_val = coin.get('total_volume')
+
+    price_str = f"{price_val:,.2f}" if isinstance(price_val, (int, float)) else "N/A"
+    market_cap_str = f"{market_cap_val:,}" if isinstance(market_cap_val, (int, float)) else "N/A"
+    volume_str = f"{volume_val:,}" if isinstance(volume_val, (int, float)) else "N/A"
+
+    table.add_row(str(rank), name, symbol, price_str, market_cap_str, volume_str)
+
 
+def handle_detail_command(args):
+    """Handles the 'detail' subcommand (many coin IDs are fetched concurrently and printed as they arrive)."""
+    coin_ids = []
+    try:
+        for spec in args.coin_id:
+            coin_ids.extend(batch_price.read_coin_ids(spec))
+    except OSError as e:
+        console.print(Panel(Text(f"Error: Could not read coin list: {e}", style="bold red"), title="Input Error", width=panel_width))
+        return
+    coin_ids = list(dict.fromkeys(coin_ids))
+
+    if len(coin_ids) == 1 and args.format == output.TABLE_FORMAT:
+        # เรียกฟังก์ชัน handle_detail จาก detail.py ซึ่งควรจะคืน dictionary ของข้อมูลเหรียญ
+        coin_data = detail.handle_detail(coin_ids[0], api_key=COINGECKO_API_KEY) # ส่ง API Key ไปด้วย
+        print_coin_detail(coin_data, coin_ids[0])
+        return
+
+    if args.format != output.TABLE_FORMAT:
+        with output.open_writer(args.format, detail.DETAIL_COLUMNS, args.output_stream, types=detail.DETAIL_TYPES) as writer:
+            for coin_id, coin_data in detail.handle_detail_many(coin_ids, api_key=COINGECKO_API_KEY, max_workers=args.concurrency):
+                if coin_data:
+                    writer.write_row(coin_data)
+                else:
+                    print_coin_detail(coin_data, coin_id)
+        return
+
+    for coin_id, coin_data in detail.handle_detail_many(coin_ids, api_key=COINGECKO_API_KEY, max_workers=args.concurrency):
+        print_coin_detail(coin_data, coin_id)
+
+
+def print_coin_detail(coin_data, coin_id):
+    """Renders one coin's detail panel (or an error panel when coin_data is empty)."""
     if coin_data:
         text_content = Text()
         text_content.append(f"ID           : {coin_data.get('id', 'N/A')}\n", style="white")
         text_content.append(f"Name         : {coin_data.get('name', 'N/A')}\n", style="bold cyan")
         text_content.append(f"Symbol       : {coin_data.get('symbol', 'N/A').upper()}\n", style="bold yellow")
         
-        price_usd = coin_data.get('market_data', {}).get('current_price', {}).get('usd', 'N/A')
-        price_thb = coin_data.get('market_data', {}).get('current_price', {}).get('thb', 'N/A')
+        price_usd = coin_data.get('price_usd', 'N/A')
+        price_thb = coin_data.get('price_thb', 'N/A')
         text_content.append(f"Price (USD)  : ${price_usd:,.2f}\n" if isinstance(price_usd, (int,float)) else f"Price (USD)  : {price_usd}\n", style="green")
         text_content.append(f"Price (THB)  : ฿{price_thb:,.2f}\n" if isinstance(price_thb, (int,float)) else f"Price (THB)  : {price_thb}\n", style="green")
 
-        market_cap_usd = coin_data.get('market_data', {}).get('market_cap', {}).get('usd', 'N/A')
+        market_cap_usd = coin_data.get('market_cap_usd', 'N/A')
         text_content.append(f"Market Cap   : ${market_cap_usd:,}\n" if isinstance(market_cap_usd, (int,float)) else f"Market Cap   : {market_cap_usd}\n", style="blue")
         
-        total_volume_usd = coin_data.get('market_data', {}).get('total_volume', {}).get('usd', 'N/A')
+        total_volume_usd = coin_data.get('total_volume_usd', 'N/A')
         text_content.append(f"Volume (24h) : ${total_volume_usd:,}\n" if isinstance(total_volume_usd, (int,float)) else f"Volume (24h) : {total_volume_usd}\n", style="purple")
 
-        high_24h_usd = coin_data.get('market_data', {}).get('high_24h', {}).get('usd', 'N/A')
-        low_24h_usd = coin_data.get('market_data', {}).get('low_24h', {}).get('usd', 'N/A')
+        high_24h_usd = coin_data.get('high_24h_usd', 'N/A')
+        low_24h_usd = coin_data.get('low_24h_usd', 'N/A')
         text_content.append(f"High 24h     : ${high_24h_usd:,.2f}\n" if isinstance(high_24h_usd, (int,float)) else f"High 24h     : {high_24h_usd}\n", style="dim green")
         text_content.append(f"Low 24h      : ${low_24h_usd:,.2f}\n" if isinstance(low_24h_usd, (int,float)) else f"Low 24h      : {low_24h_usd}\n", style="dim red")
 
-        description = coin_data.get('description', {}).get('en', 'No description available.')
+        description = coin_data.get('description', 'No description available.')
         # ตัด description ให้สั้นลงถ้ามันยาวเกินไป
         description_snippet = (description.split('.')[0] + '.') if '.' in description else description
         description_snippet = (description_snippet[:200] + '...') if len(description_snippet) > 200 else description_snippet
         text_content.append(f"Description  : {description_snippet}\n", style="italic")
         
-        homepage = coin_data.get('links', {}).get('homepage', ['N/A'])[0]
+        homepage = coin_data.get('homepage', 'N/A')
         text_content.append(f"Homepage     : {homepage}\n", style="link {homepage}")
 
-        console.print(Panel(text_content, title=f"🔎 Coin Detail: {coin_data.get('name', args.coin_id)}", width=panel_width, border_style="magenta"))
+        console.print(Panel(text_content, title=f"🔎 Coin Detail: {coin_data.get('name', coin_id)}", width=panel_width, border_style="magenta"))
     else:
-        console.print(Panel(Text(f"Could not retrieve details for coin ID: {args.coin_id}", style="bold red"), title="Error", width=panel_width))
+        console.print(Panel(Text(f"Could not retrieve details for coin ID: {coin_id}", style="bold red"), title="Error", width=panel_width))
 
 
 def handle_help_command(args=None): # args=None เพื่อให้ handler สอดคล้องกัน
@@ -171,10 +327,21 @@ def handle_help_command(args=None): # args=None เพื่อให้ handler
     
     commands_info = [
         ("price <coin_id> <vs_currency>", "Get the current price of a specific coin (e.g., price bitcoin usd)."),
+        ("price <id,id,...|@file|-> <cur,cur,...>", "Price many coins in many currencies at once (e.g., price bitcoin,ethereum usd,eur)."),
         ("list [--limit N] [--currency CUR]", "List top N coins by market cap (default: 10, THB)."),
         ("top [--limit N] [--vs_currency CUR] [--sort-by S]", "Display top N coins with sorting options (default: 10, USD, market_cap)."),
         ("compare <coin1> <coin2>... <vs_currency>", "Compare market data for multiple coins (e.g., compare bitcoin ethereum usd)."),
-        ("detail <coin_id>", "Show detailed information for a specific coin (e.g., detail bitcoin)."),
+        ("compare ... --non-interactive", "Resolve names/symbols/typos without prompting (highest market cap wins)."),
+        ("compare ... --sparkline", "Add a 7-day price trend drawn in the terminal to the comparison table."),
+        ("top | compare ... [--no-pager]", "Tables taller than the terminal open in a pager (scroll, / search, s sort); piped output is plain text."),
+        ("chart <coin_id>... [--days 30] [--sma N] [--ema N]", "History synced incrementally: SMA/EMA, volatility, max drawdown, correlation, sparklines."),
+        ("detail <coin_id> [coin_id ...]", "Show detailed information for one or more coins (e.g., detail bitcoin solana)."),
+        ("watch <coin_id>... [--interval S]", "Keep refreshing prices and highlight what changed (e.g., watch bitcoin ethereum)."),
+        ("portfolio <holdings.csv> [--vs_currency usd,thb]", "Value holdings (coin, quantity, cost_basis): P&L, weights and 24h change per currency."),
+        ("history [coin_id] [--since T] [--resample S]", "Query prices recorded with --record, offline (e.g., history bitcoin --resample 1h)."),
+        ("<command> --stale | --offline", "Answer from cached data now and refresh in the background, or never touch the network."),
+        ("serve [--status]", "Keep a daemon running; price/top/compare/detail then reuse its warm caches."),
+        ("<command> --metrics [--trace-file PATH]", "Show where a price/top/compare/detail run spent its time (HTTP phases, cache, render)."),
         ("help", "Show this help message.")
     ]
     
@@ -198,44 +365,250 @@ def handle_help_command(args=None): # args=None เพื่อให้ handler
     console.print(Panel(help_text_content, title="[bold #40E0D0]Crypto CLI Help[/]", width=panel_width + 10, border_style="#40E0D0", expand=False))
 
 
+def handle_serve_command(args):
+    """Handles the 'serve' subcommand: runs the daemon in the foreground, or reports on a running one."""
+    if args.status:
+        sys.exit(daemon.print_status(args.socket))
+    load_environment()
+    sys.exit(daemon.serve(args.socket, api_key=COINGECKO_API_KEY))
+
+
+def run_handler(args):
+    """Runs the chosen handler; for machine formats, rows go to stdout/--output and messages go to stderr."""
+    fmt = getattr(args, 'format', output.TABLE_FORMAT)
+    if fmt == output.TABLE_FORMAT:
+        args.func(args)
+        finish_stale_responses()
+        return
+
+    try:
+        output.check_format(fmt)
+        args.output_stream = output.open_stream(fmt, args.output)
+    except (output.OutputFormatError, OSError) as e:
+        console.print(Panel(Text(f"Output Error: {e}", style="bold red"), title="Output Error", width=panel_width))
+        sys.exit(1)
+
+    try:
+        # ข้อความ/error panel ทั้งหมดไปที่ stderr เพื่อไม่ให้ปนกับข้อมูลที่ pipe ต่อ
+        with contextlib.redirect_stdout(sys.stderr):
+            args.func(args)
+            finish_stale_responses()
+    finally:
+        if args.output:
+            args.output_stream.close()
+
+
+def finish_stale_responses():
+    """Marks output that came from expired cached data, then lets --stale background refreshes finish (bounded wait)."""
+    client = sys.modules.get("api_client")
+    if client is None:
+        return
+    summary = client.stale_summary()
+    if summary["responses"]:
+        reasons = ", ".join(
+            {"offline": "offline mode", "revalidating": "refreshing in the background"}.get(reason, f"API unavailable: {reason}")
+            for reason in summary["reasons"]
+        )
+        console.print(f"[#f6e10d]⚠️ Showing cached data up to {history.format_age(summary['oldest'])} old ({reasons}).[/#f6e10d]")
+    # ผลลัพธ์แสดงไปแล้ว การรอตรงนี้แค่ให้ cache ได้ข้อมูลใหม่สำหรับการรันครั้งถัดไป
+    still_running = client.wait_for_revalidation()
+    if still_running:
+        print(f"WARNING [main.py]: {still_running} background refresh(es) did not finish in time.", file=sys.stderr)
+
+
+def run_measured(args):
+    """run_handler() inside a 'command' span; the report/files are written even when the handler exits early."""
+    command_span = metrics.span("command", command=args.command_name_for_error)
+    try:
+        with command_span:
+            run_handler(args)
+    finally:
+        metrics.set_gauge("command_duration_seconds", command_span.seconds, command=args.command_name_for_error)
+        if args.metrics:
+            metrics.print_summary(sys.stderr)
+        try:
+            if args.metrics_file:
+                metrics.write_openmetrics(args.metrics_file)
+            if args.trace_file:
+                metrics.write_trace(args.trace_file)
+        except OSError as e:
+            print(f"WARNING [main.py]: Could not write metrics: {e}", file=sys.stderr)
+
+
+def load_environment():
+    """Loads .env and the API key; only subcommands that call the API need this."""
+    global COINGECKO_API_KEY
+    # โหลด environment variables จากไฟล์ .env
+    load_dotenv()
+    # ดึง API Key จาก environment variable
+    COINGECKO_API_KEY = os.getenv("COINGECKO_API_KEY")
+
+    # ตรวจสอบ API Key
+    if COINGECKO_API_KEY is None:
+        # แสดงคำเตือนทาง stderr เพื่อไม่ให้ปนกับ output แบบ --format json/csv ที่ pipe ต่อ
+        with contextlib.redirect_stdout(sys.stderr):
+            console.print(Panel(Text(
+                "⚠️ Warning: COINGECKO_API_KEY not found in .env file or environment variables.\n"
+                "Some features might not work correctly or might be rate-limited.\n"
+                "Please create a .env file with COINGECKO_API_KEY='your_api_key_here'.", style="yellow"
+            ), title="API Key Missing", width=panel_width, border_style="yellow"))
+            console.print("-" * panel_width)
+
+
+def print_startup_profile(marks):
+    """
+    Prints the --profile-startup report (milliseconds) to stderr. `marks` holds
+    (perf_counter, lazy import seconds so far) pairs for: parse_started, parsed, handler_started, handler_finished.
+    """
+    # ตัวเลขเวลา import ไม่รวมเวลาเริ่ม interpreter ของ Python เอง (ดูได้ด้วย python -X importtime)
+    client = sys.modules.get("api_client")
+    stats = client.network_stats() if client else {"seconds": 0.0, "requests": 0}
+
+    def span(start, end):
+        # เวลาช่วงหนึ่ง หักเวลา lazy import ที่เกิดในช่วงนั้นออก (นับรวมในบรรทัด import แทน)
+        return (marks[end][0] - marks[start][0]) - (marks[end][1] - marks[start][1])
+
+    eager_imports = marks["parse_started"][0] - MAIN_STARTED
+    lazy_imports = lazy_import_stats["import_seconds"]
+    rows = [
+        ("import", eager_imports + lazy_imports, f"main.py {eager_imports * 1000:.1f} + lazy {lazy_imports * 1000:.1f}: {', '.join(lazy_import_stats['loaded']) or '-'}"),
+        ("parse", span("parse_started", "parsed"), ""),
+        ("setup", span("parsed", "handler_started"), ".env, cache, recorder"),
+        ("network", stats["seconds"], f"{stats['requests']} request(s)"),
+        ("render", max(0.0, span("handler_started", "handler_finished") - stats["seconds"]), ""),
+        ("total", marks["handler_finished"][0] - MAIN_STARTED, "excluding interpreter start-up"),
+    ]
+    lines = ["Startup profile (ms):"]
+    for name, seconds, note in rows:
+        lines.append(f"  {name:<8}{seconds * 1000:8.1f}" + (f"  ({note})" if note else ""))
+    print("\n".join(lines), file=sys.stderr)
+
+
+def positive_int(value):
+    """argparse type for counts that must be at least 1 (e.g. history --last)."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{value}'")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
 def main():
+    marks = {"parse_started": (time.perf_counter(), lazy_import_stats["import_seconds"])}
     parser = argparse.ArgumentParser(
         description="Crypto CLI - Fetch cryptocurrency data from CoinGecko API.",
         add_help=True
     )
+    parser.add_argument("--profile-startup", action="store_true", help="Print import/parse/network/render timings to stderr.")
+
+    # --- ตัวเลือกที่ใช้ได้ทั้งก่อนและหลังชื่อคำสั่ง ---
+    # default=SUPPRESS: ถ้าไม่ได้ใส่หลังคำสั่ง subparser จะไม่เขียนทับค่าที่ใส่ไว้ก่อนคำสั่ง
+    global_options = argparse.ArgumentParser(add_help=False)
+    global_options.add_argument("--profile-startup", action="store_true", default=argparse.SUPPRESS, help="Print import/parse/network/render timings to stderr.")
+
+    # --- ตัวเลือกที่ใช้ร่วมกันในทุกคำสั่งที่เรียก API ---
+    api_options = argparse.ArgumentParser(add_help=False)
+    api_options.add_argument("--max-age", type=int, default=None, metavar="SECONDS", help="Accept cached API responses up to SECONDS old (overrides the per-endpoint TTL).")
+    api_options.add_argument("--no-cache", action="store_true", help="Always fetch fresh data from the API (skip the response cache).")
+    api_options.add_argument("--record", action="store_true", help="Append every fetched price/market snapshot to the local history store (see 'history').")
+    api_options.add_argument("--stale", action="store_true", help="Answer from expired cached data immediately and refresh it in the background (also: CRYPTO_CLI_STALE=1).")
+    api_options.add_argument("--offline", action="store_true", help="Never touch the network: answer only from cached data, whatever its age.")
+    api_options.add_argument("--no-daemon", action="store_true", help="Call the API directly even when a 'serve' daemon is running.")
+    api_options.add_argument("--metrics", action="store_true", help="Print a breakdown of HTTP phases, cache hits and render time to stderr.")
+    api_options.add_argument("--metrics-file", default=None, metavar="PATH", help="Write counters to PATH in OpenMetrics (Prometheus text) format.")
+    api_options.add_argument("--trace-file", default=None, metavar="PATH", help="Write the command's spans to PATH as OTLP/JSON.")
+
+    format_options = argparse.ArgumentParser(add_help=False)
+    format_options.add_argument("--format", default=output.TABLE_FORMAT, choices=output.FORMATS, help="Output format (default: table). Machine formats stream rows as they are fetched.")
+    format_options.add_argument("--output", "-o", default=None, metavar="PATH", help="Write machine-readable output to PATH instead of stdout.")
 
     subparsers = parser.add_subparsers(title="Available Subcommands", help="Run 'main.py <subcommand> -h' for more help on a specific command.", required=True, dest="command_name_for_error")
 
     # --- Subcommand: price ---
-    price_parser = subparsers.add_parser("price", help="Get the current price of a coin.", add_help=True) # เปิด add_help สำหรับ subparser
-    price_parser.add_argument("coin_id", type=str, help="The CoinGecko ID of the cryptocurrency (e.g., bitcoin, ethereum).")
-    price_parser.add_argument("vs_currency", type=str, help="The currency to compare against (e.g., usd, thb).")
-    price_parser.set_defaults(func=handle_price_command)
+    price_parser = subparsers.add_parser("price", help="Get the current price of a coin.", add_help=True, parents=[global_options, api_options, format_options]) # เปิด add_help สำหรับ subparser
+    price_parser.add_argument("coin_id", type=str, help="CoinGecko ID(s) of the cryptocurrency: 'bitcoin', a comma list 'bitcoin,ethereum', '@file' (one ID per line) or '-' for stdin.")
+    price_parser.add_argument("vs_currency", type=str, help="The currency (or comma list of currencies) to compare against (e.g., usd or usd,thb,eur).")
+    price_parser.set_defaults(func=handle_price_command, uses_api=True, delegates=True)
 
     # --- Subcommand: list ---
-    list_parser = subparsers.add_parser("list", help="List the types of data and features available in this application.", add_help=True)
+    list_parser = subparsers.add_parser("list", help="List the types of data and features available in this application.", add_help=True, parents=[global_options])
     list_parser.set_defaults(func=handle_list_command)
 
     # --- Subcommand: top ---
-    top_parser = subparsers.add_parser("top", help="Display top N cryptocurrencies with sorting.", add_help=True)
+    top_parser = subparsers.add_parser("top", help="Display top N cryptocurrencies with sorting.", add_help=True, parents=[global_options, api_options, format_options])
     top_parser.add_argument("--limit", type=int, default=10, help="Number of top coins to display (default: 10).")
     top_parser.add_argument("--vs_currency", type=str, default="usd", help="The currency for data display (default: usd).") # เปลี่ยนชื่อ help
     top_parser.add_argument("--sort-by", type=str, default="market_cap", choices=['market_cap', 'volume'], help="Sort by 'market_cap' or 'volume' (default: market_cap).")
-    top_parser.set_defaults(func=handle_top_command)
+    top_parser.add_argument("--no-pager", action="store_true", help="Print the whole table even when it is taller than the terminal.")
+    top_parser.set_defaults(func=handle_top_command, uses_api=True, delegates=True)
 
     # --- Subcommand: compare ---
-    compare_parser = subparsers.add_parser("compare", help="Compare market data for multiple cryptocurrencies.", add_help=True)
+    compare_parser = subparsers.add_parser("compare", help="Compare market data for multiple cryptocurrencies.", add_help=True, parents=[global_options, api_options, format_options])
     compare_parser.add_argument("coins", nargs="+", help="List of CoinGecko IDs or symbols to compare (e.g., bitcoin ethereum).") 
     compare_parser.add_argument("vs_currency", help="The currency to compare against (e.g., usd, thb).") 
-    compare_parser.set_defaults(func=lambda args_obj: handle_compare_command(args_obj, api_key_global=COINGECKO_API_KEY))
+    compare_parser.add_argument("--sparkline", action="store_true", help="Add a 7-day price sparkline column to the table.")
+    compare_parser.add_argument("--no-pager", action="store_true", help="Print the whole table even when it is taller than the terminal.")
+    compare_parser.add_argument("--non-interactive", action="store_true", help="Never prompt: ambiguous symbols resolve to the coin with the highest market cap.")
+    compare_parser.set_defaults(func=lambda args_obj: compare.handle_compare_command(args_obj, api_key_global=COINGECKO_API_KEY), uses_api=True, delegates=True)
 
     # --- Subcommand: detail ---
-    detail_parser = subparsers.add_parser("detail", help="Show detailed information for a specific coin.", add_help=True)
-    detail_parser.add_argument("coin_id", type=str, help="CoinGecko ID of the cryptocurrency (e.g., bitcoin).")
-    detail_parser.set_defaults(func=handle_detail_command)
+    detail_parser = subparsers.add_parser("detail", help="Show detailed information for a specific coin.", add_help=True, parents=[global_options, api_options, format_options])
+    detail_parser.add_argument("coin_id", type=str, nargs="+", help="CoinGecko ID(s) of the cryptocurrency (e.g., bitcoin), comma lists, '@file' or '-' for stdin.")
+    detail_parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of coins fetched in parallel (default: 4).")
+    detail_parser.set_defaults(func=handle_detail_command, uses_api=True, delegates=True)
+
+    # --- Subcommand: portfolio ---
+    portfolio_parser = subparsers.add_parser("portfolio", help="Value a holdings file: market value, unrealized P&L, weights and 24h change.", add_help=True, parents=[global_options, api_options, format_options])
+    portfolio_parser.add_argument("holdings", type=str, help="CSV file with 'coin', 'quantity' and optional 'cost_basis' (total paid) columns, or '-' for stdin.")
+    portfolio_parser.add_argument("--vs_currency", type=str, default="usd", help="Currency or comma list of currencies to value in (default: usd); the first one is used for sorting and the table.")
+    portfolio_parser.add_argument("--cost-currency", type=str, default=None, help="Currency of the cost_basis column (default: the first --vs_currency). Fetched for P&L but only shown if also listed in --vs_currency.")
+    portfolio_parser.add_argument("--sort-by", type=str, default="value", choices=['value', 'pnl', 'pnl_pct', 'change', 'coin'], help="Order of the positions, largest first (default: value).")
+    portfolio_parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of price requests in flight (default: 4).")
+    portfolio_parser.set_defaults(func=lambda args_obj: portfolio.handle_portfolio_command(args_obj, api_key=COINGECKO_API_KEY), uses_api=True, delegates=True)
+
+    # --- Subcommand: chart ---
+    chart_parser = subparsers.add_parser("chart", help="Price/volume history with SMA/EMA, volatility, drawdown, correlation and sparklines.", add_help=True, parents=[global_options, api_options, format_options])
+    chart_parser.add_argument("coins", nargs="+", help="CoinGecko IDs of the cryptocurrencies (e.g., bitcoin ethereum).")
+    chart_parser.add_argument("--vs_currency", type=str, default="usd", help="The currency of the chart (default: usd).")
+    chart_parser.add_argument("--days", type=int, default=30, help="Days of history (default: 30). Bars are 5m up to 1 day, 1h up to 90 days, then 1d.")
+    chart_parser.add_argument("--sma", type=int, default=20, metavar="N", help="Simple moving average window in bars (default: 20).")
+    chart_parser.add_argument("--ema", type=int, default=20, metavar="N", help="Exponential moving average span in bars (default: 20).")
+    chart_parser.add_argument("--width", type=int, default=24, help="Sparkline width in characters (default: 24).")
+    chart_parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of coins synced in parallel (default: 4).")
+    chart_parser.set_defaults(func=lambda args_obj: chart.handle_chart_command(args_obj, api_key=COINGECKO_API_KEY), uses_api=True)
+
+    # --- Subcommand: watch ---
+    watch_parser = subparsers.add_parser("watch", help="Keep polling prices for coins and show only what changed.", add_help=True, parents=[global_options])
+    watch_parser.add_argument("coins", nargs="+", help="CoinGecko IDs to watch (e.g., bitcoin ethereum).")
+    watch_parser.add_argument("--vs_currency", type=str, default="usd", help="The currency for data display (default: usd).")
+    watch_parser.add_argument("--interval", type=float, default=15, help="Seconds between refreshes (default: 15). Grows automatically when the API rate-limits us.")
+    watch_parser.add_argument("--markets", action="store_true", help="Poll /coins/markets instead of /simple/price.")
+    watch_parser.add_argument("--count", type=int, default=None, help="Stop after this many refreshes (default: run until Ctrl+C).")
+    watch_parser.add_argument("--record", action="store_true", help="Append every snapshot to the local history store (see 'history').")
+    watch_parser.add_argument("--format", default=output.TABLE_FORMAT, choices=output.STREAM_FORMATS, help="Output format (default: table). ndjson/csv emit only rows that changed.")
+    watch_parser.add_argument("--output", "-o", default=None, metavar="PATH", help="Write machine-readable output to PATH instead of stdout.")
+    watch_parser.set_defaults(func=lambda args_obj: watch.handle_watch_command(args_obj, api_key_global=COINGECKO_API_KEY), uses_api=True)
+
+    # --- Subcommand: history ---
+    history_parser = subparsers.add_parser("history", help="Query locally recorded price snapshots (no API calls).", add_help=True, parents=[global_options, format_options])
+    history_parser.add_argument("coin_id", type=str, nargs="?", help="CoinGecko ID of the cryptocurrency (omit to list recorded coins).")
+    history_parser.add_argument("--vs_currency", type=str, default="usd", help="The currency of the recorded series (default: usd).")
+    history_parser.add_argument("--since", type=str, default=None, help="Start of the range: age such as 24h/7d, or an ISO date/time.")
+    history_parser.add_argument("--until", type=str, default=None, help="End of the range: age such as 1h, or an ISO date/time.")
+    history_parser.add_argument("--last", type=positive_int, default=None, help="Only the last N snapshots (or bars when resampling).")
+    history_parser.add_argument("--resample", type=str, default=None, metavar="STEP", help="Aggregate into OHLC bars of STEP (e.g. 15m, 1h, 1d).")
+    history_parser.set_defaults(func=lambda args_obj: history.handle_history_command(args_obj))
+
+    # --- Subcommand: serve ---
+    serve_parser = subparsers.add_parser("serve", help="Run a background daemon that price/top/compare/detail delegate to.", add_help=True, parents=[global_options])
+    serve_parser.add_argument("--socket", type=str, default=None, metavar="PATH", help="Unix socket to listen on (default: $CRYPTO_CLI_SOCKET or <cache dir>/daemon.sock).")
+    serve_parser.add_argument("--status", action="store_true", help="Print the running daemon's statistics and exit.")
+    serve_parser.set_defaults(func=handle_serve_command)
 
     # --- Subcommand: help ---
-    help_parser = subparsers.add_parser("help", help="Show this custom help message.", add_help=False) # help ของ help ไม่ต้องมี
+    help_parser = subparsers.add_parser("help", help="Show this custom help message.", add_help=False, parents=[global_options]) # help ของ help ไม่ต้องมี
     help_parser.set_defaults(func=handle_help_command)
     
     # --- ดักกรณีรัน docker run -it crypto-cli โดยไม่ใส่ subcommand ---
@@ -245,8 +618,27 @@ def main():
 
     try:
         args = parser.parse_args()
+        marks["parsed"] = (time.perf_counter(), lazy_import_stats["import_seconds"])
+        if getattr(args, 'metrics', False) or getattr(args, 'metrics_file', None) or getattr(args, 'trace_file', None):
+            metrics.enable()
+        if getattr(args, 'uses_api', False):
+            load_environment()
+            response_cache.configure(enabled=not getattr(args, 'no_cache', False), max_age=getattr(args, 'max_age', None))
+            api_client.set_stale_mode(serve_stale=getattr(args, 'stale', False) or os.getenv("CRYPTO_CLI_STALE") == "1", offline=getattr(args, 'offline', False))
+            if getattr(args, 'record', False) or os.getenv("CRYPTO_CLI_RECORD") == "1":
+                api_client.add_response_listener(price_store.record_response)
+            # ส่งต่อคำขอให้ daemon (ถ้ามีรันอยู่) แทนการเริ่ม session/cache/coin index ใหม่เอง
+            if getattr(args, 'delegates', False) and not args.no_daemon and not args.offline and os.getenv("CRYPTO_CLI_DAEMON", "1") != "0":
+                api_client.set_remote(daemon.connect())
         if hasattr(args, 'func'):
-            args.func(args)
+            marks["handler_started"] = (time.perf_counter(), lazy_import_stats["import_seconds"])
+            if metrics.enabled():
+                run_measured(args)
+            else:
+                run_handler(args)
+            marks["handler_finished"] = (time.perf_counter(), lazy_import_stats["import_seconds"])
+            if args.profile_startup:
+                print_startup_profile(marks)
         else:
             # กรณีนี้ไม่ควรเกิดถ้า subparsers.required=True และทุก command มี func
             # แต่ argparse อาจจะแสดง error ของตัวเองไปแล้ว
@@ -263,12 +655,4 @@ def main():
 
 
 if __name__ == "__main__":
-    # ตรวจสอบ API Key (นำ comment ออกถ้าต้องการใช้งานจริง)
-    if COINGECKO_API_KEY is None:
-        console.print(Panel(Text(
-            "⚠️ Warning: COINGECKO_API_KEY not found in .env file or environment variables.\n"
-            "Some features might not work correctly or might be rate-limited.\n"
-            "Please create a .env file with COINGECKO_API_KEY='your_api_key_here'.", style="yellow"
-        ), title="API Key Missing", width=panel_width, border_style="yellow"))
-        console.print("-" * panel_width)
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,367 @@
+# metrics.py
+# เก็บเวลาแต่ละช่วง (span) และตัวนับของการเรียก API, cache และการแสดงผล เพื่อตอบว่าคำสั่งช้าเพราะอะไร
+# ปิดอยู่โดยปริยาย: span() คืน context ว่างที่แทบไม่มีต้นทุน และ add() ไม่ทำอะไร จนกว่าจะเรียก enable()
+import contextlib
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+SERVICE_NAME = "crypto-cli"
+HTTP_PHASES = ["queue", "dns", "connect", "tls", "server", "download", "decode"]
+
+# ชื่อ metric -> (ชนิด, คำอธิบาย) สำหรับไฟล์ OpenMetrics
+METRIC_TYPES = {
+    "http_requests": ("counter", "HTTP attempts by endpoint and status code."),
+    "http_retries": ("counter", "HTTP attempts that were retried (429, 5xx, connection errors)."),
+    "http_throttled": ("counter", "HTTP 429 responses."),
+    "http_response_bytes": ("counter", "Response body bytes received, by endpoint."),
+    "http_phase_seconds": ("counter", "Time spent in each phase of the HTTP calls."),
+    "http_new_connections": ("counter", "Connections opened (the rest reused keep-alive connections)."),
+    "stale_responses": ("counter", "Expired cached responses served instead of calling the API, by reason."),
+    "stale_revalidations": ("counter", "Background refreshes of responses served stale, by result."),
+    "cache_lookups": ("counter", "Response cache lookups by tier and result."),
+    "render_seconds": ("counter", "Time spent rendering terminal output."),
+    "command_duration_seconds": ("gauge", "Wall time of the command."),
+}
+
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+_spans = []
+_counters = defaultdict(float)
+_trace_id = 0
+
+
+class Span:
+    """A timed operation; finished spans are kept for the summary and the trace dump."""
+
+    __slots__ = ("name", "span_id", "parent_id", "attributes", "start_ns", "end_ns", "_started")
+
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.start_ns = self.end_ns = 0
+        self._started = 0.0
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def seconds(self):
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def __enter__(self):
+        _stack().append(self)
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # ใช้ perf_counter หาช่วงเวลา (แม่นกว่า) แล้วคำนวณเวลาสิ้นสุดจากเวลาเริ่ม
+        self.end_ns = self.start_ns + int((time.perf_counter() - self._started) * 1e9)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        with _lock:
+            _spans.append(self)
+        return False
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def enable():
+    """Starts collecting spans and counters for this process."""
+    global _enabled, _trace_id
+    _enabled = True
+    _trace_id = random.getrandbits(128)
+
+
+def enabled():
+    return _enabled
+
+
+def span(name, **attributes):
+    """Returns a context manager timing `name` as a child of the current span (a no-op while disabled)."""
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, current(), attributes)
+
+
+def current():
+    """The innermost open span on this thread, or None."""
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+@contextlib.contextmanager
+def attached(parent):
+    """Makes `parent` (captured on another thread) the current span, so worker-thread spans nest under it."""
+    stack = _stack()
+    if parent is not None:
+        stack.append(parent)
+    try:
+        yield
+    finally:
+        if parent is not None and stack and stack[-1] is parent:
+            stack.pop()
+
+
+def add(name, value=1, **labels):
+    """Adds value to the counter `name` with the given labels (ignored while disabled)."""
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] += value
+
+
+def set_gauge(name, value, **labels):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[(name, tuple(sorted(labels.items())))] = value
+
+
+def endpoint_label(path):
+    """Collapses per-coin paths (/coins/bitcoin -> /coins/{id}) so labels stay low-cardinality."""
+    parts = path.split("/")
+    if len(parts) >= 3 and parts[1] == "coins" and parts[2] not in ("list", "markets", "categories"):
+        parts[2] = "{id}"
+    return "/".join(parts)
+
+
+def instrument_console(console):
+    """Wraps console.print so every call is recorded as a 'render' span."""
+    original = console.print
+
+    def timed_print(*args, **kwargs):
+        if not _enabled:
+            return original(*args, **kwargs)
+        with span("render") as render:
+            result = original(*args, **kwargs)
+        add("render_seconds", render.seconds)
+        return result
+
+    console.print = timed_print
+    return console
+
+
+# --- เวลาของ DNS / TCP / TLS ต่อ request (ผ่าน connection ของ urllib3) ---
+
+def request_phases():
+    """Per-thread {phase: seconds} filled in by instrumented connections during one HTTP attempt."""
+    phases = getattr(_local, "phases", None)
+    if phases is None:
+        phases = _local.phases = defaultdict(float)
+    return phases
+
+
+def reset_request_phases():
+    _local.phases = defaultdict(float)
+    return _local.phases
+
+
+def instrument_adapter(adapter):
+    """
+    Makes a requests HTTPAdapter time DNS resolution, TCP connect and the TLS
+    handshake of every new connection into request_phases(). Reused keep-alive
+    connections record nothing, which is the point of keeping them.
+    """
+    import socket
+
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+    from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+
+    class TimedConnectionMixin:
+        def _new_conn(self):
+            phases = request_phases()
+            started = time.perf_counter()
+            try:
+                addresses = socket.getaddrinfo(self._dns_host, self.port, 0, socket.SOCK_STREAM)
+            except socket.gaierror as e:
+                raise NameResolutionError(self.host, self, e) from e
+            resolved = time.perf_counter()
+            phases["dns"] += resolved - started
+            # ต่อไปยัง IP ที่ resolve แล้วทีละตัวตามลำดับ (เหมือน create_connection ของ urllib3) เพื่อแยกเวลา DNS
+            # ออกจากเวลา connect โดยยัง fallback ไปที่อยู่ถัดไปได้ถ้าตัวแรกต่อไม่ติด (hostname เดิมยังใช้กับ TLS/SNI)
+            host = self._dns_host
+            error = None
+            try:
+                for ip in dict.fromkeys(address[4][0] for address in addresses):
+                    self._dns_host = ip
+                    try:
+                        sock = super()._new_conn()
+                        break
+                    except (ConnectTimeoutError, NewConnectionError) as e:
+                        error = e
+                else:
+                    raise error or NewConnectionError(self, f"getaddrinfo returned no addresses for {host}")
+            finally:
+                self._dns_host = host
+                phases["connect"] += time.perf_counter() - resolved
+            phases["new_connections"] += 1
+            return sock
+
+    class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+        pass
+
+    class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+        def connect(self):
+            phases = request_phases()
+            before = phases["dns"] + phases["connect"]
+            started = time.perf_counter()
+            super().connect()
+            # connect() ของ HTTPS = _new_conn() + TLS handshake
+            phases["tls"] += time.perf_counter() - started - (phases["dns"] + phases["connect"] - before)
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = TimedHTTPConnection
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = TimedHTTPSConnection
+
+    adapter.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+    return adapter
+
+
+# --- การส่งออก ---
+
+def _sum(name, **match):
+    total = 0.0
+    for (metric, labels), value in _counters.items():
+        labels = dict(labels)
+        if metric == name and all(labels.get(k) == v for k, v in match.items()):
+            total += value
+    return total
+
+
+def print_summary(file=None):
+    """Prints a compact breakdown of where the command spent its time (to stderr by default)."""
+    file = file or sys.stderr
+    command = next((s for s in reversed(_spans) if s.name == "command"), None)
+    requests_made = _sum("http_requests")
+    lines = ["Metrics:"]
+    if command is not None:
+        lines.append(f"  command   {command.seconds * 1000:9.1f} ms  ({command.attributes.get('command', '?')})")
+    lines.append(
+        f"  http      {int(requests_made)} request(s), {int(_sum('http_retries'))} retried, "
+        f"{int(_sum('http_throttled'))} throttled, {_sum('http_response_bytes') / 1024:,.1f} KiB, "
+        f"{int(_sum('http_new_connections'))} new connection(s)"
+    )
+    phases = "  ".join(f"{phase} {_sum('http_phase_seconds', phase=phase) * 1000:.1f}" for phase in HTTP_PHASES)
+    lines.append(f"  phases ms {phases}")
+    lookups = []
+    for tier in ("memory", "disk", "daemon"):
+        hits = _sum("cache_lookups", tier=tier, result="hit")
+        misses = _sum("cache_lookups", tier=tier, result="miss") + _sum("cache_lookups", tier=tier, result="expired")
+        if hits or misses:
+            lookups.append(f"{tier} {int(hits)} hit / {int(misses)} miss")
+    stale = _sum("stale_responses")
+    if stale:
+        lookups.append(f"{int(stale)} stale served, {int(_sum('stale_revalidations', result='ok'))} refreshed in background")
+    lines.append(f"  cache     {', '.join(lookups) or 'not used'}")
+    renders = [s for s in _spans if s.name == "render"]
+    lines.append(f"  render    {sum(s.seconds for s in renders) * 1000:9.1f} ms  ({len(renders)} print call(s))")
+
+    attempts = defaultdict(int)
+    for s in _spans:
+        if s.name == "http.attempt":
+            attempts[s.parent_id] += 1
+    slowest = sorted((s for s in _spans if s.name == "http.request"), key=lambda s: s.seconds, reverse=True)[:3]
+    for s in slowest:
+        lines.append(f"  slowest   {s.seconds * 1000:9.1f} ms  {s.attributes.get('endpoint')} (status {s.attributes.get('status')}, {attempts[s.span_id]} attempt(s))")
+    print("\n".join(lines), file=file)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def write_openmetrics(path):
+    """Writes every counter/gauge in OpenMetrics (Prometheus text) format."""
+    families = defaultdict(list)
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            families[name].append((labels, value))
+
+    lines = []
+    for name, samples in families.items():
+        kind, help_text = METRIC_TYPES.get(name, ("gauge", ""))
+        family = f"crypto_cli_{name}"
+        lines.append(f"# TYPE {family} {kind}")
+        if help_text:
+            lines.append(f"# HELP {family} {help_text}")
+        suffix = "_total" if kind == "counter" else ""
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_escape_label(val)}"' for key, val in labels)
+            lines.append(f"{family}{suffix}{{{label_text}}} {value:.9g}" if label_text else f"{family}{suffix} {value:.9g}")
+    lines.append("# EOF")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def write_trace(path):
+    """Writes the finished spans as OTLP/JSON (resourceSpans -> scopeSpans -> spans)."""
+    with _lock:
+        spans = sorted(_spans, key=lambda s: s.start_ns)
+    payload = {
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": SERVICE_NAME},
+                "spans": [
+                    {
+                        "traceId": f"{_trace_id:032x}",
+                        "spanId": f"{s.span_id:016x}",
+                        **({"parentSpanId": f"{s.parent_id:016x}"} if s.parent_id is not None else {}),
+                        "name": s.name,
+                        "kind": 3 if s.name.startswith("http.") else 1, # 3 = CLIENT, 1 = INTERNAL
+                        "startTimeUnixNano": str(s.start_ns),
+                        "endTimeUnixNano": str(s.end_ns),
+                        "attributes": [_attribute(key, value) for key, value in s.attributes.items()],
+                        **({"status": {"code": 2, "message": s.attributes["error"]}} if "error" in s.attributes else {}),
+                    }
+                    for s in spans
+                ],
+            }],
+        }]
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
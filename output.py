@@ -0,0 +1,189 @@
+# output.py
+# ชั้นแสดงผลแบบ machine-readable ที่ใช้ร่วมกันทุกคำสั่ง: เขียนทีละแถวทันทีที่ได้ข้อมูล ไม่ต้องสร้าง Rich Table ทั้งก้อน
+import csv
+import json
+import sys
+
+TABLE_FORMAT = "table"
+FORMATS = [TABLE_FORMAT, "json", "ndjson", "csv", "arrow", "parquet"]
+STREAM_FORMATS = [TABLE_FORMAT, "ndjson", "csv"] # รูปแบบที่ต่อท้ายได้เรื่อยๆ สำหรับคำสั่งที่ไม่จบเอง (watch)
+BINARY_FORMATS = {"arrow", "parquet"}
+ARROW_BATCH_SIZE = 1024 # จำนวนแถวต่อ record batch (หน่วยความจำคงที่ไม่ขึ้นกับจำนวนแถวทั้งหมด)
+STRING = "string"
+NUMBER = "number" # จำนวนเต็มก็เก็บเป็น float64 เพราะ API ส่งปนกัน
+
+
+class OutputFormatError(Exception):
+    """Raised when a requested output format cannot be produced (e.g. pyarrow is not installed)."""
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise OutputFormatError("The arrow/parquet formats need the optional 'pyarrow' package (pip install pyarrow).")
+
+
+def check_format(fmt):
+    """Fails early (before any network call) when fmt needs an optional dependency that is missing."""
+    if fmt not in FORMATS:
+        raise OutputFormatError(f"Unknown output format '{fmt}'. Choose from: {', '.join(FORMATS)}.")
+    if fmt in BINARY_FORMATS:
+        _import_pyarrow()
+
+
+def open_stream(fmt, path=None):
+    """Opens the destination for fmt: the given path, or stdout (binary buffer for arrow/parquet)."""
+    binary = fmt in BINARY_FORMATS
+    if path:
+        return open(path, "wb") if binary else open(path, "w", encoding="utf-8", newline="")
+    return sys.stdout.buffer if binary else sys.stdout
+
+
+def column_types(columns, strings=()):
+    """{column: STRING or NUMBER} for a command's columns: the names in strings hold text, the rest numbers."""
+    return {name: STRING if name in strings else NUMBER for name in columns}
+
+
+class RowWriter:
+    """Base class: write_row() for each record as it becomes available, close() once at the end."""
+
+    def __init__(self, columns, stream):
+        self.columns = list(columns)
+        self.stream = stream
+        self.count = 0
+
+    def write_row(self, row):
+        self._write({name: row.get(name) for name in self.columns})
+        self.count += 1
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write_row(row)
+
+    def _write(self, record):
+        raise NotImplementedError
+
+    def close(self):
+        self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class NdjsonWriter(RowWriter):
+    def _write(self, record):
+        self.stream.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        self.stream.write("\n")
+
+
+class JsonWriter(RowWriter):
+    """Writes one JSON array, emitting elements incrementally instead of json.dumps on a full list."""
+
+    def _write(self, record):
+        self.stream.write("[\n" if self.count == 0 else ",\n")
+        self.stream.write(json.dumps(record, ensure_ascii=False))
+
+    def close(self):
+        self.stream.write("[]\n" if self.count == 0 else "\n]\n")
+        super().close()
+
+
+class CsvWriter(RowWriter):
+    def __init__(self, columns, stream):
+        super().__init__(columns, stream)
+        self._writer = csv.DictWriter(stream, fieldnames=self.columns)
+        self._writer.writeheader()
+
+    def _write(self, record):
+        self._writer.writerow(record)
+
+
+class ArrowWriter(RowWriter):
+    """
+    Buffers rows into fixed-size record batches and streams them as Arrow IPC or Parquet.
+    Column types come from types ({column: STRING or NUMBER}); only undeclared columns are
+    inferred from the first batch, since the stream's schema cannot change afterwards.
+    """
+
+    def __init__(self, columns, stream, parquet=False, types=None):
+        super().__init__(columns, stream)
+        self.pa = _import_pyarrow()
+        self.parquet = parquet
+        self.types = types or {}
+        self._rows = []
+        self._schema = None
+        self._strings = []
+        self._writer = None
+
+    def _write(self, record):
+        self._rows.append(record)
+        if len(self._rows) >= ARROW_BATCH_SIZE:
+            self._flush_batch()
+
+    def _field_type(self, name, inferred):
+        pa = self.pa
+        declared = self.types.get(name)
+        if declared is not None:
+            return pa.string() if declared == STRING else pa.float64()
+        field_type = inferred.field(name).type if inferred is not None else pa.null()
+        if pa.types.is_null(field_type):
+            return pa.string() # ว่างทั้ง batch แรก: เก็บเป็นข้อความ (ค่าที่มาภายหลังถูกแปลงเป็น str)
+        if pa.types.is_integer(field_type):
+            return pa.float64()
+        return field_type
+
+    def _flush_batch(self):
+        if not self._rows:
+            return
+        pa = self.pa
+        if self._writer is None:
+            undeclared = [name for name in self.columns if name not in self.types]
+            inferred = pa.Table.from_pylist([{name: row[name] for name in undeclared} for row in self._rows]).schema if undeclared else None
+            self._open(pa.schema([pa.field(name, self._field_type(name, inferred)) for name in self.columns]))
+        for name in self._strings:
+            for row in self._rows:
+                value = row[name]
+                if value is not None and not isinstance(value, str):
+                    row[name] = str(value)
+        self._writer.write_table(pa.Table.from_pylist(self._rows, schema=self._schema))
+        self._rows = []
+
+    def _open(self, schema):
+        self._schema = schema
+        self._strings = [field.name for field in schema if self.pa.types.is_string(field.type)]
+        sink = self.pa.PythonFile(self.stream, mode="w")
+        if self.parquet:
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(sink, schema)
+        else:
+            self._writer = self.pa.ipc.new_stream(sink, schema)
+
+    def close(self):
+        self._flush_batch()
+        if self._writer is None:
+            self._open(self.pa.schema([self.pa.field(name, self._field_type(name, None)) for name in self.columns]))
+        self._writer.close()
+        super().close()
+
+
+def open_writer(fmt, columns, stream, types=None):
+    """
+    Returns a RowWriter for a machine-readable format ('json', 'ndjson', 'csv', 'arrow' or 'parquet').
+    types ({column: STRING or NUMBER}, see column_types) fixes the arrow/parquet schema.
+    """
+    if fmt == "ndjson":
+        return NdjsonWriter(columns, stream)
+    if fmt == "json":
+        return JsonWriter(columns, stream)
+    if fmt == "csv":
+        return CsvWriter(columns, stream)
+    if fmt == "arrow":
+        return ArrowWriter(columns, stream, types=types)
+    if fmt == "parquet":
+        return ArrowWriter(columns, stream, parquet=True, types=types)
+    raise OutputFormatError(f"'{fmt}' is not a row-oriented output format.")
@@ -0,0 +1,241 @@
+# portfolio.py
+# คำสั่ง portfolio: อ่านรายการถือครอง (coin, quantity, cost_basis) แล้วคำนวณมูลค่า กำไร/ขาดทุนที่ยังไม่รับรู้ น้ำหนัก และการเปลี่ยนแปลง 24 ชม.
+# ราคาทุกเหรียญ x ทุกสกุลเงินมาจาก /simple/price แบบเป็นก้อน (batch_price) แล้วคำนวณทั้งพอร์ตด้วย numpy ในครั้งเดียว
+import csv
+import sys
+import warnings
+
+from rich.console import Console
+from rich.table import Table
+from rich.text import Text
+
+import batch_price
+import output
+
+console = Console()
+
+PORTFOLIO_COLUMNS = [
+    "coin", "currency", "quantity", "price", "value", "weight",
+    "change_24h_pct", "change_24h_value", "cost_basis", "pnl", "pnl_pct",
+]
+
+
+def read_holdings(spec):
+    """
+    Reads holdings from a CSV file ('-' = stdin) whose header names 'coin' (or 'id'), 'quantity'
+    and optionally 'cost_basis': the total amount paid for the lot, in the cost currency.
+    Lines starting with '#' are ignored and repeated coins (several lots) are summed.
+    Returns (coin_ids, quantities, costs) with numpy arrays; a missing cost is NaN.
+    Raises ValueError for malformed rows and OSError when the file cannot be read.
+    """
+    import numpy as np
+
+    if spec == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(spec, encoding="utf-8", newline="") as f:
+            lines = f.read().splitlines()
+    numbered = [(number, line) for number, line in enumerate(lines, start=1) if line.strip() and not line.lstrip().startswith("#")]
+    reader = csv.DictReader(line for _, line in numbered)
+    fields = {name.strip().lower(): name for name in reader.fieldnames or ()}
+    coin_field = fields.get("coin") or fields.get("id")
+    quantity_field = fields.get("quantity")
+    cost_field = fields.get("cost_basis")
+    if coin_field is None or quantity_field is None:
+        raise ValueError("The holdings file needs a header with 'coin' and 'quantity' columns (and optionally 'cost_basis').")
+
+    coins, quantities, costs = [], [], []
+    for (number, _), row in zip(numbered[1:], reader):
+        coin_id = (row.get(coin_field) or "").strip().lower()
+        if not coin_id:
+            raise ValueError(f"Line {number}: missing coin ID.")
+        try:
+            quantities.append(float(row.get(quantity_field) or ""))
+            cost = (row.get(cost_field) or "").strip() if cost_field else ""
+            costs.append(float(cost) if cost else float("nan"))
+        except ValueError:
+            raise ValueError(f"Line {number}: quantity and cost_basis must be numbers.")
+        coins.append(coin_id)
+
+    # รวมหลาย lot ของเหรียญเดียวกัน (ต้นทุนเป็น NaN ถ้ามี lot ใดไม่ระบุต้นทุน)
+    coin_ids, first_seen, inverse = np.unique(np.array(coins, dtype=object), return_index=True, return_inverse=True)
+    order = np.argsort(first_seen) # คงลำดับตามไฟล์
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    inverse = rank[inverse]
+    quantity_sums = np.bincount(inverse, weights=np.array(quantities, dtype=float), minlength=len(order))
+    cost_sums = np.bincount(inverse, weights=np.array(costs, dtype=float), minlength=len(order))
+    return coin_ids[order].tolist(), quantity_sums, cost_sums
+
+
+def _matrix(prices, coin_ids, keys):
+    """(len(coin_ids), len(keys)) float array of prices[coin][key]; missing values are NaN."""
+    import numpy as np
+
+    empty = {}
+    flat = [prices.get(coin_id, empty).get(key) for coin_id in coin_ids for key in keys]
+    values = np.array([value if isinstance(value, (int, float)) else np.nan for value in flat], dtype=float)
+    return values.reshape(len(coin_ids), len(keys))
+
+
+def value_portfolio(quantities, costs, price, change_pct, cost_index=0):
+    """
+    Values every position in every currency at once. price and change_pct are
+    (positions, currencies) arrays, costs are in currency cost_index and are converted
+    to the other currencies at the rate implied by the coins' own prices.
+    Returns {name: array}: per-position (positions, currencies) arrays plus 'total_*' (currencies,) arrays.
+    """
+    import numpy as np
+
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning) # คอลัมน์ที่ไม่มีราคาเลยให้ผลเป็น NaN ไม่ต้องเตือน
+        value = quantities[:, None] * price
+        previous = value / (1 + change_pct / 100) # มูลค่าเมื่อ 24 ชม. ก่อน
+        change_value = value - previous
+        rates = np.nanmedian(price / price[:, [cost_index]], axis=0)
+        cost = costs[:, None] * rates
+        pnl = value - cost
+
+        total_value = np.nansum(value, axis=0)
+        total_change = np.nansum(change_value, axis=0)
+        total_previous = np.nansum(np.where(np.isnan(change_value), np.nan, previous), axis=0)
+        total_pnl = np.nansum(pnl, axis=0)
+        total_cost = np.nansum(np.where(np.isnan(pnl), np.nan, cost), axis=0)
+        return {
+            "value": value,
+            "weight": value / total_value * 100,
+            "change_24h_pct": change_pct,
+            "change_24h_value": change_value,
+            "cost_basis": cost,
+            "pnl": pnl,
+            "pnl_pct": pnl / cost * 100,
+            "total_value": total_value,
+            "total_change_24h_value": total_change,
+            "total_change_24h_pct": total_change / total_previous * 100,
+            "total_cost_basis": total_cost,
+            "total_pnl": total_pnl,
+            "total_pnl_pct": total_pnl / total_cost * 100,
+        }
+
+
+def _sort_order(sort_by, coin_ids, result):
+    import numpy as np
+
+    if sort_by == "coin":
+        return np.argsort(np.array(coin_ids, dtype=object), kind="stable")
+    key = {"value": "value", "pnl": "pnl", "pnl_pct": "pnl_pct", "change": "change_24h_pct"}[sort_by]
+    # เรียงจากมากไปน้อยตามสกุลเงินแรก ค่า NaN อยู่ท้ายสุด
+    return np.argsort(-result[key][:, 0], kind="stable")
+
+
+def _clean(value):
+    return None if value != value else value
+
+
+def _money(value, pattern=",.2f"):
+    return "N/A" if value != value else format(value, pattern)
+
+
+def _signed(value, suffix=""):
+    if value != value:
+        return Text("N/A", style="dim")
+    return Text(f"{value:+,.2f}{suffix}", style="green" if value >= 0 else "red")
+
+
+def write_rows(writer, coin_ids, quantities, currencies, price, result, order):
+    """Writes one row per (coin, currency) in long format."""
+    names = ["price", "value", "weight", "change_24h_pct", "change_24h_value", "cost_basis", "pnl", "pnl_pct"]
+    arrays = {"price": price, **result}
+    for j, currency in enumerate(currencies):
+        # แปลงทั้งคอลัมน์เป็น list ครั้งเดียว แทนการดึงทีละช่องจาก numpy
+        columns = [arrays[name][order, j].tolist() for name in names]
+        for i, values in zip(order.tolist(), zip(*columns)):
+            writer.write_row({
+                "coin": coin_ids[i], "currency": currency, "quantity": float(quantities[i]),
+                **{name: _clean(value) for name, value in zip(names, values)},
+            })
+
+
+def print_tables(coin_ids, quantities, currencies, price, result, order, cost_currency):
+    base = currencies[0]
+    table = Table(title=f"💼 Portfolio ({len(order)} positions, {base.upper()})", show_header=True, header_style="bold magenta")
+    table.add_column("Coin", style="bold cyan")
+    table.add_column("Quantity", justify="right")
+    table.add_column("Price", justify="right", style="green")
+    table.add_column("Value", justify="right", style="bold")
+    table.add_column("Weight %", justify="right")
+    table.add_column("24h %", justify="right")
+    table.add_column("Cost", justify="right")
+    table.add_column("P&L", justify="right")
+    table.add_column("P&L %", justify="right")
+
+    columns = [result[name][order, 0].tolist() for name in ("value", "weight", "change_24h_pct", "cost_basis", "pnl", "pnl_pct")]
+    for i, price_value, (value, weight, change, cost, pnl, pnl_pct) in zip(order.tolist(), price[order, 0].tolist(), zip(*columns)):
+        table.add_row(
+            coin_ids[i], f"{quantities[i]:,.8g}", _money(price_value), _money(value), _money(weight),
+            _signed(change, "%"), _money(cost), _signed(pnl), _signed(pnl_pct, "%"),
+        )
+    console.print(table)
+
+    totals = Table(title=f"Totals (cost basis in {cost_currency.upper()}, converted at current rates)", show_header=True, header_style="bold magenta")
+    totals.add_column("Currency", style="yellow")
+    totals.add_column("Value", justify="right", style="bold")
+    totals.add_column("24h Change", justify="right")
+    totals.add_column("24h %", justify="right")
+    totals.add_column("Cost", justify="right")
+    totals.add_column("P&L", justify="right")
+    totals.add_column("P&L %", justify="right")
+    names = ("total_value", "total_change_24h_value", "total_change_24h_pct", "total_cost_basis", "total_pnl", "total_pnl_pct")
+    for currency, (value, change, change_pct, cost, pnl, pnl_pct) in zip(currencies, zip(*(result[name].tolist() for name in names))):
+        totals.add_row(currency.upper(), _money(value), _signed(change), _signed(change_pct, "%"), _money(cost), _signed(pnl), _signed(pnl_pct, "%"))
+    console.print(totals)
+
+
+def handle_portfolio_command(args, api_key=None):
+    """Values the holdings file in every requested currency (one batched price fetch, one numpy pass)."""
+    import numpy as np
+
+    currencies = batch_price.parse_list(args.vs_currency)
+    cost_currency = (args.cost_currency or (currencies[0] if currencies else "")).lower()
+    if not currencies:
+        console.print("[bold #df0000]❌ Please provide at least one currency.[/bold #df0000]")
+        return
+    # สกุลเงินของต้นทุนต้องใช้คำนวณ P&L ดึงมาด้วยเสมอ แต่แสดงเฉพาะสกุลที่ผู้ใช้ขอ
+    fetched = currencies if cost_currency in currencies else currencies + [cost_currency]
+
+    try:
+        coin_ids, quantities, costs = read_holdings(args.holdings)
+    except (OSError, ValueError) as e:
+        console.print(f"[bold #df0000]❌ Could not read holdings:[/bold #df0000] {e}")
+        return
+    if not coin_ids:
+        console.print("[#f6e10d]⚠️ The holdings file has no positions.[/#f6e10d]")
+        return
+
+    prices, errors = batch_price.fetch_prices(coin_ids, fetched, api_key=api_key, max_workers=args.concurrency, market_data=True)
+    for chunk, error in errors:
+        console.print(f"[bold #df0000]❌ Error fetching prices for {len(chunk)} coin(s) starting at '{chunk[0]}':[/bold #df0000] {error}")
+
+    price = _matrix(prices, coin_ids, fetched)
+    change_pct = _matrix(prices, coin_ids, [f"{currency}_24h_change" for currency in fetched])
+    result = value_portfolio(quantities, costs, price, change_pct, cost_index=fetched.index(cost_currency))
+    if len(fetched) > len(currencies):
+        # ตัดคอลัมน์ของสกุลเงินต้นทุนที่ไม่ได้ขอออก (อยู่ท้ายสุดเสมอ)
+        shown = len(currencies)
+        price = price[:, :shown]
+        result = {name: values[..., :shown] for name, values in result.items()}
+
+    priced = ~np.isnan(price).all(axis=1)
+    order = _sort_order(args.sort_by, coin_ids, result)
+    order = order[priced[order]]
+
+    if args.format != output.TABLE_FORMAT:
+        with output.open_writer(args.format, PORTFOLIO_COLUMNS, args.output_stream, types=output.column_types(PORTFOLIO_COLUMNS, strings=("coin", "currency"))) as writer:
+            write_rows(writer, coin_ids, quantities, currencies, price, result, order)
+    elif len(order):
+        print_tables(coin_ids, quantities, currencies, price, result, order, cost_currency)
+
+    failed_ids = {coin_id for chunk, _ in errors for coin_id in chunk}
+    missing = [coin_id for coin_id, has_price in zip(coin_ids, priced.tolist()) if not has_price and coin_id not in failed_ids]
+    if missing:
+        console.print(f"[#f6e10d]⚠️ No price returned for {len(missing)} coin(s), left out of the totals:[/#f6e10d] {', '.join(missing)}")
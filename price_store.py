@@ -0,0 +1,169 @@
+# price_store.py
+# ที่เก็บ snapshot ราคาในเครื่องแบบ append-only: แยกไฟล์ต่อคอลัมน์ (float64) ต่อเหรียญ/สกุลเงิน
+# เขียนด้วย array (เบา ไม่ต้อง import numpy) และอ่าน/คำนวณด้วย numpy แบบ vectorized
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+
+from config import get_cache_dir
+
+STORE_DIRNAME = "history"
+COLUMNS = ["ts", "price", "market_cap", "volume"]
+NAN = float("nan")
+
+_write_lock = threading.Lock()
+_SAFE_NAME = re.compile(r"[^a-z0-9._-]")
+
+
+def _safe(name):
+    return _SAFE_NAME.sub("_", name.lower())
+
+
+def get_store_dir():
+    return os.path.join(get_cache_dir(), STORE_DIRNAME)
+
+
+def series_dir(coin_id, currency, store_dir=None):
+    return os.path.join(store_dir or get_store_dir(), _safe(currency), _safe(coin_id))
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else NAN
+
+
+def append_rows(coin_id, currency, rows, store_dir=None):
+    """Appends (ts, price, market_cap, volume) tuples to one coin/currency series."""
+    if not rows:
+        return
+    directory = series_dir(coin_id, currency, store_dir)
+    os.makedirs(directory, exist_ok=True)
+    with _write_lock:
+        for i, column in enumerate(COLUMNS):
+            with open(os.path.join(directory, f"{column}.f64"), "ab") as f:
+                array("d", (row[i] for row in rows)).tofile(f)
+
+
+def write_columns(coin_id, currency, columns, keep=0, store_dir=None):
+    """
+    Keeps the first `keep` rows of one series, drops the rest and appends columns
+    ({column: numpy array} for every name in COLUMNS); keep=0 rewrites the series.
+    Used by stores that replace their newest rows on every sync (see chart.py).
+    """
+    import numpy as np
+
+    directory = series_dir(coin_id, currency, store_dir)
+    os.makedirs(directory, exist_ok=True)
+    with _write_lock:
+        for column in COLUMNS:
+            with open(os.path.join(directory, f"{column}.f64"), "ab") as f:
+                f.truncate(keep * 8)
+                np.asarray(columns[column], dtype="<f8").tofile(f)
+
+
+def record_response(path, params, data):
+    """
+    Response listener for api_client: stores every fresh /simple/price and
+    /coins/markets result. Other endpoints are ignored; write errors only print a warning.
+    """
+    try:
+        _record(path, params, data)
+    except OSError as e:
+        print(f"WARNING [price_store.py]: Could not record snapshot: {e}", file=sys.stderr)
+
+
+def _record(path, params, data):
+    now = time.time()
+    params = params or {}
+    if path == "/simple/price" and isinstance(data, dict):
+        currencies = [c.strip().lower() for c in str(params.get("vs_currencies", "")).split(",") if c.strip()]
+        for coin_id, values in data.items():
+            for currency in currencies:
+                if currency in values:
+                    row = (now, _number(values.get(currency)), _number(values.get(f"{currency}_market_cap")), _number(values.get(f"{currency}_24h_vol")))
+                    append_rows(coin_id, currency, [row])
+    elif path == "/coins/markets" and isinstance(data, list):
+        currency = str(params.get("vs_currency", "")).lower()
+        if not currency:
+            return
+        for coin in data:
+            if coin.get("id"):
+                row = (now, _number(coin.get("current_price")), _number(coin.get("market_cap")), _number(coin.get("total_volume")))
+                append_rows(coin["id"], currency, [row])
+
+
+def load_series(coin_id, currency, store_dir=None):
+    """
+    Returns {column: numpy array} for one series, sorted by timestamp, or None if nothing was recorded.
+    Files are memory-mapped, so only the pages touched by a query are read.
+    """
+    import numpy as np
+
+    directory = series_dir(coin_id, currency, store_dir)
+    paths = [os.path.join(directory, f"{column}.f64") for column in COLUMNS]
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    # ถ้าการเขียนครั้งก่อนถูกขัดจังหวะ ไฟล์อาจยาวไม่เท่ากัน ใช้ความยาวที่สั้นที่สุด
+    length = min(os.path.getsize(p) for p in paths) // 8
+    if length == 0:
+        return None
+    series = {column: np.memmap(p, dtype="<f8", mode="r", shape=(length,)) for column, p in zip(COLUMNS, paths)}
+    ts = series["ts"]
+    if length > 1 and not np.all(ts[1:] >= ts[:-1]):
+        order = np.argsort(ts, kind="stable")
+        series = {column: values[order] for column, values in series.items()}
+    return series
+
+
+def query_range(series, since=None, until=None, last=None):
+    """Slices a series to since <= ts <= until (epoch seconds), then keeps the last N rows."""
+    import numpy as np
+
+    ts = series["ts"]
+    start = 0 if since is None else int(np.searchsorted(ts, since, side="left"))
+    stop = len(ts) if until is None else int(np.searchsorted(ts, until, side="right"))
+    if last is not None:
+        start = max(start, stop - last)
+    return {column: np.asarray(values[start:stop]) for column, values in series.items()}
+
+
+def resample_ohlc(series, step_seconds):
+    """
+    Buckets a (time-sorted) series into step_seconds intervals and returns
+    {ts, open, high, low, close, volume, count} arrays; volume is the last value in each bucket.
+    """
+    import numpy as np
+
+    ts = series["ts"]
+    price = series["price"]
+    if len(ts) == 0:
+        empty = np.array([], dtype="f8")
+        return {key: empty for key in ("ts", "open", "high", "low", "close", "volume", "count")}
+
+    buckets = np.floor(ts / step_seconds).astype("i8")
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+    return {
+        "ts": buckets[starts].astype("f8") * step_seconds,
+        "open": price[starts],
+        "high": np.fmax.reduceat(price, starts),
+        "low": np.fmin.reduceat(price, starts),
+        "close": price[ends],
+        "volume": series["volume"][ends],
+        "count": (ends - starts + 1).astype("f8"),
+    }
+
+
+def list_series(store_dir=None):
+    """Returns sorted (currency, coin_id) pairs that have recorded data."""
+    root = store_dir or get_store_dir()
+    if not os.path.isdir(root):
+        return []
+    pairs = []
+    for currency in os.listdir(root):
+        currency_dir = os.path.join(root, currency)
+        if os.path.isdir(currency_dir):
+            pairs.extend((currency, coin_id) for coin_id in os.listdir(currency_dir))
+    return sorted(pairs)
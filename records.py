@@ -0,0 +1,99 @@
+# records.py
+# record แบบ __slots__ สำหรับข้อมูลที่คำสั่งต่างๆ ใช้จริง (เล็กกว่า dict ของ payload เต็มหลายเท่า)
+# FIELDS คือ projection ที่ส่งให้ api_client.get_json(fields=...) เพื่อให้ cache เก็บเฉพาะ field เหล่านี้
+
+
+class Record:
+    """
+    Base for compact API records. Subclasses list their attributes in __slots__;
+    get()/[]/keys() keep the dict-style access that handlers and row writers use.
+    """
+
+    __slots__ = ()
+    FIELDS = None
+
+    @classmethod
+    def from_json(cls, data):
+        record = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(record, name, data.get(name))
+        return record
+
+    @classmethod
+    def from_list(cls, rows):
+        return [cls.from_json(row) for row in rows]
+
+    def get(self, name, default=None):
+        """Like dict.get(), except that a field the API sent as null also returns default."""
+        value = getattr(self, name, None) if name in self.__slots__ else None
+        return default if value is None else value
+
+    def __getitem__(self, name):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def keys(self):
+        return self.__slots__
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.as_dict()!r})"
+
+
+class MarketCoin(Record):
+    """One /coins/markets row, as read by top, compare, watch and the --record listener."""
+
+    __slots__ = (
+        "id", "symbol", "name", "market_cap_rank", "current_price",
+        "market_cap", "total_volume", "price_change_percentage_24h",
+    )
+    FIELDS = __slots__
+
+
+class CoinDetail(Record):
+    """The part of a /coins/{id} payload shown by 'detail', flattened to one level."""
+
+    __slots__ = (
+        "id", "name", "symbol", "price_usd", "price_thb", "market_cap_usd", "total_volume_usd",
+        "high_24h_usd", "low_24h_usd", "description", "homepage",
+    )
+    # payload เต็มมีคำอธิบายหลายภาษา ลิงก์ รูป และ platform อีกหลายร้อย field ที่ไม่ได้ใช้
+    FIELDS = {
+        "id": None,
+        "name": None,
+        "symbol": None,
+        "market_data": {
+            "current_price": ["usd", "thb"],
+            "market_cap": ["usd"],
+            "total_volume": ["usd"],
+            "high_24h": ["usd"],
+            "low_24h": ["usd"],
+        },
+        "description": ["en"],
+        "links": ["homepage"],
+    }
+
+    @classmethod
+    def from_json(cls, data):
+        market_data = data.get('market_data') or {}
+
+        def quote(field, currency='usd'):
+            return (market_data.get(field) or {}).get(currency)
+
+        homepages = [url for url in (data.get('links') or {}).get('homepage') or [] if url]
+        record = cls.__new__(cls)
+        record.id = data.get('id')
+        record.name = data.get('name')
+        record.symbol = (data.get('symbol') or '').upper() or None
+        record.price_usd = quote('current_price')
+        record.price_thb = quote('current_price', 'thb')
+        record.market_cap_usd = quote('market_cap')
+        record.total_volume_usd = quote('total_volume')
+        record.high_24h_usd = quote('high_24h')
+        record.low_24h_usd = quote('low_24h')
+        record.description = (data.get('description') or {}).get('en') or None
+        record.homepage = homepages[0] if homepages else None
+        return record
@@ -0,0 +1,215 @@
+# response_cache.py
+# cache ผลลัพธ์จาก API (JSON ที่ decode แล้ว) แบบ 2 ชั้น: LRU ในหน่วยความจำ + SQLite บนดิสก์ (ใช้ข้ามการรันได้)
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import json_codec
+import metrics
+from config import get_cache_dir, get_int_env
+
+CACHE_FILENAME = "responses.sqlite3"
+
+# อายุของข้อมูลแต่ละ endpoint (วินาที) — ราคาเปลี่ยนเร็ว, คำอธิบายเหรียญแทบไม่เปลี่ยน
+ENDPOINT_TTLS = {
+    "/simple/price": 30,
+    "/coins/markets": 60,
+}
+COIN_DETAIL_TTL = 6 * 60 * 60 # /coins/{id} ที่ไม่มี market_data (คำอธิบาย ลิงก์ หมวดหมู่)
+COIN_MARKET_DATA_TTL = 60 # /coins/{id} ที่มีราคา / market cap / volume ใน market_data อายุเท่ากับ /coins/markets
+DEFAULT_TTL = 60
+
+# params ที่ไม่ควรเป็นส่วนหนึ่งของ key (ไม่เปลี่ยนผลลัพธ์)
+IGNORED_PARAMS = {"x_cg_demo_api_key"}
+# params ที่เป็นรายการคั่นด้วย comma และลำดับไม่มีผลกับผลลัพธ์
+UNORDERED_LIST_PARAMS = {"ids", "vs_currencies"}
+
+
+def ttl_for(path, params=None, fields=None):
+    """
+    Returns the default time-to-live for an API request such as '/coins/bitcoin'.
+    /coins/{id} keeps the long TTL only when the response carries no market_data
+    (market_data=false, or a projection without it); prices age like /coins/markets.
+    """
+    if path in ENDPOINT_TTLS:
+        return ENDPOINT_TTLS[path]
+    if path.startswith("/coins/") and path.count("/") == 2 and path != "/coins/list":
+        without_market_data = str((params or {}).get("market_data", "true")).lower() == "false"
+        if without_market_data or (fields is not None and "market_data" not in fields):
+            return COIN_DETAIL_TTL
+        return COIN_MARKET_DATA_TTL
+    return DEFAULT_TTL
+
+
+def make_key(path, params=None, fields=None):
+    """Builds a cache key from the endpoint path, normalized params and the projection (if any)."""
+    normalized = []
+    for name, value in sorted((params or {}).items()):
+        if name in IGNORED_PARAMS or value is None:
+            continue
+        value = str(value).lower()
+        if name in UNORDERED_LIST_PARAMS:
+            value = ",".join(sorted(part.strip() for part in value.split(",") if part.strip()))
+        normalized.append(f"{name}={value}")
+    key = f"{path}?{'&'.join(normalized)}"
+    # ข้อมูลที่ตัด field แล้วเก็บแยกจากข้อมูลเต็ม
+    return f"{key}#{json_codec.fields_key(fields)}" if fields is not None else key
+
+
+class MemoryCache:
+    """In-process LRU cache holding up to max_entries (stored_at, data) pairs."""
+
+    name = "memory"
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, stored_at, data):
+        with self._lock:
+            self._entries[key] = (stored_at, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class DiskCache:
+    """SQLite-backed cache shared between runs; evicts least recently accessed rows beyond max_entries."""
+
+    name = "disk"
+
+    def __init__(self, path=None, max_entries=2000):
+        self.path = path or os.path.join(get_cache_dir(), CACHE_FILENAME)
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, stored_at REAL NOT NULL, accessed_at REAL NOT NULL, body TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT stored_at, body FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            with conn:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        try:
+            return row[0], json_codec.loads(row[1])
+        except ValueError:
+            return None
+
+    def set(self, key, stored_at, data):
+        body = json_codec.dumps(data)
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, stored_at, accessed_at, body) VALUES (?, ?, ?, ?)",
+                    (key, stored_at, time.time(), body),
+                )
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+
+class ResponseCache:
+    """
+    Looks up decoded API responses in each tier in order (memory, then disk),
+    promoting disk hits into memory. `max_age` overrides every per-endpoint TTL.
+    """
+
+    def __init__(self, tiers, max_age=None):
+        self.tiers = tiers
+        self.max_age = max_age
+
+    def get(self, path, params=None, max_age=None, fields=None):
+        """Returns cached data for the request if it is still fresh (max_age overrides the tier setting), else None."""
+        entry = self.lookup(path, params, max_age=max_age, fields=fields)
+        return entry[0] if entry is not None and entry[2] else None
+
+    def lookup(self, path, params=None, max_age=None, fields=None):
+        """
+        Returns (data, stored_at, fresh) for the request, or None when no tier has it.
+        An expired entry is still returned (fresh=False) so callers can serve it when the API is unavailable.
+        """
+        key = make_key(path, params, fields)
+        if max_age is None:
+            max_age = ttl_for(path, params, fields) if self.max_age is None else self.max_age
+        now = time.time()
+        expired = None
+        for i, tier in enumerate(self.tiers):
+            entry = tier.get(key)
+            if entry is None:
+                metrics.add("cache_lookups", tier=tier.name, result="miss")
+                continue
+            stored_at, data = entry
+            if now - stored_at > max_age:
+                metrics.add("cache_lookups", tier=tier.name, result="expired")
+                # เก็บตัวที่ใหม่ที่สุดไว้ เผื่อใช้แทนเมื่อเรียก API ไม่ได้
+                if expired is None or stored_at > expired[1]:
+                    expired = (data, stored_at, False)
+                continue
+            metrics.add("cache_lookups", tier=tier.name, result="hit")
+            for upper in self.tiers[:i]:
+                upper.set(key, stored_at, data)
+            return data, stored_at, True
+        return expired
+
+    def set(self, path, params, data, fields=None):
+        key = make_key(path, params, fields)
+        stored_at = time.time()
+        for tier in self.tiers:
+            tier.set(key, stored_at, data)
+
+
+_cache = None
+_enabled = True
+_max_age = None
+
+
+def configure(enabled=True, max_age=None):
+    """Applies the CLI's --no-cache / --max-age switches (call before the first request)."""
+    global _cache, _enabled, _max_age
+    _enabled = enabled
+    _max_age = max_age
+    _cache = None
+
+
+def settings():
+    """Returns (enabled, max_age) as set by configure(), e.g. to forward them to the daemon."""
+    return _enabled, _max_age
+
+
+def get_cache():
+    """Returns the process-wide ResponseCache, or None when caching is disabled."""
+    global _cache
+    if not _enabled:
+        return None
+    if _cache is None:
+        tiers = [MemoryCache(get_int_env("CRYPTO_CLI_MEMORY_CACHE_ENTRIES", 256))]
+        if os.getenv("CRYPTO_CLI_DISK_CACHE", "1") != "0":
+            tiers.append(DiskCache(max_entries=get_int_env("CRYPTO_CLI_DISK_CACHE_ENTRIES", 2000)))
+        _cache = ResponseCache(tiers, max_age=_max_age)
+    return _cache
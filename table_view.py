@@ -0,0 +1,262 @@
+# table_view.py
+# แสดงตารางขนาดใหญ่ (top / compare หลายพันแถว) โดยไม่สร้าง rich.Table ทั้งก้อน:
+# จัดรูปแบบตัวเลขทีละคอลัมน์ครั้งเดียว แล้วเลือกวิธีแสดงตามปลายทาง
+#   - stdout ไม่ใช่ terminal (pipe / ไฟล์): เขียนข้อความจัดคอลัมน์ตรงๆ ไม่ผ่าน Rich
+#   - terminal และแถวเกินหน้าจอ: pager ที่ render เฉพาะแถวที่มองเห็น (เลื่อน / ค้นหา / เรียง โดยไม่ดึงข้อมูลใหม่)
+#   - นอกนั้น: rich.Table ตามเดิม
+import os
+import select
+import sys
+
+from rich.table import Table
+from rich.text import Text
+
+PLAIN_MODE = "plain"
+PAGER_MODE = "pager"
+TABLE_MODE = "table"
+PAGER_CHROME = 7 # บรรทัดที่ไม่ใช่ข้อมูลในหน้า pager: ชื่อตาราง, หัวตาราง, เส้นขอบ, บรรทัดสถานะ
+PAGER_HELP = "↑/↓ PgUp/PgDn g/G scroll · / search · n next · s sort · r reverse · q quit"
+
+_KEYS = {
+    "\x1b[A": "up", "\x1bOA": "up", "k": "up",
+    "\x1b[B": "down", "\x1bOB": "down", "j": "down", "\r": "down", "\n": "down",
+    "\x1b[5~": "page_up", "b": "page_up",
+    "\x1b[6~": "page_down", " ": "page_down", "f": "page_down",
+    "\x1b[H": "top", "\x1b[1~": "top", "g": "top",
+    "\x1b[F": "bottom", "\x1b[4~": "bottom", "G": "bottom",
+    "/": "search", "n": "next", "s": "sort", "r": "reverse",
+    "q": "quit", "Q": "quit", "\x1b": "quit", "\x03": "quit",
+}
+
+
+class Column:
+    """
+    One displayed column: key into the row records, header text, and fmt, a str.format
+    template such as '{:,.2f}' for numbers (None shows the value as text).
+    width is the minimum width; with truncate, text is also cut to fit it (for long names,
+    not identifiers such as symbols). convert is applied to each value first (e.g. str.upper).
+    """
+
+    __slots__ = ("key", "header", "fmt", "justify", "style", "width", "convert", "truncate")
+
+    def __init__(self, key, header, fmt=None, justify="left", style=None, width=None, convert=None, truncate=False):
+        self.key = key
+        self.header = header
+        self.fmt = fmt
+        self.justify = justify
+        self.style = style
+        self.width = width
+        self.convert = convert
+        self.truncate = truncate
+
+
+def format_column(column, values):
+    """Formats a whole column of raw values in one pass; missing or non-numeric numbers become 'N/A'."""
+    if column.convert is not None:
+        values = [None if value is None else column.convert(value) for value in values]
+    if column.fmt is None:
+        limit = column.width - 2 if column.width and column.truncate else None
+        return [("N/A" if value is None else str(value))[:limit] for value in values]
+    fmt = column.fmt.format # ดึง method ครั้งเดียว ไม่ต้อง parse f-string ทุกช่อง
+    return [fmt(value) if isinstance(value, (int, float)) and value == value else "N/A" for value in values]
+
+
+def choose_mode(row_count, console, no_pager=False):
+    """
+    PLAIN_MODE when stdout is not a terminal, PAGER_MODE when row_count rows would not fit
+    on an interactive terminal (and paging is possible), else TABLE_MODE.
+    """
+    if not sys.stdout.isatty():
+        return PLAIN_MODE
+    if no_pager or not sys.stdin.isatty() or row_count <= console.size.height - PAGER_CHROME:
+        return TABLE_MODE
+    try:
+        import termios # noqa: F401 (มีเฉพาะ Unix)
+    except ImportError:
+        return TABLE_MODE
+    return PAGER_MODE
+
+
+class PlainWriter:
+    """
+    Writes rows as aligned plain text (no Rich, no styles), one write per batch.
+    Column widths are fixed by the first batch (at least each column's width), so later
+    batches written as pages arrive still line up under the header.
+    """
+
+    def __init__(self, columns, stream=None, title=None):
+        self.columns = columns
+        self.stream = stream or sys.stdout
+        self.title = title
+        self.count = 0
+        self._template = None
+
+    def write_rows(self, rows):
+        if not rows:
+            return
+        texts = [format_column(column, [row.get(column.key) for row in rows]) for column in self.columns]
+        lines = []
+        if self._template is None:
+            widths = [max(column.width or 0, len(column.header), max(map(len, cells))) for column, cells in zip(self.columns, texts)]
+            self._template = "  ".join(
+                f"{{:>{width}}}" if column.justify == "right" else f"{{:<{width}}}"
+                for column, width in zip(self.columns, widths)
+            )
+            header = self._template.format(*(column.header for column in self.columns)).rstrip()
+            lines += ([self.title] if self.title else []) + [header, "-" * len(header)]
+        template = self._template.format
+        lines += [template(*cells).rstrip() for cells in zip(*texts)]
+        self.stream.write("\n".join(lines) + "\n")
+        self.count += len(rows)
+
+
+class TableView:
+    """
+    Rows held column by column as raw values (for sorting) and pre-formatted text (for display);
+    order is the current permutation, so sorting and searching never re-fetch or re-format.
+    """
+
+    def __init__(self, title, columns, rows):
+        self.title = title
+        self.columns = columns
+        self.raw = [[row.get(column.key) for row in rows] for column in columns]
+        self.text = [format_column(column, values) for column, values in zip(columns, self.raw)]
+        # กว้างพอสำหรับทุกแถว (และลูกศรเรียงในหัวตาราง) ตารางจึงไม่เปลี่ยนรูปเมื่อเลื่อน
+        self.widths = [
+            column.width if column.truncate else max([column.width or 0, len(column.header) + 2, *map(len, texts)])
+            for column, texts in zip(columns, self.text)
+        ]
+        self.order = list(range(len(rows)))
+        self.sort_index = None
+        self.descending = False
+
+    def __len__(self):
+        return len(self.order)
+
+    def sort(self, index, descending=False):
+        """Orders rows by column index; missing values always go last."""
+        values = self.raw[index]
+        present = [i for i in range(len(values)) if values[i] is not None]
+        present.sort(key=values.__getitem__, reverse=descending)
+        self.order = present + [i for i in range(len(values)) if values[i] is None]
+        self.sort_index = index
+        self.descending = descending
+
+    def find(self, query, start=0):
+        """Position (in the current order) of the first row at or after start whose text contains query, wrapping around."""
+        query = query.lower()
+        count = len(self.order)
+        for step in range(count):
+            position = (start + step) % count
+            row = self.order[position]
+            if any(query in texts[row].lower() for texts in self.text):
+                return position
+        return None
+
+    def window(self, start, height, marked=None, footer=None):
+        """A rich.Table with only rows start..start+height of the current order (marked = position to highlight)."""
+        table = Table(title=self.title, show_header=True, header_style="bold magenta", caption=footer, caption_justify="left")
+        for index, column in enumerate(self.columns):
+            header = column.header
+            if index == self.sort_index:
+                header += " ↓" if self.descending else " ↑"
+            table.add_column(header, justify=column.justify, style=column.style, width=self.widths[index], no_wrap=True)
+        for position in range(start, min(start + height, len(self.order))):
+            row = self.order[position]
+            table.add_row(*(texts[row] for texts in self.text), style="reverse" if position == marked else None)
+        return table
+
+
+def _read_key(fd):
+    data = os.read(fd, 1).decode("utf-8", "ignore")
+    if data == "\x1b":
+        # ลำดับ escape ของปุ่มลูกศร / PgUp / PgDn มาต่อกันทันที ถ้าไม่มีอะไรตามมาคือกด Esc
+        while select.select([fd], [], [], 0.03)[0]:
+            data += os.read(fd, 1).decode("utf-8", "ignore")
+            if data[-1].isalpha() or data[-1] == "~":
+                break
+    return data
+
+
+def _read_query(fd, screen, render):
+    """Reads a search string typed after '/', echoing it in the status line; Esc cancels."""
+    query = ""
+    while True:
+        screen.update(render(f"/{query}"))
+        key = _read_key(fd)
+        if key in ("\r", "\n"):
+            return query
+        if key in ("\x1b", "\x03"):
+            return None
+        if key in ("\x7f", "\x08"):
+            query = query[:-1]
+        elif key.isprintable():
+            query += key
+
+
+def page(view, console):
+    """Interactive pager over a TableView on the alternate screen; only the visible rows are rendered."""
+    import termios
+    import tty
+
+    fd = sys.stdin.fileno()
+    saved = termios.tcgetattr(fd)
+    offset = 0
+    marked = None
+    query = None
+    message = ""
+    try:
+        tty.setcbreak(fd)
+        with console.screen(hide_cursor=True) as screen:
+            while True:
+                height = max(1, console.size.height - PAGER_CHROME)
+                offset = max(0, min(offset, len(view) - height))
+
+                def render(status):
+                    last = min(offset + height, len(view))
+                    footer = f"rows {offset + 1}-{last} of {len(view)}"
+                    if view.sort_index is not None:
+                        footer += f" · sorted by {view.columns[view.sort_index].header}"
+                    return view.window(offset, height, marked, Text(f"{footer} · {status or PAGER_HELP}", style="dim"))
+
+                screen.update(render(message))
+                message = ""
+                action = _KEYS.get(_read_key(fd))
+                if action == "quit":
+                    break
+                if action == "up":
+                    offset -= 1
+                elif action == "down":
+                    offset += 1
+                elif action == "page_up":
+                    offset -= height
+                elif action == "page_down":
+                    offset += height
+                elif action == "top":
+                    offset = 0
+                elif action == "bottom":
+                    offset = len(view)
+                elif action in ("search", "next"):
+                    if action == "search":
+                        query = _read_query(fd, screen, render) or None
+                        start = offset
+                    else:
+                        start = (marked if marked is not None else offset) + 1
+                    if query:
+                        found = view.find(query, start)
+                        if found is None:
+                            message = f"'{query}' not found"
+                        else:
+                            marked = found
+                            if not offset <= found < offset + height:
+                                offset = found
+                elif action in ("sort", "reverse"):
+                    index = view.sort_index if view.sort_index is not None else -1
+                    if action == "sort":
+                        index, descending = (index + 1) % len(view.columns), False
+                    else:
+                        index, descending = max(index, 0), not view.descending
+                    view.sort(index, descending)
+                    offset, marked = 0, None
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
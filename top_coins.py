@@ -1,38 +1,45 @@
-import requests
+import contextlib
+import math
+
 # import json # ไม่ได้ใช้
 
-def get_top_coins(currency='usd', top_n=10, sort_by='market_cap', api_key=None):
-    """ดึงข้อมูลเหรียญคริปโตเคอร์เรนซีตาม Market Cap หรือ Volume."""
-    base_url = "https://api.coingecko.com/api/v3/coins/markets"
-    
+import api_client
+import metrics
+from lazy_import import lazy
+from records import MarketCoin
+
+requests = lazy("requests") # ใช้แค่ชนิดของ exception จึงไม่ต้อง import จนกว่าจะเกิด error จริง
+
+MAX_PER_PAGE = 250 # CoinGecko คืนได้สูงสุด 250 เหรียญต่อหน้า
+
+
+def _fetch_page(currency, per_page, page, sort_by, api_key=None):
+    """ดึงข้อมูล /coins/markets หนึ่งหน้า คืน list ของ MarketCoin หรือ None ถ้าเกิด error."""
     params = {
         'vs_currency': currency,
         'order': f"{sort_by}_desc",
-        'per_page': top_n,
-        'page': 1,
+        'per_page': per_page,
+        'page': page,
         'sparkline': 'false'
     }
 
     if api_key:
         params['x_cg_demo_api_key'] = api_key
         # print("Using CoinGecko API Key in get_top_coins") # << เอาออก หรือ comment
-    
-    # print(f"API URL: {url}") # << url ไม่ได้ถูก define ใน scope นี้, ควรจะเป็น base_url และ params
-    # print(f"Debug: Calling API with URL: {base_url} and params: {params}") # << เอาออก หรือ comment
+
+    # print(f"Debug: Calling API /coins/markets with params: {params}") # << เอาออก หรือ comment
 
     try:
-        response = requests.get(base_url, params=params)
-        # print(f"API Response Status Code: {response.status_code}") # << เอาออก หรือ comment
-        response.raise_for_status()
-        data = response.json()
+        with metrics.span("top.page", page=page, per_page=per_page):
+            data = api_client.get_json("/coins/markets", params=params, fields=MarketCoin.FIELDS)
         # print("Data received from API:") # << เอาออก หรือ comment
         # print(data) # << เอาออก หรือ comment (ข้อมูลดิบเยอะมาก)
-        return data
+        return MarketCoin.from_list(data) if data is not None else None
     except requests.exceptions.HTTPError as http_err:
         print(f"Error calling CoinGecko API (HTTP Error): {http_err}")
-        if response is not None:
+        if http_err.response is not None:
             try:
-                error_detail = response.json()
+                error_detail = http_err.response.json()
                 print(f"API Error Detail: {error_detail.get('error', 'No specific error message from API.')}")
             except ValueError:
                  print("API Error Detail: Could not parse error response from API.")
@@ -40,8 +47,78 @@ def get_top_coins(currency='usd', top_n=10, sort_by='market_cap', api_key=None):
     except requests.exceptions.RequestException as e:
         print(f"Error calling CoinGecko API (Request Exception): {e}")
         return None
-    except ValueError: 
+    except ValueError:
         print(f"Error: Could not decode JSON response from CoinGecko API.")
         return None
 
-# (ส่วน if __name__ == '__main__': สำหรับทดสอบ ยังคงเดิมได้)
\ No newline at end of file
+
+def iter_top_coin_pages(currency='usd', top_n=10, sort_by='market_cap', api_key=None, max_workers=4):
+    """
+    Yields lists of coins page by page, in rank order, until top_n coins were produced.
+
+    Pages are fetched concurrently (through the shared rate limiter) but released in
+    order as soon as every earlier page has arrived. Coins that shift between pages
+    while the fetch is running are de-duplicated by id, and extra pages are fetched
+    to make up for them. Stops early at the first failed or empty page.
+    """
+    per_page = min(top_n, MAX_PER_PAGE)
+    if per_page <= 0:
+        return
+    page_count = math.ceil(top_n / per_page)
+
+    seen_ids = set()
+    produced = 0
+    next_page = 1
+    pending = {}
+
+    def take(coins):
+        nonlocal produced
+        rows = []
+        for coin in coins:
+            coin_id = coin.get('id')
+            if coin_id in seen_ids:
+                continue
+            seen_ids.add(coin_id)
+            rows.append(coin)
+            produced += 1
+            if produced >= top_n:
+                break
+        return rows
+
+    fetch = lambda page: _fetch_page(currency, per_page, page, sort_by, api_key=api_key)
+    # closing(): ปิด map_concurrent ทันทีที่ออกจากลูป (รวมถึงเมื่อผู้เรียกเลิกอ่าน) เพื่อยกเลิกหน้าที่ยังไม่ได้ดึง
+    with contextlib.closing(api_client.map_concurrent(fetch, range(1, page_count + 1), max_workers=max_workers)) as results:
+        for page, coins, error in results:
+            pending[page] = coins if error is None else None
+            while next_page in pending:
+                coins = pending.pop(next_page)
+                if not coins:
+                    return
+                rows = take(coins)
+                if rows:
+                    yield rows
+                if produced >= top_n or len(coins) < per_page:
+                    return
+                next_page += 1
+
+    # มีเหรียญซ้ำระหว่างหน้า ดึงหน้าถัดไปเพิ่มจนครบจำนวน
+    while produced < top_n:
+        coins = fetch(next_page)
+        if not coins:
+            return
+        rows = take(coins)
+        if rows:
+            yield rows
+        if len(coins) < per_page:
+            return
+        next_page += 1
+
+
+def get_top_coins(currency='usd', top_n=10, sort_by='market_cap', api_key=None):
+    """ดึงข้อมูลเหรียญคริปโตเคอร์เรนซีตาม Market Cap หรือ Volume."""
+    data = []
+    for rows in iter_top_coin_pages(currency=currency, top_n=top_n, sort_by=sort_by, api_key=api_key):
+        data.extend(rows)
+    return data or None
+
+# (ส่วน if __name__ == '__main__': สำหรับทดสอบ ยังคงเดิมได้)
@@ -0,0 +1,181 @@
+# watch.py
+# โหมด watch: เปิดโปรเซสค้างไว้ ดึงราคาตามรอบเวลา แล้วแสดงเฉพาะสิ่งที่เปลี่ยนจากรอบก่อน
+import time
+from datetime import datetime, timezone
+
+from rich.console import Console
+from rich.live import Live
+from rich.table import Table
+from rich.text import Text
+
+import api_client
+import output
+from batch_price import chunk_ids
+from lazy_import import lazy
+from records import MarketCoin
+
+requests = lazy("requests")
+
+console = Console()
+
+WATCH_FIELDS = ["price", "market_cap", "volume_24h", "change_24h"]
+WATCH_COLUMNS = ["time", "coin"] + WATCH_FIELDS
+WATCH_TYPES = output.column_types(WATCH_COLUMNS, strings=("time", "coin"))
+MAX_INTERVAL = 300 # วินาที, เพดานของ interval เมื่อโดน rate limit ติดต่อกัน
+
+
+def fetch_snapshot(coin_ids, currency, markets=False, api_key=None):
+    """
+    Fetches the current values for every coin as {coin_id: {field: value}}.
+    Uses /simple/price (with market cap, volume and 24h change) by default, or /coins/markets when markets=True.
+    Always bypasses the response cache so each tick sees fresh data.
+    """
+    snapshot = {}
+    if markets:
+        for chunk in chunk_ids(coin_ids, max_count=250):
+            params = {'vs_currency': currency, 'ids': ",".join(chunk), 'per_page': len(chunk), 'page': 1}
+            if api_key:
+                params['x_cg_demo_api_key'] = api_key
+            for coin in api_client.get_json("/coins/markets", params=params, use_cache=False, fields=MarketCoin.FIELDS):
+                snapshot[coin['id']] = {
+                    "price": coin.get('current_price'),
+                    "market_cap": coin.get('market_cap'),
+                    "volume_24h": coin.get('total_volume'),
+                    "change_24h": coin.get('price_change_percentage_24h'),
+                }
+        return snapshot
+
+    for chunk in chunk_ids(coin_ids):
+        params = {
+            'ids': ",".join(chunk),
+            'vs_currencies': currency,
+            'include_market_cap': 'true',
+            'include_24hr_vol': 'true',
+            'include_24hr_change': 'true',
+        }
+        if api_key:
+            params['x_cg_demo_api_key'] = api_key
+        data = api_client.get_json("/simple/price", params=params, use_cache=False)
+        for coin_id, values in data.items():
+            snapshot[coin_id] = {
+                "price": values.get(currency),
+                "market_cap": values.get(f"{currency}_market_cap"),
+                "volume_24h": values.get(f"{currency}_24h_vol"),
+                "change_24h": values.get(f"{currency}_24h_change"),
+            }
+    return snapshot
+
+
+def diff_snapshots(previous, current):
+    """Returns {coin_id: set of changed field names}; every field counts as changed for new coins."""
+    changes = {}
+    for coin_id, values in current.items():
+        before = previous.get(coin_id)
+        if before is None:
+            changes[coin_id] = set(WATCH_FIELDS)
+            continue
+        changed = {field for field in WATCH_FIELDS if values.get(field) != before.get(field)}
+        if changed:
+            changes[coin_id] = changed
+    return changes
+
+
+def next_interval(interval, base_interval, throttled):
+    """Doubles the interval when the API pushed back, otherwise eases back towards the configured one."""
+    if throttled:
+        return min(MAX_INTERVAL, interval * 2)
+    return max(base_interval, interval * 0.75)
+
+
+def _format_number(value, pattern):
+    return format(value, pattern) if isinstance(value, (int, float)) else "N/A"
+
+
+def build_table(coin_ids, currency, snapshot, previous, changes, status):
+    """Renders the watch table; cells that changed since the last tick are highlighted green/red."""
+    table = Table(title=f"👀 Watching {len(coin_ids)} coin(s) ({currency.upper()})", caption=status, show_header=True, header_style="bold magenta")
+    table.add_column("Coin", style="bold cyan")
+    table.add_column("Price", justify="right")
+    table.add_column("Market Cap", justify="right")
+    table.add_column("Volume (24h)", justify="right")
+    table.add_column("Change (24h)%", justify="right")
+
+    patterns = {"price": ",.2f", "market_cap": ",.0f", "volume_24h": ",.0f", "change_24h": ",.2f"}
+    for coin_id in coin_ids:
+        values = snapshot.get(coin_id)
+        if values is None:
+            table.add_row(coin_id, "N/A", "N/A", "N/A", "N/A")
+            continue
+        cells = []
+        for field in WATCH_FIELDS:
+            text = _format_number(values.get(field), patterns[field])
+            style = "white"
+            before = (previous.get(coin_id) or {}).get(field)
+            if field in changes.get(coin_id, ()) and isinstance(before, (int, float)) and isinstance(values.get(field), (int, float)):
+                style = "bold green" if values[field] > before else "bold red"
+            cells.append(Text(text, style=style))
+        table.add_row(coin_id, *cells)
+    return table
+
+
+def handle_watch_command(args, api_key_global=None):
+    """Polls prices for a set of coins until interrupted (or --count ticks), rendering only what changed."""
+    coin_ids = list(dict.fromkeys(c.lower() for c in args.coins))
+    currency = args.vs_currency.lower()
+    base_interval = max(1.0, args.interval)
+    interval = base_interval
+    fmt = args.format
+
+    writer = None
+    if fmt != output.TABLE_FORMAT:
+        writer = output.open_writer(fmt, WATCH_COLUMNS, args.output_stream, types=WATCH_TYPES)
+
+    snapshot = {}
+    previous = {}
+    changes = {}
+    tick = 0
+    live = Live(console=console, auto_refresh=False) if writer is None else None
+
+    try:
+        if live is not None:
+            live.start()
+        while args.count is None or tick < args.count:
+            tick += 1
+            throttles_before = api_client.throttle_count()
+            error = None
+            try:
+                current = fetch_snapshot(coin_ids, currency, markets=args.markets, api_key=api_key_global)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                current = None
+                error = e
+            throttled = error is not None or api_client.throttle_count() > throttles_before
+
+            now = datetime.now(timezone.utc)
+            if current is not None:
+                changes = diff_snapshots(snapshot, current)
+                previous, snapshot = snapshot, current
+
+            if writer is not None:
+                for coin_id in coin_ids:
+                    if coin_id in changes and current is not None:
+                        writer.write_row({"time": now.isoformat(timespec="seconds"), "coin": coin_id, **snapshot[coin_id]})
+                writer.stream.flush()
+                if error is not None:
+                    console.print(f"[bold #df0000]❌ Error fetching data from CoinGecko:[/bold #df0000] {error}")
+            elif current is None or changes or tick == 1:
+                status = f"Updated {now.astimezone():%H:%M:%S} · every {interval:.0f}s · Ctrl+C to stop"
+                if error is not None:
+                    status = f"[bold #df0000]Last refresh failed: {error}[/bold #df0000] · retrying in {next_interval(interval, base_interval, True):.0f}s"
+                live.update(build_table(coin_ids, currency, snapshot, previous, changes, status), refresh=True)
+
+            changes = {}
+            interval = next_interval(interval, base_interval, throttled)
+            if args.count is None or tick < args.count:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if live is not None:
+            live.stop()
+        if writer is not None:
+            writer.close()